@@ -0,0 +1,119 @@
+# benchmarks/airing_schedule.py
+"""Модель адаптивного опроса: задержка обнаружения серий и число запросов с опросом и без него"""
+import math
+import random
+import sys
+from datetime import datetime, timedelta
+
+from src.config import SWEEP_INTERVAL
+from src.services.airing_schedule import DAY, AiringSchedule, PollBudget, poll_budget, slot_start
+
+
+def simulate(titles: int = 300, mal_titles: int = 200, weeks: int = 6, seed: int = 1) -> dict:
+    """Модель выхода серий: полный проход раз в SWEEP_INTERVAL без опроса и вместе с опросом
+    по слотам. Серии выходят раз в неделю; 60% - в ночной блок японского ТВ (14:00-17:30 UTC),
+    25% - утром по UTC (дневные ONA), остальные - в любой час.
+    Shikimori отражает серию через 5-90 минут после выхода, 10% недель - перерыв"""
+    rng = random.Random(seed)
+    start = datetime(2026, 1, 5)
+    end = start + timedelta(weeks=weeks)
+    sweep_step = timedelta(seconds=SWEEP_INTERVAL)
+    shikimori_pages = math.ceil(titles / 50) + 1  # страницы онгоингов и запрос их количества
+    mal_pages = math.ceil(mal_titles / 25)
+
+    available = {}  # source_id -> моменты, когда на Shikimori появляются серии
+    for i in range(titles):
+        roll = rng.random()
+        if roll < 0.6:
+            minute = 14 * 60 + rng.randrange(8) * 30
+        elif roll < 0.85:
+            minute = 60 + rng.randrange(6) * 30
+        else:
+            minute = rng.randrange(24) * 60
+        first = start - timedelta(days=rng.randrange(7, 70)) + timedelta(minutes=minute)
+        times, air = [], first
+        while air < end:
+            times.append(air + timedelta(minutes=rng.uniform(5, 90)))
+            air += timedelta(days=14 if rng.random() < 0.1 else 7)
+        available[str(i)] = times
+    aired_on = {source_id: slot_start(times[0], DAY) for source_id, times in available.items()}
+
+    def aired(source_id, now):
+        return sum(1 for moment in available[source_id] if moment <= now)
+
+    def latencies(detected):
+        values = sorted(detected)
+        return values[len(values) // 2], values[int(len(values) * 0.9)], values[-1]
+
+    # Только полный проход: серия видна на ближайшем проходе
+    baseline = [(sweep_step - (moment - start) % sweep_step).total_seconds() / 60
+                for times in available.values() for moment in times if start <= moment < end - sweep_step]
+
+    # Тот же проход и опрос слотов в пределах бюджета
+    schedule = AiringSchedule(PollBudget(poll_budget(shikimori_pages)))
+    seen = {source_id: aired(source_id, start) for source_id in available}
+    detected = []
+    sweeps = 0
+    next_sweep = start
+
+    def notice(source_id, count, now):
+        for moment in available[source_id][seen[source_id]:count]:
+            if start <= moment < end - sweep_step:
+                detected.append((now - moment).total_seconds() / 60)
+        seen[source_id] = max(seen[source_id], count)
+
+    now = start
+    while now < end:
+        next_due = schedule.next_due()
+        now = min(next_sweep, next_due) if next_due else next_sweep
+        if now >= end:
+            break
+        if now == next_sweep:
+            sweeps += 1
+            for source_id in available:
+                notice(source_id, aired(source_id, now), now)
+            schedule.update(((source_id, int(source_id), seen[source_id], aired_on[source_id])
+                             for source_id in available), now)
+            next_sweep = now + sweep_step
+            continue
+        due = schedule.pop_due(now)
+        batches = schedule.batches(due)
+        granted = schedule.budget.grant(len(batches), now)
+        records = {}
+        for state in (state for batch in batches[:granted] for state in batch):
+            count = aired(state.source_id, now)
+            notice(state.source_id, count, now)
+            records[state.source_id] = {'status': 'ongoing', 'episodes_aired': count}
+        retry_at = schedule.budget.next_request_at(now)
+        for slot, index, states in due:
+            schedule.reschedule(slot, index, states, records, now, retry_at)
+
+    return {
+        "days": weeks * 7,
+        "sweep_requests": sweeps * (shikimori_pages + mal_pages),
+        "poll_requests": schedule.budget.spent,
+        "poll_denied": schedule.budget.denied,
+        "poll_budget": schedule.budget.per_day,
+        "baseline_latency": latencies(baseline),
+        "latency": latencies(detected),
+    }
+
+
+def main():
+    """Модель расписания: python -m benchmarks.airing_schedule [онгоингов Shikimori] [онгоингов MAL]"""
+    titles = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    mal_titles = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    result = simulate(titles, mal_titles)
+    days = result["days"]
+    sweep, poll = result["sweep_requests"], result["poll_requests"]
+    print(f"{days} дней, онгоингов Shikimori {titles}, MAL {mal_titles}, проход раз в {SWEEP_INTERVAL / 3600:g} ч")
+    print(f"  только проход: запросов {sweep / days:.1f}/сутки, задержка Shikimori "
+          "медиана {:.0f} мин, p90 {:.0f} мин, максимум {:.0f} мин".format(*result["baseline_latency"]))
+    print(f"  проход + опрос: запросов {(sweep + poll) / days:.1f}/сутки (опрос {poll / days:.1f}, "
+          f"бюджет {result['poll_budget']:.0f}, отказов {result['poll_denied']}), задержка Shikimori "
+          "медиана {:.0f} мин, p90 {:.0f} мин, максимум {:.0f} мин".format(*result["latency"]))
+    print("  MAL: без изменений, только полный проход")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# benchmarks/animego_extract.py
+"""Скорость экстракторов ссылок AnimeGO и задержка цикла событий при разборе страниц.
+Правильность экстракторов проверяет tests/test_animego_extract.py"""
+import asyncio
+import sys
+import time
+
+from src.config import ANIMEGO_EXTRACTOR
+from src.utils.animego_extract import EXTRACTORS, extract_anime_links, extract_full
+
+
+def sample_page(results: int = 20, filler: int = 200) -> str:
+    """Синтетическая страница поиска: карточки результатов среди разметки меню, фильтров и скриптов"""
+    noise = "".join(
+        f'<li class="nav-item"><a class="nav-link" href="/genre/{i}">Жанр &amp; {i}</a>'
+        f'<span data-id="{i}"><img src="/img/{i}.webp" alt=""></span></li>'
+        for i in range(filler)
+    )
+    cards = "".join(
+        f'<div class="animes-list-item media"><div class="media-left"><a href="/anime/title-{i}-{1000 + i}">'
+        f'<div class="anime-list-lazy lazy" data-original="/upload/{i}.jpg"></div></a></div>'
+        f'<div class="media-body"><div class="h5 font-weight-normal mb-1">'
+        f'<a href="/anime/title-{i}-{1000 + i}" title="Title {i}">Title {i}: «Часть&nbsp;2»</a></div>'
+        f'<div class="text-gray-dark-6 small mb-2"><div>Title {i} alt</div></div></div></div>'
+        for i in range(results)
+    )
+    script = "<script>" + "var x = '<a href=\"/x\">';" * 50 + "</script>"
+    return (f"<!DOCTYPE html><html><head><title>Поиск</title>{script}</head><body>"
+            f"<nav><ul>{noise}</ul></nav><main>{cards}</main><footer>{noise}</footer></body></html>")
+
+
+def main():
+    """Сравнение экстракторов: python -m benchmarks.animego_extract [файл.html ...]
+    (например, tests/fixtures/animego/*.html). Без аргументов - синтетическая страница sample_page()"""
+    pages = {path: open(path, encoding="utf-8").read() for path in sys.argv[1:]} or {"sample_page()": sample_page()}
+    for name, html in pages.items():
+        print(f"{name}: {len(html) / 1024:.0f} КБ")
+        reference = extract_full(html)
+        for extractor_name, extractor in EXTRACTORS.items():
+            links = extractor(html)
+            runs = 20
+            started = time.perf_counter()
+            for _ in range(runs):
+                extractor(html)
+            elapsed = (time.perf_counter() - started) / runs * 1000
+            same = "совпадает" if links == reference else "ОТЛИЧАЕТСЯ от full"
+            print(f"  {extractor_name:9} {elapsed:8.2f} мс/страница, ссылок {len(links)}, {same}")
+
+    # Насколько разбор задерживает цикл событий. Пул потоков GIL не обходит (html.parser - чистый
+    # Python): разница между строками 1 и 2 - заслуга экстрактора, между 2 и 3 - пула
+    html = next(iter(pages.values()))
+    extractor = EXTRACTORS[ANIMEGO_EXTRACTOR]
+    for label, parse in (("full в цикле событий", lambda: extract_full(html)),
+                         (f"{ANIMEGO_EXTRACTOR} в цикле событий", lambda: extractor(html)),
+                         (f"{ANIMEGO_EXTRACTOR} в пуле потоков", lambda: extract_anime_links(html))):
+        print(f"Наибольшая задержка цикла событий, {label}: {asyncio.run(_max_stall(parse)) * 1000:.1f} мс")
+
+
+async def _max_stall(parse, pages: int = 10) -> float:
+    """Разобрать pages страниц и измерить наибольшую паузу тикера с шагом 1 мс"""
+    stall = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal stall
+        last = time.perf_counter()
+        while not done:
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            stall = max(stall, now - last)
+            last = now
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    for _ in range(pages):
+        result = parse()
+        if asyncio.iscoroutine(result):
+            await result
+        # Между страницами тикер успевает отработать
+        await asyncio.sleep(0.005)
+    done = True
+    await task
+    return stall
+
+
+if __name__ == "__main__":
+    main()
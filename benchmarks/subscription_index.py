@@ -0,0 +1,45 @@
+# benchmarks/subscription_index.py
+"""Память индекса подписок (array('q')) против словарей множеств на синтетических данных"""
+import random
+import sys
+import tracemalloc
+
+from src.services.subscription_index import SubscriptionIndex
+
+
+def main():
+    """Отчет о памяти индекса на синтетических 1M подписок:
+    python -m benchmarks.subscription_index [подписок] [пользователей] [аниме]"""
+    subscriptions = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    anime = int(sys.argv[3]) if len(sys.argv) > 3 else 5_000
+
+    rng = random.Random(0)
+    pairs = {
+        (5_000_000_000 + rng.randrange(users), rng.randrange(1, anime + 1))
+        for _ in range(subscriptions)
+    }
+    print(f"Подписок: {len(pairs)}, пользователей: до {users}, аниме: до {anime}")
+
+    tracemalloc.start()
+    index = SubscriptionIndex()
+    index.build(pairs)
+    arrays_size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    by_user, by_anime = {}, {}
+    for user_id, anime_id in pairs:
+        by_user.setdefault(user_id, set()).add(anime_id)
+        by_anime.setdefault(anime_id, set()).add(user_id)
+    sets_size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    mb = 1024 * 1024
+    print(f"array('q'): {arrays_size / mb:.1f} МБ (tracemalloc), {index.memory_usage() / mb:.1f} МБ (getsizeof)")
+    print(f"set:        {sets_size / mb:.1f} МБ (tracemalloc)")
+    print(f"На подписку: {arrays_size / len(pairs):.1f} против {sets_size / len(pairs):.1f} байт")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,17 +3,44 @@ import logging
 from aiogram import Bot, Dispatcher
 
 from src.scheduler import AnimeUpdateScheduler
-from src.config import BOT_TOKEN
+from src.config import BOT_TOKEN, EXTERNAL_WORKER
 from src.handlers.start import router as start_router
 from src.handlers.anime_list import router as anime_router
 from src.handlers.subscriptions import router as subscriptions_router
-from src.services.anime_service import anime_service
+from src.database.db import engine, session_scope
+from src.middlewares import DbSessionMiddleware, ChatActivityMiddleware
+from src.utils.http_client import http_client
+from src.services.subscription_index import subscription_index
+from src.services.notification_dispatcher import notification_dispatcher
+from src.services.cache import invalidate_source
+from src.services.refresh_coordinator import RemoteRefreshCoordinator
+from src.services.refresh_jobs import refresh_jobs
+from src.services.animego_resolver import animego_resolver
+from src.services.cache_pruner import cache_pruner
+from src.utils.ipc import IpcServer
 
 # Логирование
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger(__name__)
 
 
+async def start_worker_channel() -> IpcServer:
+    """Канал к воркеру: от него приходят сбросы кэшей и рассылки, ему уходят запросы /update"""
+    ipc = IpcServer()
+
+    async def on_invalidate(message):
+        invalidate_source(message.get("source"))
+
+    async def on_notify(message):
+        await notification_dispatcher.notify(message["chat_ids"], message["text"], message.get("parse_mode"))
+
+    ipc.on("invalidate", on_invalidate)
+    ipc.on("notify", on_notify)
+    refresh_jobs.coordinator = RemoteRefreshCoordinator(ipc)
+    await ipc.start()
+    return ipc
+
+
 async def main():
     if not BOT_TOKEN:
         logger.error("BOT_TOKEN пуст. Проверь .env / config.py")
@@ -26,26 +53,57 @@ async def main():
         logger.info("Начинаем инициализацию базы данных...")
         await init_db()
         logger.info("База данных инициализирована")
+
+        # Подписки держим в памяти: проверки и рассылка без запросов к БД
+        async with session_scope() as session:
+            await subscription_index.load(session)
+            await notification_dispatcher.load_blocked(session)
     except Exception as e:
         logger.exception("Ошибка инициализации БД: %s", e)
         return
 
+    # Общий пул HTTP-соединений для парсеров и AnimeGO
+    await http_client.start()
+
     bot = Bot(token=BOT_TOKEN)
     dp = Dispatcher()
 
+    # Каждый апдейт получает свою сессию БД из пула
+    dp.update.outer_middleware(DbSessionMiddleware())
+    dp.update.outer_middleware(ChatActivityMiddleware())
+
     dp.include_router(start_router)
     dp.include_router(anime_router)
     dp.include_router(subscriptions_router)
 
-    scheduler = AnimeUpdateScheduler(anime_service, bot)
-    scheduler.start()
+    # Уведомления уходят через очередь с учетом лимитов Telegram
+    notification_dispatcher.start(bot)
+    # Кэши ответов на диске чистятся по расписанию, с планировщиком или без него
+    cache_pruner.start()
+
+    scheduler = None
+    ipc = None
+    if EXTERNAL_WORKER:
+        # Планировщик и полные обновления - в процессе python -m src.worker, связь по локальному IPC
+        ipc = await start_worker_channel()
+    else:
+        scheduler = AnimeUpdateScheduler()
+        scheduler.start()
 
     logger.info("Бот запущен. Ожидание команд...")
     try:
         await dp.start_polling(bot)
     finally:
-        scheduler.stop()
+        if scheduler:
+            await scheduler.stop()
+        if ipc:
+            await ipc.stop()
+        await notification_dispatcher.stop()
+        await animego_resolver.stop()
+        await cache_pruner.stop()
+        await http_client.close()
         await bot.session.close()
+        await engine.dispose()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -1,3 +1,3 @@
 # src/database/__init__.py
 from .base import Base
-from .db import engine, SessionLocal, init_db
\ No newline at end of file
+from .db import engine, SessionLocal, init_db, session_scope
\ No newline at end of file
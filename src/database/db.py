@@ -1,15 +1,52 @@
 import asyncio
+from contextlib import asynccontextmanager
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import text
+from sqlalchemy import event, inspect, text
 import logging
 
-from src.config import DATABASE_URL
+from src.config import (
+    DATABASE_URL,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    SQLITE_JOURNAL_MODE,
+    SQLITE_SYNCHRONOUS,
+    SQLITE_MMAP_SIZE,
+    SQLITE_CACHE_SIZE,
+    SQLITE_BUSY_TIMEOUT,
+    SQLITE_TEMP_STORE,
+)
 from src.database.base import Base
 
 logger = logging.getLogger(__name__)
 
-engine = create_async_engine(DATABASE_URL, echo=False)
+engine = create_async_engine(
+    DATABASE_URL,
+    echo=False,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_pre_ping=True,
+)
+
+SQLITE_PRAGMAS = {
+    "journal_mode": SQLITE_JOURNAL_MODE,
+    "synchronous": SQLITE_SYNCHRONOUS,
+    "mmap_size": SQLITE_MMAP_SIZE,
+    "cache_size": SQLITE_CACHE_SIZE,
+    "busy_timeout": SQLITE_BUSY_TIMEOUT,
+    "temp_store": SQLITE_TEMP_STORE,
+}
+
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine.sync_engine, "connect")
+    def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+        """Профиль производительности SQLite для каждого нового соединения пула"""
+        cursor = dbapi_connection.cursor()
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
 
 SessionLocal = sessionmaker(
     bind=engine,
@@ -25,6 +62,8 @@ async def init_db():
         logger.info("Импортируем модели...")
         from src.models.anime import Anime
         from src.models.subscription import Subscription
+        from src.models.blocked_chat import BlockedChat
+        from src.models.animego_link import AnimeGoLink
         logger.info("Модели импортированы успешно")
         logger.info(f"Таблицы для создания: {list(Base.metadata.tables.keys())}")
 
@@ -33,11 +72,21 @@ async def init_db():
             await conn.run_sync(Base.metadata.create_all)
         logger.info("Таблицы созданы успешно")
 
+        # Существующие базы догоняют схему версионированными миграциями (индексы, ключи)
+        from src.database.migrations import run_migrations
+        await run_migrations(engine)
+
         # Проверяем, какие таблицы теперь есть
         async with engine.connect() as conn:
-            result = await conn.execute(text("SELECT name FROM sqlite_master WHERE type='table';"))
-            tables = [row[0] for row in result]
+            tables = await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_table_names())
             logger.info("Таблицы в базе данных: %s", tables)
+            if engine.dialect.name == "sqlite":
+                journal_mode = (await conn.execute(text("PRAGMA journal_mode"))).scalar()
+                logger.info(f"SQLite: journal_mode={journal_mode}")
+
+        # Горячие запросы должны идти по индексам; иначе предупреждение в лог
+        from src.database.query_plans import check_query_plans
+        await check_query_plans(engine)
 
     except Exception as e:
         logger.error(f"Ошибка при инициализации БД: {e}")
@@ -49,6 +98,17 @@ async def get_db():
     async with SessionLocal() as session:
         yield session
 
+@asynccontextmanager
+async def session_scope():
+    """Короткоживущая сессия для одной единицы работы (апдейт, фоновая задача).
+    При ошибке незавершенная транзакция откатывается, соединение возвращается в пул"""
+    async with SessionLocal() as session:
+        try:
+            yield session
+        except Exception:
+            await session.rollback()
+            raise
+
 # Для прямого запуска файла
 if __name__ == "__main__":
     asyncio.run(init_db())
\ No newline at end of file
@@ -0,0 +1,112 @@
+# src/database/migrations.py
+import logging
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+logger = logging.getLogger(__name__)
+
+
+async def _create_indexes(conn, table):
+    """Создать недостающие индексы таблицы из описания модели"""
+    for index in table.indexes:
+        await conn.run_sync(lambda sync_conn: index.create(sync_conn, checkfirst=True))
+
+
+async def _add_column(conn, table, column_name: str):
+    """Добавить колонку из описания модели, если ее еще нет в таблице"""
+    existing = await conn.run_sync(
+        lambda sync_conn: {column["name"] for column in inspect(sync_conn).get_columns(table.name)}
+    )
+    if column_name in existing:
+        return
+    column_type = table.c[column_name].type.compile(dialect=conn.dialect)
+    await conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column_name} {column_type}"))
+
+
+async def _anime_unique_key(conn):
+    """Убрать дубли (source, source_id) и создать уникальный индекс"""
+    from src.models.anime import Anime
+
+    duplicates = (await conn.execute(text(
+        "SELECT source, source_id, MIN(id) FROM anime "
+        "WHERE source_id IS NOT NULL GROUP BY source, source_id HAVING COUNT(*) > 1"
+    ))).fetchall()
+
+    for source, source_id, keep_id in duplicates:
+        # Подписки на дубли переносим на оставшуюся запись, повторные подписки удаляем
+        params = {"source": source, "source_id": source_id, "keep_id": keep_id}
+        duplicate_ids = "SELECT id FROM anime WHERE source = :source AND source_id = :source_id AND id != :keep_id"
+        await conn.execute(text(
+            f"DELETE FROM subscriptions WHERE anime_id IN ({duplicate_ids}) AND user_id IN "
+            f"(SELECT user_id FROM subscriptions WHERE anime_id = :keep_id)"
+        ), params)
+        await conn.execute(text(
+            f"DELETE FROM subscriptions WHERE anime_id IN ({duplicate_ids}) AND id NOT IN "
+            f"(SELECT MIN(id) FROM subscriptions WHERE anime_id IN ({duplicate_ids}) GROUP BY user_id)"
+        ), params)
+        await conn.execute(text(
+            f"UPDATE subscriptions SET anime_id = :keep_id WHERE anime_id IN ({duplicate_ids})"
+        ), params)
+        await conn.execute(text(f"DELETE FROM anime WHERE id IN ({duplicate_ids})"), params)
+
+    if duplicates:
+        logger.warning(f"Удалены дубли аниме по (source, source_id): {len(duplicates)} групп")
+
+    unique_key = next(index for index in Anime.__table__.indexes if index.name == 'ux_anime_source_source_id')
+    await conn.run_sync(lambda sync_conn: unique_key.create(sync_conn, checkfirst=True))
+
+
+async def _hot_query_indexes(conn):
+    """Индексы для горячих запросов списков, поиска и рассылки"""
+    from src.models.anime import Anime
+    from src.models.subscription import Subscription
+
+    await _create_indexes(conn, Anime.__table__)
+    await _create_indexes(conn, Subscription.__table__)
+
+
+async def _anime_image_file_id(conn):
+    """Колонка для file_id постера в Telegram"""
+    from src.models.anime import Anime
+
+    await _add_column(conn, Anime.__table__, "image_file_id")
+
+
+async def _anime_content_hash(conn):
+    """Колонка хэша записи источника; до первого обновления пустая"""
+    from src.models.anime import Anime
+
+    await _add_column(conn, Anime.__table__, "content_hash")
+
+
+# Версионированные миграции: (версия, описание, функция). Новые добавляются только в конец
+MIGRATIONS = [
+    (1, "Уникальный ключ anime(source, source_id)", _anime_unique_key),
+    (2, "Индексы горячих запросов anime и subscriptions", _hot_query_indexes),
+    (3, "Колонка anime.image_file_id", _anime_image_file_id),
+    (4, "Колонка anime.content_hash", _anime_content_hash),
+]
+
+
+async def run_migrations(engine):
+    """Применить недостающие миграции; каждая выполняется в своей транзакции"""
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version INTEGER PRIMARY KEY, name VARCHAR NOT NULL, applied_at TIMESTAMP NOT NULL)"
+        ))
+        applied = set((await conn.execute(text("SELECT version FROM schema_migrations"))).scalars())
+
+    for version, name, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        logger.info(f"Применяем миграцию {version}: {name}")
+        async with engine.begin() as conn:
+            await migrate(conn)
+            await conn.execute(
+                text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:version, :name, :applied_at)"),
+                {"version": version, "name": name, "applied_at": datetime.utcnow()}
+            )
+
+    logger.info(f"Схема БД актуальна: версия {MIGRATIONS[-1][0]}")
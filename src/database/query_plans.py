@@ -0,0 +1,79 @@
+# src/database/query_plans.py
+import asyncio
+import logging
+import sys
+
+from sqlalchemy import select, and_, func, text
+
+from src.models.anime import Anime
+from src.models.subscription import Subscription
+
+logger = logging.getLogger(__name__)
+
+
+def hot_queries() -> dict:
+    """Горячие запросы бота: каждый должен обслуживаться индексом, а не полным сканированием"""
+    return {
+        "онгоинги источника (страница после курсора)": select(Anime.id, Anime.title).filter(
+            and_(Anime.source == "shikimori", Anime.status == "ongoing", Anime.id > 100)
+        ).order_by(Anime.id).limit(10),
+        "онгоинги источника (страница перед курсором)": select(Anime.id, Anime.title).filter(
+            and_(Anime.source == "shikimori", Anime.status == "ongoing", Anime.id < 100)
+        ).order_by(Anime.id.desc()).limit(10),
+        "количество онгоингов источника": select(func.count(Anime.id)).filter(
+            and_(Anime.source == "shikimori", Anime.status == "ongoing")
+        ),
+        "аниме по источнику и ID": select(Anime).filter(
+            and_(Anime.source == "shikimori", Anime.source_id == "1")
+        ),
+        "аниме по названию": select(Anime).filter(Anime.title == "Title"),
+        "подписчики аниме": select(Subscription.user_id).filter(Subscription.anime_id == 1),
+        "подписки пользователя": select(Anime.id, Anime.title, Anime.source_id)
+            .join(Subscription).filter(Subscription.user_id == 1),
+        "проверка подписки": select(Subscription).filter(
+            and_(Subscription.user_id == 1, Subscription.anime_id == 1)
+        ),
+    }
+
+
+def _uses_index(plan: list) -> bool:
+    """В плане SQLite нет ни одного шага с полным сканированием таблицы"""
+    for detail in plan:
+        if detail.startswith("SCAN") and "USING" not in detail:
+            return False
+    return True
+
+
+async def check_query_plans(engine) -> dict:
+    """EXPLAIN QUERY PLAN для горячих запросов (только SQLite).
+    Возвращает {название: (использует индекс, шаги плана)}"""
+    results = {}
+    if engine.dialect.name != "sqlite":
+        return results
+
+    async with engine.connect() as conn:
+        for name, query in hot_queries().items():
+            sql = str(query.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+            rows = (await conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))).fetchall()
+            plan = [row[-1] for row in rows]
+            results[name] = (_uses_index(plan), plan)
+            if not results[name][0]:
+                logger.warning(f"Запрос '{name}' выполняется без индекса: {plan}")
+    return results
+
+
+async def main() -> int:
+    from src.database.db import engine, init_db
+
+    await init_db()
+    results = await check_query_plans(engine)
+    await engine.dispose()
+
+    for name, (ok, plan) in results.items():
+        print(f"[{'OK' if ok else 'SCAN'}] {name}: {' | '.join(plan)}")
+    return 0 if all(ok for ok, _ in results.values()) else 1
+
+
+# Проверка планов на текущей БД: python -m src.database.query_plans
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
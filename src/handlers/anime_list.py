@@ -1,16 +1,21 @@
+import asyncio
 import urllib.parse
 from aiogram import Router, F
 from aiogram.filters import Command
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 import logging
 import json
-from sqlalchemy import select, and_, func
+from typing import NamedTuple
+from sqlalchemy.ext.asyncio import AsyncSession
 
 # Подключаем парсеры
 from ..parsers import shikimori, mal
 # Подключаем сервисы
-from ..services.anime_service import anime_service
+from ..database.db import session_scope
+from ..services.anime_service import AnimeService
+from ..services.cache import list_pages, details_cards
 from ..services.subscription_service import SubscriptionsService
+from ..services.refresh_jobs import refresh_jobs
 # Подключаем утилиты
 from ..utils.animego_link import get_anime_link_from_title
 
@@ -19,6 +24,9 @@ logger = logging.getLogger(__name__)
 
 ITEMS_PER_PAGE = 10
 
+# Ссылки на фоновые задачи предзагрузки, чтобы их не собрал сборщик мусора
+_background_tasks = set()
+
 
 @router.message(Command("list"))
 async def cmd_list(message: Message):
@@ -30,56 +38,44 @@ async def cmd_list(message: Message):
 
 
 @router.callback_query(F.data.startswith("src_shikimori_"))
-async def anime_source_callback_shikimori(callback: CallbackQuery):
-    await handle_anime_list_callback(callback, "shikimori")
+async def anime_source_callback_shikimori(callback: CallbackQuery, session: AsyncSession):
+    await handle_anime_list_callback(callback, "shikimori", session)
 
 
 @router.callback_query(F.data.startswith("src_mal_"))
-async def anime_source_callback_mal(callback: CallbackQuery):
-    await handle_anime_list_callback(callback, "mal")
-
+async def anime_source_callback_mal(callback: CallbackQuery, session: AsyncSession):
+    await handle_anime_list_callback(callback, "mal", session)
 
-async def handle_anime_list_callback(callback: CallbackQuery, source: str):
-    """Общий обработчик для обоих источников с пагинацией"""
-    logger.info("User %s chose %s", callback.from_user.id, callback.data)
-    await callback.answer()
 
-    # Извлекаем номер страницы из callback_data
+def parse_list_callback(data: str):
+    """Разбор callback_data списка: (страница, after_id, before_id).
+    Без курсора (или с некорректным курсором) показывается первая страница"""
+    parts = data.split("_")
     try:
-        page = int(callback.data.split("_")[-1])
-        if page < 1:
-            page = 1
+        page = max(1, int(parts[2]))
+        cursor = parts[3] if len(parts) > 3 else ""
+        if cursor.startswith("a"):
+            return page, int(cursor[1:]), None
+        if cursor.startswith("b"):
+            return page, None, int(cursor[1:])
     except (ValueError, IndexError):
-        page = 1
-
-    # Проверяем, есть ли данные в базе
-    db_count = await anime_service.get_ongoing_count_from_database(source)
-
-    animes = []
-    total_pages = 1
-
-    if db_count == 0:
-        # База пуста - делаем полное обновление
-        logger.info(f"База пуста для {source}, начинаем полное обновление...")
-        await callback.message.answer(f"🔄 Загружаем все онгоинги из {source}... Это может занять некоторое время.")
+        pass
+    return 1, None, None
 
-        added_count = await anime_service.update_all_ongoing_from_source(source)
-        await callback.message.answer(f"✅ Загружено {added_count} аниме из {source}")
 
-        # Обновляем количество
-        db_count = await anime_service.get_ongoing_count_from_database(source)
+async def render_list_page(anime_service: AnimeService, source: str, page: int,
+                           after_id: int = None, before_id: int = None):
+    """Собрать страницу /list: (текст, клавиатура, callback_data следующей страницы) или None"""
+    db_count = await anime_service.get_ongoing_count_from_database(source)
 
-    # Получаем данные из базы
-    offset = (page - 1) * ITEMS_PER_PAGE
-    db_animes = await anime_service.get_ongoing_from_database(source, ITEMS_PER_PAGE, offset)
+    # Получаем данные из базы: одно чтение диапазона по индексу, без OFFSET
+    db_animes = await anime_service.get_ongoing_from_database(source, ITEMS_PER_PAGE, after_id, before_id)
     total_pages = max(1, (db_count + ITEMS_PER_PAGE - 1) // ITEMS_PER_PAGE)
 
     logger.info("Got %d anime items from database %s (page %d/%d)", len(db_animes), source, page, total_pages)
 
-    # Проверка на пустой список аниме
     if not db_animes:
-        await callback.message.answer("❌ Не удалось получить список аниме")
-        return
+        return None
 
     # Создаем кнопки для аниме
     buttons = []
@@ -100,9 +96,12 @@ async def handle_anime_list_callback(callback: CallbackQuery, source: str):
     # Создаем кнопки навигации
     nav_buttons = []
     callback_prefix = f"src_{source}"
+    next_page_data = None
 
     if page > 1:
-        nav_buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"{callback_prefix}_{page - 1}"))
+        nav_buttons.append(InlineKeyboardButton(
+            text="⬅️ Назад", callback_data=f"{callback_prefix}_{page - 1}_b{db_animes[0].id}"
+        ))
 
     # Информационная кнопка с номером страницы
     nav_buttons.append(InlineKeyboardButton(text=f"{page}/{total_pages}", callback_data="page_info"))
@@ -110,8 +109,9 @@ async def handle_anime_list_callback(callback: CallbackQuery, source: str):
     # Ограничиваем навигацию разумными пределами
     max_pages = 50  # Увеличиваем лимит
 
-    if page < total_pages and page < max_pages:
-        nav_buttons.append(InlineKeyboardButton(text="Вперед ➡️", callback_data=f"{callback_prefix}_{page + 1}"))
+    if page < total_pages and page < max_pages and len(db_animes) == ITEMS_PER_PAGE:
+        next_page_data = f"{callback_prefix}_{page + 1}_a{db_animes[-1].id}"
+        nav_buttons.append(InlineKeyboardButton(text="Вперед ➡️", callback_data=next_page_data))
 
     # Добавляем кнопки навигации, если они есть
     if nav_buttons:
@@ -119,23 +119,247 @@ async def handle_anime_list_callback(callback: CallbackQuery, source: str):
 
     kb = InlineKeyboardMarkup(inline_keyboard=buttons)
     source_name = "Shikimori" if source == "shikimori" else "MyAnimeList"
+    return f"Список онгоингов ({source_name}, стр. {page}):", kb, next_page_data
 
+
+async def prefetch_list_page(source: str, callback_data: str):
+    """Фоновая предзагрузка страницы /list в кэш, со своей сессией БД"""
+    cursor = parse_list_callback(callback_data)
+    if (source, cursor) in list_pages:
+        return
+    generation = list_pages.generation(source)
     try:
-        await callback.message.edit_text(f"Список онгоингов ({source_name}, стр. {page}):", reply_markup=kb)
+        async with session_scope() as session:
+            rendered = await render_list_page(AnimeService(session), source, *cursor)
+        if rendered:
+            list_pages.put(source, cursor, rendered, generation)
+    except Exception as e:
+        logger.error(f"Ошибка предзагрузки страницы {callback_data}: {e}")
+
+
+def schedule_prefetch(source: str, callback_data: str):
+    """Запустить предзагрузку следующей страницы, не задерживая ответ пользователю"""
+    if not callback_data:
+        return
+    task = asyncio.create_task(prefetch_list_page(source, callback_data))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def send_list_after_refresh(message: Message, source: str, cursor: tuple):
+    """Показать страницу списка после фоновой загрузки пустой базы"""
+    async with session_scope() as session:
+        generation = list_pages.generation(source)
+        rendered = await render_list_page(AnimeService(session), source, *cursor)
+    if rendered is None:
+        await message.answer("❌ Не удалось получить список аниме")
+        return
+    list_pages.put(source, cursor, rendered, generation)
+    text, kb, next_page_data = rendered
+    schedule_prefetch(source, next_page_data)
+    await message.answer(text, reply_markup=kb)
+
+
+async def handle_anime_list_callback(callback: CallbackQuery, source: str, session: AsyncSession):
+    """Общий обработчик для обоих источников с пагинацией"""
+    logger.info("User %s chose %s", callback.from_user.id, callback.data)
+    await callback.answer()
+
+    # Извлекаем номер страницы и курсор из callback_data: src_<источник>_<страница>[_a<id>|_b<id>]
+    cursor = parse_list_callback(callback.data)
+    page = cursor[0]
+
+    # Готовая страница из кэша - без обращения к БД
+    rendered = list_pages.get(source, cursor)
+
+    if rendered is None:
+        anime_service = AnimeService(session)
+
+        # Проверяем, есть ли данные в базе
+        db_count = await anime_service.get_ongoing_count_from_database(source)
+
+        if db_count == 0:
+            # База пуста - загрузка идет в фоне с прогрессом, список придет по ее окончании
+            logger.info(f"База пуста для {source}, начинаем полное обновление...")
+            refresh_jobs.submit(
+                callback.message, [source],
+                on_done=lambda outcomes: send_list_after_refresh(callback.message, source, cursor)
+            )
+            return
+
+        generation = list_pages.generation(source)
+        rendered = await render_list_page(anime_service, source, *cursor)
+
+        # Проверка на пустой список аниме
+        if rendered is None:
+            await callback.message.answer("❌ Не удалось получить список аниме")
+            return
+
+        list_pages.put(source, cursor, rendered, generation)
+
+    text, kb, next_page_data = rendered
+    schedule_prefetch(source, next_page_data)
+
+    try:
+        await callback.message.edit_text(text, reply_markup=kb)
     except Exception as e:
         logger.error(f"Failed to edit message: {e}")
         try:
-            await callback.message.answer(f"Список онгоингов ({source_name}, стр. {page}):", reply_markup=kb)
+            await callback.message.answer(text, reply_markup=kb)
         except Exception as e2:
             logger.error(f"Failed to send new message: {e2}")
             await callback.message.answer("❌ Произошла ошибка при отображении списка.")
 
 
+TYPE_NAMES = {
+    'tv': '📺 TV Сериал',
+    'movie': '🎬 Фильм',
+    'ova': '📼 OVA',
+    'ona': '🌐 ONA',
+    'special': '⭐ Спешл'
+}
+
+STATUS_NAMES = {
+    'ongoing': '🔄 Онгоинг',
+    'released': '✅ Завершено',
+    'announced': '📅 Анонсировано'
+}
+
+
+class DetailsCard(NamedTuple):
+    """Отрисованная карточка аниме; для каждого пользователя выбирается только клавиатура"""
+    caption: str
+    image_url: str
+    image_file_id: str  # file_id постера в Telegram, если он уже загружался
+    keyboards: dict  # подписан ли пользователь -> клавиатура
+
+
+def _parse_genres(genres: str) -> list:
+    """Жанры хранятся JSON-списком или строкой через запятую"""
+    try:
+        genres_list = json.loads(genres)
+        if isinstance(genres_list, list):
+            return genres_list
+    except ValueError:
+        pass
+    return [genre.strip() for genre in genres.split(",") if genre.strip()]
+
+
+def render_details_card(anime) -> DetailsCard:
+    """Собрать подпись и обе версии клавиатуры (подписан / не подписан) карточки аниме"""
+    # Формируем сообщение с деталями
+    info_text = f"🎬 *{anime.title}*\n\n"
+
+    if anime.english_title and anime.english_title != anime.title:
+        info_text += f"🇺🇸 _{anime.english_title}_\n"
+
+    if anime.japanese_title:
+        info_text += f"🇯🇵 _{anime.japanese_title}_\n\n"
+
+    # Тип и статус
+    if anime.type:
+        info_text += f"📊 *Тип:* {TYPE_NAMES.get(anime.type.lower(), anime.type)}\n"
+
+    # Эпизоды
+    if anime.episodes_aired is not None and anime.episodes is not None:
+        info_text += f"📺 *Эпизоды:* {anime.episodes_aired}/{anime.episodes}\n"
+    elif anime.episodes is not None:
+        info_text += f"📺 *Эпизоды:* {anime.episodes}\n"
+
+    # Статус
+    if anime.status:
+        info_text += f"🔄 *Статус:* {STATUS_NAMES.get(anime.status.lower(), anime.status)}\n"
+
+    # Рейтинг
+    if anime.score:
+        info_text += f"⭐ *Рейтинг:* {anime.score}\n"
+
+    # Жанры
+    if anime.genres:
+        genres_list = _parse_genres(anime.genres)
+        if genres_list:
+            info_text += f"🎭 *Жанры:* {', '.join(genres_list[:5])}\n"
+
+    # Длительность
+    if anime.duration:
+        info_text += f"⏱️ *Длительность:* {anime.duration}\n"
+
+    # Даты
+    if anime.aired_on:
+        info_text += f"📅 *Выход серий:* с {anime.aired_on.strftime('%d.%m.%Y')}\n"
+
+    # Источник
+    source_emoji = "🇷🇺" if anime.source == "shikimori" else "🇯🇵"
+    source_name = "Shikimori" if anime.source == "shikimori" else "MyAnimeList"
+    info_text += f"\n📡 *Источник:* {source_emoji} {source_name}"
+
+    # Первая строка: ссылки на просмотр
+    row1 = []
+
+    # Ссылка на источник
+    if anime.url:
+        row1.append(InlineKeyboardButton(text=f"📖 {source_name}", url=anime.url))
+
+    # Ссылка на AnimeGO
+    if anime.animego_url:
+        row1.append(InlineKeyboardButton(text="👁️ AnimeGO", url=anime.animego_url))
+    else:
+        # Если нет прямой ссылки, создаем кнопку поиска
+        search_query = urllib.parse.quote(anime.title)
+        search_url = f"https://animego.me/search/anime?q={search_query}"
+        row1.append(InlineKeyboardButton(text="🔍 Найти на AnimeGO", url=search_url))
+
+    # Третья строка: назад
+    row3 = [InlineKeyboardButton(text="🔙 Назад", callback_data="src_shikimori_1")]
+
+    # Вторая строка (подписка) - единственное, что зависит от пользователя
+    keyboards = {}
+    for is_subscribed in (True, False):
+        if is_subscribed:
+            row2 = [InlineKeyboardButton(text="✅ Отписаться", callback_data=f"unsubscribe_{anime.id}")]
+        else:
+            row2 = [InlineKeyboardButton(text="🔔 Подписаться", callback_data=f"subscribe_{anime.id}")]
+        keyboard_buttons = [row1, row2, row3] if row1 else [row2, row3]
+        keyboards[is_subscribed] = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
+
+    image_url = anime.image_url if anime.image_url and anime.image_url.strip() else None
+    return DetailsCard(info_text, image_url, anime.image_file_id if image_url else None, keyboards)
+
+
+async def send_details_photo(message: Message, anime_service: AnimeService, anime_id: int, version,
+                             card: DetailsCard, keyboard: InlineKeyboardMarkup):
+    """Отправить карточку с постером. Постер по URL Telegram скачивает только один раз:
+    полученный file_id сохраняется в БД и в кэше карточек и используется дальше"""
+    if card.image_file_id:
+        try:
+            await message.answer_photo(
+                photo=card.image_file_id,
+                caption=card.caption,
+                reply_markup=keyboard,
+                parse_mode="Markdown"
+            )
+            return
+        except Exception as e:
+            logger.warning(f"file_id постера аниме {anime_id} не принят, отправляем по URL: {e}")
+
+    sent = await message.answer_photo(
+        photo=card.image_url,
+        caption=card.caption,
+        reply_markup=keyboard,
+        parse_mode="Markdown"
+    )
+    if sent.photo:
+        file_id = sent.photo[-1].file_id
+        await anime_service.set_image_file_id(anime_id, card.image_url, file_id)
+        details_cards.put(anime_id, version, card._replace(image_file_id=file_id))
+
+
 # Обработчик для просмотра деталей аниме
 @router.callback_query(F.data.startswith("details_"))
-async def show_anime_details(callback: CallbackQuery):
+async def show_anime_details(callback: CallbackQuery, session: AsyncSession):
     """Показать детали аниме с кнопками подписки и ссылками"""
     await callback.answer()
+    anime_service = AnimeService(session)
 
     try:
         # Извлекаем информацию из callback_data
@@ -148,133 +372,39 @@ async def show_anime_details(callback: CallbackQuery):
         source = parts[1]  # shikimori или mal
         anime_id = parts[2]  # ID аниме в источнике
 
-        # Получаем аниме из БД
-        anime = await anime_service.get_anime_by_source_and_id(source, anime_id)
+        # Легкий запрос версии записи; полная запись нужна, только если карточки нет в кэше
+        version = await anime_service.get_anime_version(source, anime_id)
 
-        if not anime:
+        if not version:
             # Если не нашли в БД, попробуем получить из API
             await callback.message.answer("❌ Аниме не найдено в базе данных.")
             return
 
-        # Формируем сообщение с деталями
-        info_text = f"🎬 *{anime.title}*\n\n"
-
-        if anime.english_title and anime.english_title != anime.title:
-            info_text += f"🇺🇸 _{anime.english_title}_\n"
-
-        if anime.japanese_title:
-            info_text += f"🇯🇵 _{anime.japanese_title}_\n\n"
-
-        # Тип и статус
-        if anime.type:
-            type_names = {
-                'tv': '📺 TV Сериал',
-                'movie': '🎬 Фильм',
-                'ova': '📼 OVA',
-                'ona': '🌐 ONA',
-                'special': '⭐ Спешл'
-            }
-            info_text += f"📊 *Тип:* {type_names.get(anime.type.lower(), anime.type)}\n"
-
-        # Эпизоды
-        if anime.episodes_aired is not None and anime.episodes is not None:
-            info_text += f"📺 *Эпизоды:* {anime.episodes_aired}/{anime.episodes}\n"
-        elif anime.episodes is not None:
-            info_text += f"📺 *Эпизоды:* {anime.episodes}\n"
-
-        # Статус
-        if anime.status:
-            status_names = {
-                'ongoing': '🔄 Онгоинг',
-                'released': '✅ Завершено',
-                'announced': '📅 Анонсировано'
-            }
-            info_text += f"🔄 *Статус:* {status_names.get(anime.status.lower(), anime.status)}\n"
-
-        # Рейтинг
-        if anime.score:
-            info_text += f"⭐ *Рейтинг:* {anime.score}\n"
-
-        # Жанры
-        if anime.genres:
-            try:
-                genres_list = json.loads(anime.genres)
-                if genres_list:
-                    info_text += f"🎭 *Жанры:* {', '.join(genres_list[:5])}\n"
-            except:
-                pass
-
-        # Длительность
-        if anime.duration:
-            info_text += f"⏱️ *Длительность:* {anime.duration}\n"
-
-        # Даты
-        if anime.aired_on:
-            info_text += f"📅 *Выход серий:* с {anime.aired_on.strftime('%d.%m.%Y')}\n"
-
-        # Источник
-        source_emoji = "🇷🇺" if anime.source == "shikimori" else "🇯🇵"
-        source_name = "Shikimori" if anime.source == "shikimori" else "MyAnimeList"
-        info_text += f"\n📡 *Источник:* {source_emoji} {source_name}"
-
-        # Создаем клавиатуру с кнопками
-        keyboard_buttons = []
-
-        # Первая строка: ссылки на просмотр
-        row1 = []
-
-        # Ссылка на источник
-        if anime.url:
-            source_text = "Shikimori" if anime.source == "shikimori" else "MyAnimeList"
-            row1.append(InlineKeyboardButton(text=f"📖 {source_text}", url=anime.url))
-
-        # Ссылка на AnimeGO
-        if anime.animego_url:
-            row1.append(InlineKeyboardButton(text="👁️ AnimeGO", url=anime.animego_url))
-        else:
-            # Если нет прямой ссылки, создаем кнопку поиска
-            search_query = urllib.parse.quote(anime.title)
-            search_url = f"https://animego.me/search/anime?q={search_query}"
-            row1.append(InlineKeyboardButton(text="🔍 Найти на AnimeGO", url=search_url))
-
-        if row1:
-            keyboard_buttons.append(row1)
+        card = details_cards.get(version.id, version.updated_at)
+        if card is None:
+            anime = await anime_service.get_anime_by_source_and_id(source, anime_id, with_details=True)
+            if not anime:
+                await callback.message.answer("❌ Аниме не найдено в базе данных.")
+                return
+            card = render_details_card(anime)
+            details_cards.put(anime.id, anime.updated_at, card)
 
-        # Вторая строка: подписка
-        user_id = callback.from_user.id
         # Проверяем, подписан ли пользователь
-        subscription_service = SubscriptionsService(anime_service.db)
-        is_subscribed = await subscription_service.is_user_subscribed(user_id, anime.id)
-
-        row2 = []
-        if is_subscribed:
-            row2.append(InlineKeyboardButton(text="✅ Отписаться", callback_data=f"unsubscribe_{anime.id}"))
-        else:
-            row2.append(InlineKeyboardButton(text="🔔 Подписаться", callback_data=f"subscribe_{anime.id}"))
-
-        keyboard_buttons.append(row2)
-
-        # Третья строка: назад
-        row3 = []
-        row3.append(InlineKeyboardButton(text="🔙 Назад", callback_data="src_shikimori_1"))
-        keyboard_buttons.append(row3)
-
-        keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
+        subscription_service = SubscriptionsService(session)
+        is_subscribed = await subscription_service.is_user_subscribed(callback.from_user.id, version.id)
+        keyboard = card.keyboards[is_subscribed]
 
         # Отправляем сообщение
-        if anime.image_url and anime.image_url.strip():  # Проверяем, что URL не пустой
+        if card.image_url:
             try:
-                await callback.message.answer_photo(
-                    photo=anime.image_url,
-                    caption=info_text,
-                    reply_markup=keyboard,
-                    parse_mode="Markdown"
+                await send_details_photo(
+                    callback.message, anime_service, version.id, version.updated_at, card, keyboard
                 )
             except Exception as e:
                 logger.error(f"Ошибка отправки фото: {e}")
-                await callback.message.answer(info_text, reply_markup=keyboard, parse_mode="Markdown")
+                await callback.message.answer(card.caption, reply_markup=keyboard, parse_mode="Markdown")
         else:
-            await callback.message.answer(info_text, reply_markup=keyboard, parse_mode="Markdown")
+            await callback.message.answer(card.caption, reply_markup=keyboard, parse_mode="Markdown")
 
     except Exception as e:
         logger.error(f"Ошибка при отображении деталей аниме: {e}")
@@ -289,23 +419,16 @@ async def page_info_callback(callback: CallbackQuery):
 
 @router.message(Command("update"))
 async def update_anime_database(message: Message):
-    """Обновление базы данных аниме"""
+    """Обновление базы данных аниме: оба источника параллельно в фоне, прогресс - в одном сообщении"""
     user_id = message.from_user.id
     logger.info("User %s requested database update", user_id)
 
-    await message.answer("🔄 Обновляю базу данных аниме...")
-
-    try:
-        # Обновляем из обоих источников (добавлен await)
-        shikimori_count = await anime_service.update_all_ongoing_from_source("shikimori")
-        await message.answer(f"✅ Обновлено из Shikimori: {shikimori_count} аниме")
-
-        mal_count = await anime_service.update_all_ongoing_from_source("mal")
-        await message.answer(f"✅ Обновлено из MyAnimeList: {mal_count} аниме")
-
-        # Показываем статистику (добавлены await)
-        shikimori_count_db = await anime_service.get_ongoing_count_from_database("shikimori")
-        mal_count_db = await anime_service.get_ongoing_count_from_database("mal")
+    async def show_totals(outcomes):
+        # Показываем статистику
+        async with session_scope() as session:
+            anime_service = AnimeService(session)
+            shikimori_count_db = await anime_service.get_ongoing_count_from_database("shikimori")
+            mal_count_db = await anime_service.get_ongoing_count_from_database("mal")
         total_count = shikimori_count_db + mal_count_db
 
         await message.answer(
@@ -313,16 +436,14 @@ async def update_anime_database(message: Message):
             f"Всего онгоингов: {total_count}"
         )
 
-    except Exception as e:
-        logger.error(f"Error updating database: {e}")
-        await message.answer("❌ Ошибка при обновлении базы данных.")
+    refresh_jobs.submit(message, ("shikimori", "mal"), on_done=show_totals)
 
 
 # --- Обработчики подписки/отписки ---
 # Эти обработчики перемещены из subscriptions.py в этот файл, так как логика тесно связана с деталями аниме
 
 @router.callback_query(F.data.startswith("subscribe_"))
-async def subscribe_callback(callback: CallbackQuery):
+async def subscribe_callback(callback: CallbackQuery, session: AsyncSession):
     """Обработчик подписки на аниме"""
     await callback.answer()
 
@@ -331,7 +452,7 @@ async def subscribe_callback(callback: CallbackQuery):
         user_id = callback.from_user.id
 
         # Создаем экземпляр сервиса подписок
-        subscription_service = SubscriptionsService(anime_service.db)
+        subscription_service = SubscriptionsService(session)
         success = await subscription_service.subscribe_user_to_anime(user_id, anime_id)
 
         if success:
@@ -346,7 +467,7 @@ async def subscribe_callback(callback: CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("unsubscribe_"))
-async def unsubscribe_callback(callback: CallbackQuery):
+async def unsubscribe_callback(callback: CallbackQuery, session: AsyncSession):
     """Обработчик отписки от аниме"""
     await callback.answer()
 
@@ -355,7 +476,7 @@ async def unsubscribe_callback(callback: CallbackQuery):
         user_id = callback.from_user.id
 
         # Создаем экземпляр сервиса подписок
-        subscription_service = SubscriptionsService(anime_service.db)
+        subscription_service = SubscriptionsService(session)
         success = await subscription_service.unsubscribe_user_from_anime(user_id, anime_id)
 
         if success:
@@ -370,13 +491,13 @@ async def unsubscribe_callback(callback: CallbackQuery):
 
 
 @router.message(Command("subscriptions"))
-async def show_user_subscriptions(message: Message):
+async def show_user_subscriptions(message: Message, session: AsyncSession):
     """Показать список подписок пользователя"""
     user_id = message.from_user.id
     logger.info(f"User {user_id} requested subscriptions list")
 
     try:
-        subscription_service = SubscriptionsService(anime_service.db)
+        subscription_service = SubscriptionsService(session)
         subscriptions = await subscription_service.get_user_subscriptions(user_id)
 
         if not subscriptions:
@@ -4,7 +4,6 @@ from aiogram.types import Message
 import logging
 
 from ..services.subscription_service import SubscriptionsService
-from ..services.anime_service import anime_service
 
 router = Router()
 logger = logging.getLogger(__name__)
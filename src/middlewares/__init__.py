@@ -0,0 +1,2 @@
+from .db import DbSessionMiddleware
+from .notifications import ChatActivityMiddleware
@@ -0,0 +1,22 @@
+# src/middlewares/db.py
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from src.database.db import session_scope
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    """Выдает каждому апдейту собственную короткоживущую сессию БД из пула (аргумент session в хендлере)"""
+
+    def __init__(self, session_factory=session_scope):
+        self.session_factory = session_factory
+
+    async def __call__(self,
+                       handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject,
+                       data: Dict[str, Any]) -> Any:
+        async with self.session_factory() as session:
+            data["session"] = session
+            return await handler(event, data)
@@ -0,0 +1,23 @@
+# src/middlewares/notifications.py
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from src.services.notification_dispatcher import notification_dispatcher
+
+
+class ChatActivityMiddleware(BaseMiddleware):
+    """Пользователь, который снова пишет боту, больше не считается заблокировавшим его"""
+
+    def __init__(self, dispatcher=notification_dispatcher):
+        self.dispatcher = dispatcher
+
+    async def __call__(self,
+                       handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject,
+                       data: Dict[str, Any]) -> Any:
+        user = data.get("event_from_user")
+        if user and user.id in self.dispatcher.blocked_chats:
+            await self.dispatcher.unblock(user.id)
+        return await handler(event, data)
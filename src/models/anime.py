@@ -1,6 +1,6 @@
 # src/models/anime.py
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float, BigInteger
-from sqlalchemy.orm import relationship  # Опционально, если не используем связь
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float, BigInteger, Index
+from sqlalchemy.orm import relationship, deferred  # relationship опционально, если не используем связь
 from src.database.base import Base
 
 
@@ -11,7 +11,8 @@ class Anime(Base):
     title = Column(String, nullable=False)
     english_title = Column(String)
     japanese_title = Column(String)
-    synonyms = Column(Text)
+    # Тяжелые текстовые поля отложены (группа 'details') и грузятся только для карточки аниме
+    synonyms = deferred(Column(Text), group='details')
 
     source = Column(String, nullable=False)  # 'shikimori', 'mal', etc.
     source_id = Column(String)  # ID аниме в источнике (например, Shikimori ID)
@@ -30,13 +31,25 @@ class Anime(Base):
     released_on = Column(DateTime)  # Дата окончания выхода
 
     image_url = Column(String)  # URL изображения
-    genres = Column(Text)  # Жанры (хранятся как строка, например, JSON или через запятую)
+    image_file_id = Column(String)  # file_id постера в Telegram после первой отправки (сбрасывается при смене image_url)
+    genres = deferred(Column(Text), group='details')  # Жанры (хранятся как строка, например, JSON или через запятую)
     duration = Column(String)  # Длительность одного эпизода
-    description = Column(Text)  # Описание
+    description = deferred(Column(Text), group='details')  # Описание
+
+    content_hash = Column(String(16))  # Хэш нормализованной записи источника: неизменившиеся записи не пишутся в БД
 
     created_at = Column(DateTime)
     updated_at = Column(DateTime)
 
+    __table_args__ = (
+        # Уникальный ключ записи в источнике: по нему работает пакетный upsert (ON CONFLICT)
+        Index('ux_anime_source_source_id', 'source', 'source_id', unique=True),
+        # Списки и счетчики онгоингов по источнику (rowid в индексе дает порядок по id)
+        Index('ix_anime_source_status', 'source', 'status'),
+        # Поиск по названию
+        Index('ix_anime_title', 'title'),
+    )
+
     def __repr__(self):
         return f"<Anime(id={self.id}, title='{self.title}', source='{self.source}')>"
 
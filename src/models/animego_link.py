@@ -0,0 +1,17 @@
+# src/models/animego_link.py
+from sqlalchemy import Column, String, DateTime
+from datetime import datetime
+from src.database.base import Base
+
+class AnimeGoLink(Base):
+    """Кэш поиска на AnimeGO: название -> ссылка (NULL - не найдено).
+    До expires_at название повторно не ищется"""
+    __tablename__ = 'animego_links'
+
+    title = Column(String, primary_key=True)
+    url = Column(String)
+    checked_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<AnimeGoLink(title='{self.title}', url='{self.url}')>"
@@ -0,0 +1,14 @@
+# src/models/blocked_chat.py
+from sqlalchemy import Column, BigInteger, DateTime
+from datetime import datetime
+from src.database.base import Base
+
+class BlockedChat(Base):
+    """Чаты, где бот заблокирован: уведомления туда не отправляются, пока пользователь не напишет боту снова"""
+    __tablename__ = 'blocked_chats'
+
+    chat_id = Column(BigInteger, primary_key=True)
+    blocked_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<BlockedChat(chat_id={self.chat_id})>"
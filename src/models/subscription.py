@@ -1,5 +1,5 @@
 # src/models/subscription.py
-from sqlalchemy import Column, Integer, BigInteger, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, Integer, BigInteger, DateTime, ForeignKey, UniqueConstraint, Index
 # from sqlalchemy.orm import relationship # Опционально, если не используем связь
 from datetime import datetime
 from src.database.base import Base
@@ -12,8 +12,13 @@ class Subscription(Base):
     anime_id = Column(Integer, ForeignKey('anime.id'), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
-    # Уникальное ограничение: один пользователь не может подписаться на одно аниме дважды
-    __table_args__ = (UniqueConstraint('user_id', 'anime_id', name='_user_anime_uc'),)
+    __table_args__ = (
+        # Уникальное ограничение: один пользователь не может подписаться на одно аниме дважды
+        # (его индекс (user_id, anime_id) обслуживает и выборку подписок пользователя)
+        UniqueConstraint('user_id', 'anime_id', name='_user_anime_uc'),
+        # Подписчики аниме для рассылки: покрывающий индекс, таблица не читается
+        Index('ix_subscriptions_anime_user', 'anime_id', 'user_id'),
+    )
 
     def __repr__(self):
         return f"<Subscription(user_id={self.user_id}, anime_id={self.anime_id})>"
@@ -1,57 +1,130 @@
-import aiohttp
-import asyncio
+import re
+from contextlib import aclosing
+from datetime import datetime
+
+from src.utils.fetch_scheduler import FetchScheduler, fetch_scheduler
 
 BASE_URL = "https://api.jikan.moe/v4"
+HEADERS = {"User-Agent": "MyAnimeBot/1.0", "Accept": "application/json"}
 MAX_LIMIT = 25  # Максимальный лимит для seasons/now
+# Статусы Jikan в словаре Shikimori, чтобы сравнивать источники одинаково
+STATUSES = {
+    "Currently Airing": "ongoing",
+    "Finished Airing": "released",
+    "Not yet aired": "anons",
+}
 
 
-async def get_ongoing_anime_async(limit=10, page=1):
-    """Асинхронное получение онгоингов с MyAnimeList"""
+def parse_date(date_str):
+    """Дата Jikan в формате ISO (2024-04-06T00:00:00+00:00) в datetime без часового пояса или None"""
+    if not date_str:
+        return None
+    try:
+        return datetime.fromisoformat(date_str).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
+def parse_duration(duration: str):
+    """Длительность серии Jikan ("24 min per ep", "1 hr 30 min") в минутах, как у Shikimori"""
+    if not duration:
+        return None
+    hours = re.search(r"(\d+)\s*hr", duration)
+    minutes = re.search(r"(\d+)\s*min", duration)
+    total = (int(hours.group(1)) * 60 if hours else 0) + (int(minutes.group(1)) if minutes else 0)
+    return total or None
+
+
+def parse_anime(anime: dict):
+    """Преобразование записи Jikan API в словарь для БД (None, если нет ни URL, ни ID).
+    Jikan отдает в списке онгоингов полные записи, поэтому подробности берутся сразу"""
+    url = anime.get("url")
+    mal_id = anime.get("mal_id")
+    # Проверяем, что URL существует и корректен
+    if not (url and isinstance(url, str) and (url.startswith("http://") or url.startswith("https://"))):
+        print(f"[WARNING] Аниме без корректного URL: {anime.get('title', 'Unknown')}")
+        if not mal_id:
+            return None
+        # Формируем URL вручную
+        url = f"https://myanimelist.net/anime/{mal_id}"
+
+    aired = anime.get("aired") or {}
+    images = (anime.get("images") or {}).get("jpg") or {}
+    return {
+        "id": mal_id,
+        "title": anime.get("title"),
+        "english_title": anime.get("title_english"),
+        "japanese_title": anime.get("title_japanese"),
+        "synonyms": ", ".join(anime.get("title_synonyms") or []) or None,
+        "source": "mal",
+        "source_id": str(mal_id),
+        "url": url,
+        "type": (anime.get("type") or "").upper() or None,
+        "status": STATUSES.get(anime.get("status")),
+        "episodes": anime.get("episodes"),
+        "score": anime.get("score"),
+        "aired_on": parse_date(aired.get("from")),
+        "released_on": parse_date(aired.get("to")),
+        "image_url": images.get("large_image_url") or images.get("image_url"),
+        "genres": ", ".join(genre["name"] for genre in anime.get("genres") or [] if genre.get("name")) or None,
+        "duration": parse_duration(anime.get("duration")),
+        "description": anime.get("synopsis"),
+    }
+
+
+def details_url(mal_id) -> str:
+    """Запрос одного аниме со всеми подробностями"""
+    return f"{BASE_URL}/anime/{mal_id}"
+
+
+def parse_details(json_data: dict):
+    """Разбор ответа details_url"""
+    return parse_anime(json_data.get("data") or {})
+
+
+async def fetch_ongoing_page(page=1, limit=MAX_LIMIT, fetcher: FetchScheduler = None):
+    """Загрузка одной страницы онгоингов; при неудаче после всех повторов - FetchError.
+    Возвращает (список аниме, последняя страница, всего записей)"""
+    fetcher = fetcher or fetch_scheduler
     print(f"[LOG] Асинхронный запрос к MyAnimeList... Страница: {page}")
+    # Ограничиваем limit максимальным значением API
+    safe_limit = min(limit, MAX_LIMIT)
+
+    json_data = await fetcher.get_json(
+        f"{BASE_URL}/seasons/now",
+        params={
+            "limit": safe_limit,
+            "page": page
+        },
+        headers=HEADERS
+    )
+    data = json_data.get("data", [])
+    pagination = json_data.get("pagination", {})
+    last_visible_page = pagination.get("last_visible_page", 1)
+    total_items = pagination.get("items", {}).get("total", len(data))
+
+    print(f"[LOG] Ответ MAL: {len(data)} записей")
+    result = []
+    for anime in data:
+        parsed = parse_anime(anime)
+        if parsed:
+            result.append(parsed)
+
+    return result, last_visible_page, total_items
+
+
+async def fetch_anime(mal_id, fetcher: FetchScheduler = None):
+    """Загрузка одного аниме по ID (например, пропавшего из онгоингов); при неудаче - FetchError.
+    Ответы details_url кэширует только DetailEnricher, здесь нужен актуальный статус"""
+    fetcher = fetcher or fetch_scheduler
+    json_data = await fetcher.get_json(details_url(mal_id), headers=HEADERS, use_cache=False)
+    return parse_details(json_data)
+
+
+async def get_ongoing_anime_async(limit=10, page=1, fetcher: FetchScheduler = None):
+    """Асинхронное получение онгоингов с MyAnimeList"""
     try:
-        # Ограничиваем limit максимальным значением API
-        safe_limit = min(limit, MAX_LIMIT)
-
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                    f"{BASE_URL}/seasons/now",
-                    params={
-                        "limit": safe_limit,
-                        "page": page
-                    }
-            ) as resp:
-                resp.raise_for_status()
-                json_data = await resp.json()
-                data = json_data.get("data", [])
-                pagination = json_data.get("pagination", {})
-                last_visible_page = pagination.get("last_visible_page", 1)
-                items_per_page = pagination.get("items", {}).get("per_page", safe_limit)
-                total_items = pagination.get("items", {}).get("total", len(data))
-
-                print(f"[LOG] Ответ MAL: {len(data)} записей")
-                result = []
-                for anime in data:
-                    url = anime.get("url")
-                    # Проверяем, что URL существует и корректен
-                    if url and isinstance(url, str) and (url.startswith("http://") or url.startswith("https://")):
-                        result.append({
-                            "id": anime["mal_id"],
-                            "title": anime.get("title"),
-                            "url": url
-                        })
-                    else:
-                        print(f"[WARNING] Пропущено аниме без корректного URL: {anime.get('title', 'Unknown')}")
-                        # Можно попробовать сформировать URL вручную
-                        mal_id = anime.get("mal_id")
-                        if mal_id:
-                            fallback_url = f"https://myanimelist.net/anime/{mal_id}"
-                            result.append({
-                                "id": mal_id,
-                                "title": anime.get("title"),
-                                "url": fallback_url
-                            })
-
-                return result, last_visible_page, total_items
+        return await fetch_ongoing_page(page, limit, fetcher)
     except Exception as e:
         print(f"[ERROR] Ошибка асинхронного запроса к MAL: {e}")
         import traceback
@@ -59,29 +132,39 @@ async def get_ongoing_anime_async(limit=10, page=1):
         return [], 1, 0
 
 
-async def fetch_all_ongoing_anime_mal():
-    """Асинхронная загрузка всех онгоингов с MAL"""
-    try:
-        # Сначала получаем первую страницу чтобы узнать общее количество
-        first_page_data, last_visible_page, total_items = await get_ongoing_anime_async(limit=25, page=1)
+async def iter_ongoing_pages(fetcher: FetchScheduler = None, max_in_flight: int = None):
+    """Асинхронный генератор: (номер страницы, список аниме) по мере загрузки страниц.
+    Для страницы, которую не удалось загрузить после всех повторов, список равен None"""
+    fetcher = fetcher or fetch_scheduler
 
-        if not first_page_data:
-            return [], 0, 0
+    # Сначала получаем первую страницу чтобы узнать общее количество
+    first = await fetcher.fetch_pages(lambda page: fetch_ongoing_page(page, MAX_LIMIT, fetcher), [1])
+    if not first.results:
+        yield 1, None
+        return
+    first_page_data, last_visible_page, total_items = first.results[1]
+    yield 1, first_page_data
 
-        # Создаем задачи для всех остальных страниц
-        tasks = []
-        for page in range(2, last_visible_page + 1):
-            tasks.append(get_ongoing_anime_async(limit=25, page=page))
+    # Остальные страницы - темп задает планировщик запросов
+    pages = fetcher.iter_pages(
+        lambda page: fetch_ongoing_page(page, MAX_LIMIT, fetcher),
+        range(2, last_visible_page + 1),
+        max_in_flight
+    )
+    # Закрытие этого генератора закрывает и загрузку страниц (отменяет запросы в полете)
+    async with aclosing(pages):
+        async for page, result, _ in pages:
+            yield page, (result[0] if result is not None else None)
 
-        # Выполняем все запросы параллельно
-        all_other_pages = await asyncio.gather(*tasks)
 
-        # Объединяем все данные
-        all_anime = first_page_data.copy()
-        for page_data, _, _ in all_other_pages:
+async def fetch_all_ongoing_anime_mal(fetcher: FetchScheduler = None):
+    """Асинхронная загрузка всех онгоингов с MAL.
+    Возвращает (список аниме, номера незагруженных страниц)"""
+    all_anime = []
+    failed_pages = []
+    async for page, page_data in iter_ongoing_pages(fetcher):
+        if page_data is None:
+            failed_pages.append(page)
+        else:
             all_anime.extend(page_data)
-
-        return all_anime, last_visible_page, total_items
-    except Exception as e:
-        print(f"[ERROR] Ошибка при загрузке всех онгоингов с MAL: {e}")
-        return [], 1, 0
\ No newline at end of file
+    return all_anime, sorted(failed_pages)
@@ -1,10 +1,13 @@
-import aiohttp
+from contextlib import aclosing
 from datetime import datetime
 
+from src.utils.fetch_scheduler import FetchScheduler, fetch_scheduler
+
 BASE_URL = "https://shikimori.one/api"
 HEADERS = {"User-Agent": "MyAnimeBot/1.0"}
 VALID_TYPES = {"TV", "OVA", "ONA", "MOVIE", "SPECIAL"}
 DEFAULT_LIMIT = 50
+MAX_PAGES = 20  # Ограничение на количество загружаемых страниц
 
 def parse_date(date_str):
     """Парсинг даты из строки в формате YYYY-MM-DD в объект datetime или возвращает None"""
@@ -15,88 +18,161 @@ def parse_date(date_str):
     except ValueError:
         return None
 
-async def get_ongoing_anime_async(limit=DEFAULT_LIMIT, page=1):
-    """Асинхронное получение онгоингов с Shikimori с полной информацией"""
+def parse_anime(anime: dict):
+    """Преобразование записи Shikimori API в словарь для БД (None, если тип не подходит)"""
+    # Фильтр по типам аниме
+    kind = anime.get("kind", "").upper()
+    if kind not in VALID_TYPES:
+        return None
+
+    # Парсим даты
+    aired_on = parse_date(anime.get("aired_on"))
+    released_on = parse_date(anime.get("released_on"))
+
+    # Формируем URL
+    url_path = anime.get("url", "")
+    full_url = f"https://shikimori.one{url_path}" if url_path else None
+
+    # Извлекаем жанры и синонимы. В списке онгоингов их нет: None, чтобы не затереть
+    # уже загруженные подробности пустой строкой
+    genres = ", ".join([g.get("russian", g.get("name")) for g in anime.get("genres") or []]) or None
+    synonyms = ", ".join(anime.get("synonyms") or []) or None
+
+    return {
+        "id": anime["id"],
+        "title": anime.get("russian") or anime.get("name"),
+        "english_title": anime.get("name"),
+        "japanese_title": anime.get("japanese"),
+        "synonyms": synonyms,
+        "source": "shikimori",
+        "source_id": str(anime["id"]),
+        "url": full_url,
+        "type": kind,
+        "status": anime.get("status"),
+        "episodes": anime.get("episodes"),
+        "episodes_aired": anime.get("episodes_aired"),
+        "score": anime.get("score"),
+        "aired_on": aired_on,
+        "released_on": released_on,
+        "image_url": anime.get("image", {}).get("original"),
+        "genres": genres,
+        "duration": anime.get("duration"),
+        "description": anime.get("description"),
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow()
+    }
+
+async def fetch_ongoing_page(page=1, limit=DEFAULT_LIMIT, fetcher: FetchScheduler = None) -> list:
+    """Загрузка одной страницы онгоингов; при неудаче после всех повторов - FetchError"""
+    fetcher = fetcher or fetch_scheduler
     print(f"[LOG] Асинхронный запрос к Shikimori... Страница: {page}, Лимит: {limit}")
+    data = await fetcher.get_json(
+        f"{BASE_URL}/animes",
+        params={
+            "status": "ongoing",
+            "limit": limit,
+            "order": "ranked",
+            "page": page
+        },
+        headers=HEADERS
+    )
+    print(f"[LOG] Ответ Shikimori: {len(data)} записей")
+    result = []
+    for anime in data:
+        parsed = parse_anime(anime)
+        if parsed:
+            result.append(parsed)
+    return result
+
+def details_url(anime_id) -> str:
+    """Запрос одного аниме со всеми подробностями (описание, жанры, длительность)"""
+    return f"{BASE_URL}/animes/{anime_id}"
+
+def parse_details(data: dict):
+    """Разбор ответа details_url"""
+    return parse_anime(data)
+
+async def fetch_anime(anime_id, fetcher: FetchScheduler = None):
+    """Загрузка одного аниме по ID (например, пропавшего из онгоингов); при неудаче - FetchError.
+    Ответы details_url кэширует только DetailEnricher, здесь нужен актуальный статус"""
+    fetcher = fetcher or fetch_scheduler
+    data = await fetcher.get_json(details_url(anime_id), headers=HEADERS, use_cache=False)
+    return parse_details(data)
+
+async def fetch_anime_batch(anime_ids, fetcher: FetchScheduler = None) -> list:
+    """Загрузка нескольких аниме по ID одним запросом; при неудаче - FetchError.
+    Адаптивному опросу нужны актуальные данные: кэшированный ответ всегда проверяется сервером"""
+    fetcher = fetcher or fetch_scheduler
+    data = await fetcher.get_json(
+        f"{BASE_URL}/animes",
+        params={
+            "ids": ",".join(str(anime_id) for anime_id in anime_ids),
+            "limit": len(anime_ids)
+        },
+        headers=HEADERS,
+        cache_ttl=0
+    )
+    return [parsed for parsed in (parse_anime(anime) for anime in data) if parsed]
+
+async def get_ongoing_anime_async(limit=DEFAULT_LIMIT, page=1, fetcher: FetchScheduler = None):
+    """Асинхронное получение онгоингов с Shikimori с полной информацией"""
     try:
-        async with aiohttp.ClientSession(headers=HEADERS) as session:
-            async with session.get(
-                f"{BASE_URL}/animes",
-                params={
-                    "status": "ongoing",
-                    "limit": limit,
-                    "order": "ranked",
-                    "page": page
-                }
-            ) as resp:
-                resp.raise_for_status()
-                data = await resp.json()
-                print(f"[LOG] Ответ Shikimori: {len(data)} записей")
-                result = []
-                for anime in data:
-                    # Фильтр по типам аниме
-                    kind = anime.get("kind", "").upper()
-                    if kind not in VALID_TYPES:
-                        continue
-
-                    # Парсим даты
-                    aired_on = parse_date(anime.get("aired_on"))
-                    released_on = parse_date(anime.get("released_on"))
-
-                    # Формируем URL
-                    url_path = anime.get("url", "")
-                    full_url = f"https://shikimori.one{url_path}" if url_path else None
-
-                    # Извлекаем жанры и синонимы
-                    genres = ", ".join([g.get("russian", g.get("name")) for g in anime.get("genres", [])])
-                    synonyms = ", ".join(anime.get("synonyms", []))
-
-                    result.append({
-                        "id": anime["id"],
-                        "title": anime.get("russian") or anime.get("name"),
-                        "english_title": anime.get("name"),
-                        "japanese_title": anime.get("japanese"),
-                        "synonyms": synonyms,
-                        "source": "shikimori",
-                        "source_id": str(anime["id"]),
-                        "url": full_url,
-                        "type": kind,
-                        "status": anime.get("status"),
-                        "episodes": anime.get("episodes"),
-                        "episodes_aired": anime.get("episodes_aired"),
-                        "score": anime.get("score"),
-                        "aired_on": aired_on,
-                        "released_on": released_on,
-                        "image_url": anime.get("image", {}).get("original"),
-                        "genres": genres,
-                        "duration": anime.get("duration"),
-                        "description": anime.get("description"),
-                        "created_at": datetime.utcnow(),
-                        "updated_at": datetime.utcnow()
-                    })
-                return result
+        return await fetch_ongoing_page(page, limit, fetcher)
     except Exception as e:
         print(f"[ERROR] Ошибка асинхронного запроса к Shikimori: {e}")
         import traceback
         traceback.print_exc()
         return []
 
-async def get_ongoing_anime_count_async():
+async def get_ongoing_anime_count_async(fetcher: FetchScheduler = None):
     """Асинхронное получение приблизительного количества онгоингов"""
+    fetcher = fetcher or fetch_scheduler
     try:
-        async with aiohttp.ClientSession(headers=HEADERS) as session:
-            async with session.get(
-                f"{BASE_URL}/animes",
-                params={
-                    "status": "ongoing",
-                    "limit": 1, # Запрашиваем только 1, чтобы получить X-Total-Count
-                    "order": "ranked"
-                }
-            ) as resp:
-                resp.raise_for_status()
-                total_count = int(resp.headers.get('X-Total-Count', 0))
-                print(f"[LOG] Общее количество онгоингов на Shikimori: {total_count}")
-                return total_count
+        resp = await fetcher.fetch(
+            f"{BASE_URL}/animes",
+            params={
+                "status": "ongoing",
+                "limit": 1, # Запрашиваем только 1, чтобы получить X-Total-Count
+                "order": "ranked"
+            },
+            headers=HEADERS
+        )
+        total_count = int(resp.headers.get('X-Total-Count', 0))
+        print(f"[LOG] Общее количество онгоингов на Shikimori: {total_count}")
+        return total_count
     except Exception as e:
         print(f"[ERROR] Ошибка получения количества онгоингов с Shikimori: {e}")
-        return 100
\ No newline at end of file
+        return 100
+
+async def get_ongoing_pages_count_async(fetcher: FetchScheduler = None) -> int:
+    """Количество страниц онгоингов для загрузки (с учетом MAX_PAGES)"""
+    total_anime_count = await get_ongoing_anime_count_async(fetcher)
+    total_pages = min((total_anime_count // DEFAULT_LIMIT) + 1, MAX_PAGES)
+    print(f"[LOG] Будет загружено {total_pages} страниц из Shikimori")
+    return total_pages
+
+async def iter_ongoing_pages(fetcher: FetchScheduler = None, max_in_flight: int = None):
+    """Асинхронный генератор: (номер страницы, список аниме) по мере загрузки страниц.
+    Для страницы, которую не удалось загрузить после всех повторов, список равен None"""
+    fetcher = fetcher or fetch_scheduler
+    total_pages = await get_ongoing_pages_count_async(fetcher)
+    pages = fetcher.iter_pages(
+        lambda page: fetch_ongoing_page(page, DEFAULT_LIMIT, fetcher),
+        range(1, total_pages + 1),
+        max_in_flight
+    )
+    # Закрытие этого генератора закрывает и загрузку страниц (отменяет запросы в полете)
+    async with aclosing(pages):
+        async for page, page_data, _ in pages:
+            yield page, page_data
+
+async def fetch_all_ongoing_anime_shikimori(fetcher: FetchScheduler = None):
+    """Загрузка всех страниц онгоингов. Возвращает (список аниме, номера незагруженных страниц)"""
+    all_anime = []
+    failed_pages = []
+    async for page, page_data in iter_ongoing_pages(fetcher):
+        if page_data is None:
+            failed_pages.append(page)
+        else:
+            all_anime.extend(page_data)
+    return all_anime, sorted(failed_pages)
@@ -1,16 +1,32 @@
 # src/scheduler.py
 import asyncio
 import logging
-from datetime import datetime, timedelta
+import math
+from datetime import datetime
+
+from src.database.db import session_scope
+from src.services.subscription_service import SubscriptionsService
+from src.services.notification_dispatcher import notification_dispatcher
+from src.services.digest import build_digests
+from src.services.diff_engine import DiffEngine
+from src.services.enrichment import DetailEnricher
+from src.services.airing_schedule import AiringSchedule, poll_budget
+from src.services.animego_resolver import animego_resolver
+from src.config import SWEEP_INTERVAL
+from src.utils.fetch_scheduler import fetch_scheduler, http_cache
 
 logger = logging.getLogger(__name__)
 
 
 class AnimeUpdateScheduler:
-    def __init__(self, anime_service, bot):
-        self.anime_service = anime_service
-        self.bot = bot
+    def __init__(self, session_factory=session_scope, notifier=notification_dispatcher):
+        self.session_factory = session_factory # Каждая задача открывает свою сессию из пула
+        self.notifier = notifier
         self.is_running = False
+        self.airing_schedule = AiringSchedule()
+        self.sweep_requests = {}  # источник -> запросов последнего полного прохода (оценка)
+        self._sweep_done = asyncio.Event()
+        self._tasks = []
 
 
     async def update_anime_episodes_task(self):
@@ -20,118 +36,200 @@ class AnimeUpdateScheduler:
                 logger.info("Начинаем автоматическое обновление количества эпизодов...")
 
                 # Обновляем только количество эпизодов для онгоингов
-                shikimori_updated = await self._update_episodes_for_source("shikimori")
-                mal_updated = await self._update_episodes_for_source("mal")
+                changes = []
+                shikimori_updated = await self._update_episodes_for_source("shikimori", changes)
+                mal_updated = await self._update_episodes_for_source("mal", changes)
 
                 logger.info(f"Автоматическое обновление завершено. "
                             f"Shikimori: {shikimori_updated}, MAL: {mal_updated}")
 
-                # Ждем 12 часов до следующего обновления
-                await asyncio.sleep(12 * 60 * 60)  # 12 часов в секундах
+                # Все изменения прохода - одним дайджестом на пользователя
+                await self.send_digests(changes)
+
+                # Опрос берет долю лимита запросов к Shikimori, оставшуюся от полного прохода
+                budget = self.airing_schedule.budget
+                budget.per_day = poll_budget(self.sweep_requests.get("shikimori", 0))
+                logger.info(f"Запросов полного прохода: {self.sweep_requests}; бюджет адаптивного опроса "
+                            f"{budget.per_day:.1f} запросов в сутки, с запуска потрачено {budget.spent}")
+
+                # Очередь адаптивного опроса подхватывает новые и завершенные онгоинги
+                self._sweep_done.set()
+
+                # Ссылки AnimeGO для аниме без ссылки - в фоне, с кэшем результатов поиска
+                animego_resolver.schedule()
+
+                # Кэши на диске чистит cache_pruner по своему расписанию
+                if http_cache is not None:
+                    http_cache.log_stats()
+
+                # Между проходами серии рядом с ожидаемым выходом отслеживает адаптивный опрос
+                await asyncio.sleep(SWEEP_INTERVAL)
 
             except Exception as e:
                 logger.error(f"Ошибка в фоновой задаче обновления: {e}")
+                self._sweep_done.set()
                 # Ждем 1 час перед повторной попыткой
                 await asyncio.sleep(60 * 60)
 
 
-    async def _update_episodes_for_source(self, source: str) -> int:
-        """Обновление количества эпизодов и статусов для конкретного источника"""
+    async def _update_episodes_for_source(self, source: str, changes: list = None) -> int:
+        """Полный проход по онгоингам источника: снимок из API сравнивается с БД,
+        изменения пишутся одной транзакцией. События изменений добавляются в changes"""
         try:
-            updated_count = 0
-            finished_anime_list = []
-
             if source == "shikimori":
-                from src.parsers.shikimori import get_ongoing_anime_async
-
-                animes_data = await get_ongoing_anime_async(limit=100, page=1)
-
-                for anime_data in animes_data:
-                    try:
-                        existing_anime = await self.anime_service.get_anime_by_source_and_id(source, anime_data["id"])
-
-                        if existing_anime:
-                            was_ongoing = existing_anime.status == "ongoing"
-                            updated = False
-
-                            new_episodes_aired = anime_data.get("episodes_aired")
-                            if (new_episodes_aired is not None and
-                                    new_episodes_aired != existing_anime.episodes_aired):
-                                existing_anime.episodes_aired = new_episodes_aired
-                                updated = True
-
-                            new_status = anime_data.get("status")
-                            if new_status and new_status != existing_anime.status:
-                                if was_ongoing and new_status in ["released", "completed"]:
-                                    finished_anime_list.append(existing_anime)
-                                    logger.info(f"Аниме завершено: {existing_anime.title}")
-                                    # Здесь будет функцию для уведомления подписчиков
-                                    # await self._notify_subscribers_about_finish(existing_anime)
-                                # === КОНЕЦ ДОБАВЛЕНИЯ ===
-                                existing_anime.status = new_status
-                                updated = True
-
-                            new_episodes_total = anime_data.get("episodes")
-                            if (new_episodes_total is not None and
-                                    new_episodes_total != existing_anime.episodes):
-                                existing_anime.episodes = new_episodes_total
-                                updated = True
-
-                            if updated:
-                                existing_anime.updated_at = datetime.utcnow()
-                                await self.anime_service.db.commit()  # Предполагается, что у anime_service есть атрибут db
-                                updated_count += 1
-
-                    except Exception as e:
-                        logger.error(f"Ошибка обновления эпизодов для аниме из {source}: {e}")
-
-            logger.info(f"Обновление для {source} завершено. Обновлено записей: {updated_count}")
-
-            return updated_count
+                from src.parsers.shikimori import fetch_all_ongoing_anime_shikimori as fetch_all, fetch_anime
+                from src.parsers.shikimori import DEFAULT_LIMIT as page_size
+            elif source == "mal":
+                from src.parsers.mal import fetch_all_ongoing_anime_mal as fetch_all, fetch_anime
+                from src.parsers.mal import MAX_LIMIT as page_size
+            else:
+                logger.error(f"Неизвестный источник: {source}")
+                return 0
+
+            snapshot, failed_pages = await fetch_all()
+            if not snapshot:
+                logger.warning(f"Онгоинги {source} не загружены, проход пропущен")
+                return 0
+            self.sweep_requests[source] = math.ceil(len(snapshot) / page_size) + len(failed_pages)
+
+            async def lookup(source_ids):
+                self.sweep_requests[source] += len(source_ids)
+                batch = await fetch_scheduler.fetch_pages(fetch_anime, source_ids)
+                return list(batch.results.values())
+
+            if failed_pages:
+                logger.warning(f"Выдача {source} загружена не полностью (страницы {failed_pages}), "
+                               f"пропавшие онгоинги не проверяются")
+
+            enricher = DetailEnricher()
+
+            async def enrich(records):
+                return await enricher.enrich(source, records)
+
+            async with self.session_factory() as session:
+                result = await DiffEngine(session).apply(
+                    source, snapshot, complete=not failed_pages, lookup=lookup, enrich=enrich
+                )
+
+            if changes is not None:
+                changes.extend(result.events)
+
+            logger.info(f"Обновление для {source} завершено. Обновлено записей: {result.updated}")
+            return result.updated
         except Exception as e:
             logger.error(f"Ошибка в _update_episodes_for_source для {source}: {e}")
             return 0
 
 
-    async def notify_subscribers_about_new_episodes(self, anime, old_episodes_aired, new_episodes_aired):
-        """Уведомление подписчиков о новых сериях"""
-        try:
-            # Получаем список подписчиков
-            subscribers = await self.anime_service.get_anime_subscribers(anime.id)
-
-            if not subscribers:
-                return
-
-            # Формируем сообщение
-            message_text = f"🔔 *Новые серии!*\n\n"
-            message_text += f"🎬 *{anime.title}*\n"
-            message_text += f"📺 Вышло серий: {old_episodes_aired} → {new_episodes_aired}\n\n"
-            message_text += "Проверьте, может уже можно смотреть! 🍿"
-
-            # Отправляем уведомления всем подписчикам
-            for user_id in subscribers:
-                try:
-                    await self.bot.send_message(
-                        user_id,
-                        message_text,
-                        parse_mode="Markdown"
-                    )
-                except Exception as e:
-                    logger.error(f"Не удалось отправить уведомление пользователю {user_id}: {e}")
-
-            logger.info(f"Отправлено уведомлений о новых сериях для {anime.title}: {len(subscribers)} пользователей")
+    async def adaptive_polling_task(self):
+        """Опрос онгоингов Shikimori по прогнозу выхода серий в дополнение к полному проходу:
+        рядом с ожидаемым выходом - каждые несколько минут, дальше реже. Аниме, чьи серии ожидаются
+        в одно время, опрашиваются вместе одним запросом по ID, «спящие» остаются полному проходу.
+        Число запросов ограничено долей лимита Shikimori (см. poll_budget).
+        MAL не опрашивается: в его выдаче нет числа вышедших серий (см. airing_schedule)"""
+        await self._sweep_done.wait()
+        while self.is_running:
+            try:
+                if self._sweep_done.is_set():
+                    self._sweep_done.clear()
+                    async with self.session_factory() as session:
+                        await self.airing_schedule.sync(session, "shikimori")
+                    logger.info(f"Адаптивный опрос: отслеживается {len(self.airing_schedule)} онгоингов, "
+                                f"слотов ожидания {len(self.airing_schedule.slots)}")
+
+                next_due = self.airing_schedule.next_due()
+                delay = SWEEP_INTERVAL if next_due is None else (next_due - datetime.utcnow()).total_seconds()
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(self._sweep_done.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
 
+                await self._poll_due_titles()
+            except Exception as e:
+                logger.error(f"Ошибка в адаптивном опросе: {e}")
+                await asyncio.sleep(60)
+
+
+    async def _poll_due_titles(self) -> int:
+        """Опросить слоты, которым пора, и разослать изменения. Возвращает число опрошенных аниме"""
+        from src.parsers.shikimori import fetch_anime_batch
+
+        now = datetime.utcnow()
+        schedule = self.airing_schedule
+        due = schedule.pop_due(now)
+        if not due:
+            return 0
+
+        batches = schedule.batches(due)
+        granted = schedule.budget.grant(len(batches), now)
+        records = {}
+        for batch in batches[:granted]:
+            try:
+                for record in await fetch_anime_batch([state.source_id for state in batch]):
+                    records[str(record["source_id"])] = record
+            except Exception as e:
+                logger.warning(f"Адаптивный опрос: не удалось загрузить {len(batch)} аниме: {e}")
+
+        changes = []
+        if records:
+            async with self.session_factory() as session:
+                result = await DiffEngine(session).apply("shikimori", list(records.values()), complete=False)
+            changes = result.events
+
+        # Неопрошенные слоты (бюджет, ошибка) повторяются, когда накопится следующий запрос
+        now = datetime.utcnow()
+        retry_at = schedule.budget.next_request_at(now)
+        advanced = sum(schedule.reschedule(slot, index, states, records, now, retry_at)
+                       for slot, index, states in due)
+        polled = sum(len(batch) for batch in batches[:granted])
+        logger.info(f"Адаптивный опрос: слотов {len(due)}, запросов {granted} из {len(batches)}, "
+                    f"опрошено аниме {polled}, с новыми сериями {advanced}")
+        await self.send_digests(changes)
+        return polled
+
+
+    async def send_digests(self, changes: list) -> int:
+        """Один дайджест на пользователя вместо отдельного сообщения на каждое аниме (changes - ChangeEvent).
+        Возвращает количество поставленных в очередь сообщений"""
+        if not changes:
+            return 0
+        try:
+            async with self.session_factory() as session:
+                subscribers = await SubscriptionsService(session).get_subscribers_for(
+                    {change.anime_id for change in changes}
+                )
+
+            digests = build_digests(changes, subscribers)
+            queued = 0
+            for user_id, messages in digests.items():
+                for message_text in messages:
+                    queued += await self.notifier.notify([user_id], message_text, parse_mode="Markdown")
+
+            per_anime = sum(len(user_ids) for user_ids in subscribers.values())
+            logger.info(f"Дайджест: событий {len(changes)}, пользователей {len(digests)}, "
+                        f"сообщений {queued} (отдельными уведомлениями было бы {per_anime})")
+            return queued
         except Exception as e:
-            logger.error(f"Ошибка при уведомлении подписчиков об аниме {anime.id}: {e}")
+            logger.error(f"Ошибка при рассылке дайджеста: {e}")
+            return 0
 
 
     def start(self):
         """Запуск планировщика"""
         self.is_running = True
-        # Запускаем задачу в фоне
-        asyncio.create_task(self.update_anime_episodes_task())
+        # Ссылки на задачи держим: иначе их может собрать сборщик мусора, и их не отменить в stop()
+        self._tasks = [
+            asyncio.create_task(self.update_anime_episodes_task()),
+            asyncio.create_task(self.adaptive_polling_task()),
+        ]
 
 
-    def stop(self):
-        """Остановка планировщика"""
-        self.is_running = False
\ No newline at end of file
+    async def stop(self):
+        """Остановка планировщика: фоновые задачи отменяются, не дожидаясь конца паузы"""
+        self.is_running = False
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
\ No newline at end of file
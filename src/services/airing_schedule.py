@@ -0,0 +1,305 @@
+# src/services/airing_schedule.py
+import heapq
+import logging
+from collections import deque
+from datetime import datetime, timedelta
+from statistics import median
+from typing import NamedTuple
+
+from sqlalchemy import select, and_
+
+from src.config import (
+    POLL_SLOT as _SLOT,
+    POLL_NEAR_INTERVAL,
+    POLL_WINDOW,
+    POLL_DAY_INTERVAL,
+    POLL_COALESCE as _COALESCE,
+    POLL_DEFAULT_CADENCE as _CADENCE,
+    POLL_HOST_SHARE,
+    POLL_BATCH_SIZE,
+    SWEEP_INTERVAL,
+    FETCH_HOST_LIMITS,
+)
+from src.models.anime import Anime
+
+logger = logging.getLogger(__name__)
+
+# Опрашиваются только онгоинги Shikimori: в выдаче Jikan (MAL) нет числа вышедших серий,
+# его дает лишь /anime/{id}/episodes - отдельный постраничный запрос на каждое аниме,
+# который нельзя объединить в один запрос на слот. MAL обновляется полным проходом, как и раньше.
+# Опрос только добавляется к полному проходу раз в SWEEP_INTERVAL: ни один источник не узнает
+# об изменениях позже прежнего
+
+
+def window_offsets(near: int = POLL_NEAR_INTERVAL, window: int = POLL_WINDOW,
+                   limit: int = SWEEP_INTERVAL) -> tuple:
+    """Опросы слота от его начала: каждые near секунд до window, затем с удвоением интервала,
+    пока до следующего опроса не быстрее дождаться полного прохода (limit)"""
+    offsets = list(range(near, window + 1, near))
+    offset, step = offsets[-1], near * 2
+    while offset + step < limit:
+        offset += step
+        offsets.append(offset)
+        step *= 2
+    return tuple(timedelta(seconds=offset) for offset in offsets)
+
+
+POLL_SLOT = timedelta(seconds=_SLOT)
+POLL_OFFSETS = window_offsets()
+POLL_DAY_OFFSETS = tuple(timedelta(seconds=offset)
+                         for offset in range(POLL_DAY_INTERVAL, 24 * 60 * 60 + 1, POLL_DAY_INTERVAL))
+POLL_DEFAULT_CADENCE = timedelta(seconds=_CADENCE)
+POLL_COALESCE = timedelta(seconds=_COALESCE)
+DAY = timedelta(days=1)
+# Отсчет слотов (понедельник, полночь UTC)
+EPOCH = datetime(2000, 1, 3)
+
+# Сколько последних выходов серий помнить для оценки периодичности
+HISTORY_SIZE = 6
+# Серии выходят не чаще раза в сутки (две серии подряд в один день - это одна премьера)
+MIN_CADENCE = DAY
+# После стольких пропущенных окон подряд аниме не опрашивается: его отслеживает полный проход
+DORMANT_AFTER = 3
+# Лимит запросов к Shikimori, из которого опрос берет свою долю
+SHIKIMORI_RPS = FETCH_HOST_LIMITS["shikimori.one"][0]
+
+
+def slot_start(moment: datetime, size: timedelta) -> datetime:
+    return EPOCH + (moment - EPOCH) // size * size
+
+
+def poll_budget(sweep_requests: int,
+                sweep_interval: float = SWEEP_INTERVAL,
+                share: float = POLL_HOST_SHARE,
+                rps: float = SHIKIMORI_RPS) -> float:
+    """Запросов в сутки на адаптивный опрос: доля share от лимита запросов к Shikimori за вычетом
+    того, что за сутки тратит полный проход (sweep_requests запросов раз в sweep_interval)"""
+    per_day = 24 * 60 * 60
+    return max(0.0, share * rps * per_day - sweep_requests * per_day / sweep_interval)
+
+
+class Slot(NamedTuple):
+    """Полчаса (или сутки, если известен только день), в которые ожидается выход серий"""
+    start: datetime
+    precise: bool  # известно время выхода, а не только день
+
+    @property
+    def offsets(self) -> tuple:
+        return POLL_OFFSETS if self.precise else POLL_DAY_OFFSETS
+
+
+class PollBudget:
+    """Сколько запросов может сделать опрос: per_day в сутки, накопление до часовой нормы"""
+
+    def __init__(self, per_day: float = 0.0):
+        self.per_day = per_day
+        self.tokens = 0.0
+        self.updated = None
+        self.spent = 0
+        self.denied = 0
+
+    def grant(self, requests: int, now: datetime) -> int:
+        """Сколько из requests запросов можно сделать сейчас"""
+        if self.updated is not None:
+            elapsed = (now - self.updated).total_seconds()
+            capacity = max(self.per_day / 24, 1.0)
+            self.tokens = min(capacity, self.tokens + elapsed * self.per_day / (24 * 60 * 60))
+        self.updated = now
+        granted = min(requests, int(self.tokens + 1e-9))
+        self.tokens -= granted
+        self.spent += granted
+        self.denied += requests - granted
+        return granted
+
+    def next_request_at(self, now: datetime) -> datetime:
+        """Когда накопится следующий запрос (после grant на момент now)"""
+        if self.per_day <= 0:
+            return now + DAY
+        return now + timedelta(seconds=max(1.0, (1 - self.tokens) * 24 * 60 * 60 / self.per_day))
+
+
+class TitleState:
+    """Что известно о выходе серий одного аниме"""
+
+    def __init__(self, anime_id: int, source_id: str, episodes_aired: int, aired_on: datetime):
+        self.anime_id = anime_id
+        self.source_id = source_id
+        self.episodes_aired = episodes_aired or 0
+        self.aired_on = aired_on
+        self.history = deque(maxlen=HISTORY_SIZE)  # слоты, в которых опрос заметил новые серии
+        self.misses = 0  # окон подряд, в которые серия так и не вышла
+        self.slot = None  # слот ожидания; None - «спящее» аниме, только полный проход
+        self.last_miss = None  # последний опрос в текущем окне, не заставший новой серии
+
+    def cadence(self) -> timedelta:
+        """Периодичность выхода серий: медиана наблюдаемых интервалов, по умолчанию неделя"""
+        if len(self.history) >= 2:
+            times = list(self.history)
+            return max(MIN_CADENCE, median(b - a for a, b in zip(times, times[1:])))
+        return POLL_DEFAULT_CADENCE
+
+    def expected_air(self):
+        """Ожидаемый выход следующей серии и известно ли его время (по дате начала показа - только день)"""
+        if self.history:
+            return self.history[-1] + self.cadence(), True
+        if self.aired_on:
+            return self.aired_on + self.cadence() * self.episodes_aired, False
+        return None, False
+
+    def next_slot(self, now: datetime):
+        """Слот ожидаемого выхода, окно опросов которого еще не закончилось. Пропущенное окно -
+        вероятно, перерыв: целимся в следующий выход. После DORMANT_AFTER пропусков подряд - None"""
+        expected, precise = self.expected_air()
+        if expected is None:
+            return None
+        size = POLL_SLOT if precise else DAY
+        slot = Slot(slot_start(expected, size), precise)
+        missed = 0
+        while slot.start + slot.offsets[-1] <= now:
+            missed += 1
+            slot = Slot(slot_start(expected + self.cadence() * missed, size), precise)
+        self.misses = max(self.misses, missed)
+        return slot if self.misses < DORMANT_AFTER else None
+
+    def detected_slot(self, now: datetime) -> datetime:
+        """Слот, к которому привязать замеченную сейчас серию. Серия вышла после последнего
+        промаха в окне; если опрос застал ее с первой попытки - в следующий раз начинаем раньше"""
+        if self.last_miss is not None:
+            return slot_start(self.last_miss, POLL_SLOT)
+        return slot_start(now, POLL_SLOT) - POLL_SLOT
+
+    def observe(self, episodes_aired, detected: datetime = None) -> bool:
+        """Учесть новое число серий. detected - слот выхода, если серию заметил опрос.
+        Полный проход узнает о серии с опозданием до суток: время по нему не уточняется,
+        серия считается вышедшей по прогнозу. True, если вышли новые серии"""
+        if episodes_aired is None or episodes_aired <= self.episodes_aired:
+            return False
+        self.episodes_aired = episodes_aired
+        if detected is not None:
+            self.history.append(detected)
+        elif self.history:
+            self.history.append(self.history[-1] + self.cadence())
+        self.misses = 0
+        return True
+
+
+class AiringSchedule:
+    """Очередь опросов по слотам ожидаемого выхода: все аниме слота опрашиваются одним запросом
+    (до POLL_BATCH_SIZE аниме) в моменты начало слота + POLL_OFFSETS, пока не выйдут их серии.
+    Сколько запросов можно сделать, ограничивает budget"""
+
+    def __init__(self, budget: PollBudget = None):
+        self.titles = {}   # source_id -> TitleState
+        self.slots = {}    # Slot -> source_id аниме, ожидающих серию в этом слоте
+        self._heap = []    # (время опроса, Slot, номер опроса в окне)
+        self.budget = budget or PollBudget()
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    def _leave(self, state: TitleState):
+        members = self.slots.get(state.slot)
+        if members is not None:
+            members.discard(state.source_id)
+        state.slot = None
+
+    def _place(self, state: TitleState, now: datetime):
+        """Поставить аниме в слот следующего ожидаемого выхода (или оставить полному проходу)"""
+        self._leave(state)
+        state.last_miss = None
+        slot = state.next_slot(now)
+        if slot is None:
+            return
+        state.slot = slot
+        members = self.slots.get(slot)
+        if members is None:
+            members = self.slots[slot] = set()
+            index = next(i for i, offset in enumerate(slot.offsets) if slot.start + offset >= now)
+            heapq.heappush(self._heap, (slot.start + slot.offsets[index], slot, index))
+        members.add(state.source_id)
+
+    async def sync(self, db_session, source: str, now: datetime = None):
+        """Сверить очередь с онгоингами в БД после полного прохода: новые добавить, завершенные
+        убрать. Новые серии, замеченные проходом, сдвигают прогноз и будят «спящие» аниме"""
+        now = now or datetime.utcnow()
+        result = await db_session.execute(
+            select(Anime.id, Anime.source_id, Anime.episodes_aired, Anime.aired_on)
+            .where(and_(Anime.source == source, Anime.status == 'ongoing'))
+        )
+        self.update(((source_id, anime_id, episodes_aired, aired_on)
+                     for anime_id, source_id, episodes_aired, aired_on in result), now)
+
+    def update(self, rows, now: datetime):
+        """rows - (source_id, anime_id, episodes_aired, aired_on) всех онгоингов источника"""
+        current = {}
+        for source_id, anime_id, episodes_aired, aired_on in rows:
+            state = self.titles.get(source_id)
+            if state is None:
+                state = TitleState(anime_id, source_id, episodes_aired, aired_on)
+                self._place(state, now)
+            elif state.observe(episodes_aired):
+                self._place(state, now)
+            current[source_id] = state
+        for source_id, state in self.titles.items():
+            if source_id not in current:
+                self._leave(state)
+        self.titles = current
+
+    def next_due(self):
+        """Время ближайшего опроса (None, если очередь пуста)"""
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime) -> list:
+        """Забрать слоты, которые пора опросить: [(слот, номер опроса, [TitleState])]. Слоты,
+        которым пора в ближайшие POLL_COALESCE, идут в тот же опрос - меньше обращений к API"""
+        due = []
+        while self._heap and self._heap[0][0] <= now + POLL_COALESCE:
+            _, slot, index = heapq.heappop(self._heap)
+            members = self.slots.get(slot)
+            if not members:
+                self.slots.pop(slot, None)
+                continue
+            due.append((slot, index, [self.titles[source_id] for source_id in sorted(members)]))
+        return due
+
+    @staticmethod
+    def batches(due: list) -> list:
+        """Аниме всех забранных слотов - пачками по POLL_BATCH_SIZE на запрос"""
+        states = [state for _, _, slot_states in due for state in slot_states]
+        return [states[i:i + POLL_BATCH_SIZE] for i in range(0, len(states), POLL_BATCH_SIZE)]
+
+    def reschedule(self, slot: Slot, index: int, states: list, records: dict, now: datetime,
+                   retry_at: datetime = None) -> int:
+        """Учесть опрос слота. records - source_id -> запись источника (аниме без записи не опрашивались).
+        У кого вышли серии - в слот следующего выхода, остальные ждут следующего опроса окна;
+        окно закончилось - аниме целится в следующий выход. Слот, который не удалось опросить
+        (не хватило бюджета или ошибка запроса), повторяется в retry_at вместе с другими слотами.
+        Возвращает количество аниме с новыми сериями"""
+        if retry_at is not None and not any(state.source_id in records for state in states):
+            heapq.heappush(self._heap, (retry_at, slot, index))
+            return 0
+        advanced = 0
+        for state in states:
+            record = records.get(state.source_id)
+            if record is None or state.slot != slot:
+                continue
+            if record.get('status') not in (None, 'ongoing'):
+                # Сериал завершился: больше не опрашиваем
+                self._leave(state)
+                self.titles.pop(state.source_id, None)
+            elif state.observe(record.get('episodes_aired'), state.detected_slot(now)):
+                advanced += 1
+                self._place(state, now)
+            else:
+                state.last_miss = now
+
+        members = self.slots.get(slot)
+        if members and index + 1 < len(slot.offsets):
+            heapq.heappush(self._heap, (slot.start + slot.offsets[index + 1], slot, index + 1))
+        else:
+            self.slots.pop(slot, None)
+            for source_id in members or ():
+                state = self.titles[source_id]
+                state.slot = None
+                self._place(state, max(now, slot.start + slot.offsets[-1]))
+        return advanced
@@ -1,181 +1,221 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, func
+from sqlalchemy import select, update, and_, or_, case, func
+from sqlalchemy.orm import undefer_group
+from sqlalchemy.dialects import postgresql, sqlite
 from datetime import datetime
+from typing import NamedTuple
+import hashlib
 import json
 import logging
-from src.database.db import SessionLocal
+from src.config import REFRESH_PAGES_IN_FLIGHT
 from src.models.anime import Anime
-import asyncio
+from src.services.cache import ongoing_counts, invalidate_source
+from src.services.refresh_pipeline import RefreshError, RefreshStats, run_refresh_pipeline
+from src.services.enrichment import DetailEnricher
+from src.utils.fetch_scheduler import http_cache
 
 logger = logging.getLogger(__name__)
 
-class AnimeService:
-    def __init__(self):
-        # Создаем сессию БД при инициализации
-        self.db = SessionLocal()
+# Поля, которые приходят из источника и обновляются пакетным upsert
+UPSERT_COLUMNS = (
+    'title', 'english_title', 'japanese_title', 'synonyms', 'url', 'animego_url',
+    'type', 'status', 'episodes', 'episodes_aired', 'score', 'aired_on', 'released_on',
+    'image_url', 'genres', 'duration', 'description',
+)
+# Ограничение на размер одного INSERT (число параметров в SQLite ограничено)
+UPSERT_CHUNK_SIZE = 500
+
+
+class AnimeListItem(NamedTuple):
+    """Строка списка онгоингов: только то, что нужно для кнопки"""
+    id: int
+    title: str
+    source: str
+    source_id: str
+
+
+class UpsertResult(NamedTuple):
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+
+    def __add__(self, other):
+        return UpsertResult(*(a + b for a, b in zip(self, other)))
+
+
+def _normalize(anime_data: dict) -> dict:
+    """Поля UPSERT_COLUMNS записи парсера в том виде, в каком они пишутся в БД"""
+    row = {column: anime_data.get(column) for column in UPSERT_COLUMNS}
+    row['status'] = row['status'] or 'ongoing'
+    row['score'] = float(row['score']) if row['score'] else None
+    return row
+
+
+def _hash_row(row: dict) -> str:
+    payload = json.dumps([row[column] for column in UPSERT_COLUMNS], ensure_ascii=False, default=str)
+    return hashlib.blake2b(payload.encode(), digest_size=8).hexdigest()
+
+
+def content_hash(anime_data: dict) -> str:
+    """Компактный хэш нормализованной записи источника: совпал - запись не изменилась"""
+    return _hash_row(_normalize(anime_data))
+
 
-    async def get_or_create_anime(self, anime_data: dict) -> Anime:
-        """Получить аниме из БД или создать новую запись с полной информацией"""
+def stamp_content_hash(records: list):
+    """Запомнить в записях хэш в том виде, в каком они пришли из источника, до дозагрузки подробностей"""
+    for record in records:
+        if 'content_hash' not in record:
+            record['content_hash'] = content_hash(record)
+
+
+def _anime_row(anime_data: dict, now: datetime) -> dict:
+    """Нормализованная строка таблицы anime из словаря парсера"""
+    source_id = anime_data.get('source_id') or anime_data.get('id')
+    row = _normalize(anime_data)
+    row['source'] = anime_data.get('source', 'unknown')
+    row['source_id'] = str(source_id) if source_id else None
+    # content_hash=None в записи - данные неполные, запись будет обработана снова
+    row['content_hash'] = anime_data['content_hash'] if 'content_hash' in anime_data else _hash_row(row)
+    row['created_at'] = now
+    row['updated_at'] = now
+    return row
+
+
+class AnimeService:
+    def __init__(self, db_session: AsyncSession):
+        self.db = db_session # Сессия передается извне: своя на каждый апдейт или фоновую задачу
+
+    async def bulk_upsert_anime(self, records: list, commit: bool = True) -> UpsertResult:
+        """Пакетно записать аниме одной транзакцией: INSERT ... ON CONFLICT (source, source_id) DO UPDATE.
+        Пустые значения из источника не затирают уже сохраненные.
+        commit=False - запись в транзакции вызывающего кода (commit и сброс кэшей на нем)"""
+        now = datetime.utcnow()
+        # Дубли внутри пакета схлопываем: побеждает последняя запись
+        rows = list({(row['source'], row['source_id']): row
+                     for row in (_anime_row(data, now) for data in records)
+                     if row['source_id']}.values())
+        if not rows:
+            return UpsertResult()
+
+        insert = postgresql.insert if self.db.bind.dialect.name == 'postgresql' else sqlite.insert
+        table = Anime.__table__
+        result = UpsertResult()
         try:
-            source = anime_data.get('source', 'unknown')
-            source_id = anime_data.get('id')
-            title = anime_data.get('title')
-
-            # Ищем по source + source_id или по title
-            anime = None
-            if source and source_id:
-                result = await self.db.execute(
-                    select(Anime).filter(
-                        and_(Anime.source == source, Anime.source_id == str(source_id))
+            for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+                chunk = rows[start:start + UPSERT_CHUNK_SIZE]
+
+                # Какие ключи уже есть в БД - чтобы отличить вставку от обновления
+                existing = set()
+                for source in {row['source'] for row in chunk}:
+                    source_ids = [row['source_id'] for row in chunk if row['source'] == source]
+                    found = await self.db.execute(
+                        select(table.c.source_id).where(
+                            and_(table.c.source == source, table.c.source_id.in_(source_ids))
+                        )
                     )
+                    existing.update((source, source_id) for source_id in found.scalars())
+
+                stmt = insert(table).values(chunk)
+                merged = {column: func.coalesce(stmt.excluded[column], table.c[column]) for column in UPSERT_COLUMNS}
+                content_changed = or_(*(value.is_distinct_from(table.c[column]) for column, value in merged.items()))
+                # Сменился постер - сохраненный file_id Telegram больше не подходит
+                image_file_id = case(
+                    (merged['image_url'].is_distinct_from(table.c.image_url), None),
+                    else_=table.c.image_file_id
                 )
-                anime = result.scalar()
-
-            if not anime and title:
-                result = await self.db.execute(
-                    select(Anime).filter(Anime.title == title)
-                )
-                anime = result.scalar()
-
-            if not anime:
-                # Создаем новое аниме
-                anime = Anime(
-                    title=title,
-                    english_title=anime_data.get('english_title'),
-                    japanese_title=anime_data.get('japanese_title'),
-                    synonyms=anime_data.get('synonyms'), # Хранится как строка
-                    source=source,
-                    source_id=str(source_id) if source_id else None,
-                    url=anime_data.get('url'),
-                    animego_url=anime_data.get('animego_url'),
-                    type=anime_data.get('type'),
-                    status=anime_data.get('status', 'ongoing'),
-                    episodes=anime_data.get('episodes'),
-                    episodes_aired=anime_data.get('episodes_aired'),
-                    score=float(anime_data.get('score')) if anime_data.get('score') else None,
-                    aired_on=anime_data.get('aired_on'),
-                    released_on=anime_data.get('released_on'),
-                    image_url=anime_data.get('image_url'),
-                    genres=anime_data.get('genres'), # Хранится как строка
-                    duration=anime_data.get('duration'),
-                    description=anime_data.get('description'),
-                    created_at=anime_data.get('created_at', datetime.utcnow()),
-                    updated_at=anime_data.get('updated_at', datetime.utcnow())
-                )
-                self.db.add(anime)
-                await self.db.commit()
-                await self.db.refresh(anime)
-                logger.info(f"Создано новое аниме в БД: {title}")
-            else:
-                # Обновляем ТОЛЬКО количество эпизодов и статус для существующего аниме
-                updated = False
-                if 'episodes_aired' in anime_data and anime_data['episodes_aired'] is not None:
-                    if anime_data['episodes_aired'] != anime.episodes_aired:
-                        anime.episodes_aired = anime_data['episodes_aired']
-                        updated = True
-                        logger.info(f"Обновлены эпизоды для аниме: {title} ({anime.episodes_aired})")
-
-                if 'status' in anime_data and anime_data['status'] is not None:
-                    if anime_data['status'] != anime.status:
-                        anime.status = anime_data['status']
-                        updated = True
-                        logger.info(f"Обновлен статус для аниме: {title} ({anime.status})")
-
-                # Также можно обновить общее количество эпизодов
-                if 'episodes' in anime_data and anime_data['episodes'] is not None:
-                    if anime_data['episodes'] != anime.episodes:
-                        anime.episodes = anime_data['episodes']
-                        updated = True
-
-                if updated:
-                    anime.updated_at = datetime.utcnow()
-                    await self.db.commit()
-                    await self.db.refresh(anime)
-
-            return anime
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=['source', 'source_id'],
+                    set_={
+                        **merged,
+                        'content_hash': stmt.excluded.content_hash,
+                        'image_file_id': image_file_id,
+                        # Только новый хэш при прежнем содержимом - версия карточки не меняется
+                        'updated_at': case((content_changed, stmt.excluded.updated_at), else_=table.c.updated_at),
+                    },
+                    # Строку трогаем, только если что-то действительно изменилось
+                    where=or_(content_changed, stmt.excluded.content_hash.is_distinct_from(table.c.content_hash))
+                ).returning(table.c.source, table.c.source_id, table.c.updated_at)
+
+                written = (await self.db.execute(stmt)).fetchall()
+                changed = [(source, source_id) for source, source_id, updated_at in written if updated_at == now]
+                updated = sum(1 for key in changed if key in existing)
+                result += UpsertResult(len(changed) - updated, updated, len(chunk) - len(changed))
+
+            if not commit:
+                return result
+            await self.db.commit()
         except Exception as e:
-            logger.error(f"Ошибка при работе с аниме в БД: {e}")
+            logger.error(f"Ошибка пакетной записи аниме в БД: {e}")
             await self.db.rollback()
             raise
 
-    async def update_all_ongoing_from_source(self, source: str, force_update: bool = False) -> int:
-        """Обновить все онгоинги из указанного источника"""
+        if result.inserted or result.updated:
+            for source in {row['source'] for row in rows}:
+                invalidate_source(source)
+        return result
+
+    async def update_all_ongoing_from_source(self, source: str, force_update: bool = False,
+                                             stats: RefreshStats = None) -> UpsertResult:
+        """Обновить все онгоинги из указанного источника (stats - счетчики прогресса, обновляются по ходу).
+        Если загрузка прервалась или страницы не записались в БД - RefreshError"""
+        logger.info(f"Начинаем обновление онгоингов из {source}")
+
+        if source == "shikimori":
+            from src.parsers.shikimori import iter_ongoing_pages
+        elif source == "mal":
+            from src.parsers.mal import iter_ongoing_pages
+        else:
+            raise ValueError(f"Неизвестный источник: {source}")
+
+        stats = stats or RefreshStats(source)
+        enricher = DetailEnricher()
+        # Хэши всех записей источника одним запросом: неизменившиеся записи в БД не отправляются
+        known_hashes = await self.get_content_hashes(source)
+
+        async def write_page(records):
+            stamp_content_hash(records)
+            changed = [record for record in records
+                       if known_hashes.get(str(record.get('source_id') or record.get('id'))) != record['content_hash']]
+            skipped = UpsertResult(unchanged=len(records) - len(changed))
+            if not changed:
+                return skipped
+            # Подробности дозагружаются только для новых и изменившихся аниме
+            stats.enriched += await enricher.enrich(source, changed, self.db)
+            return await self.bulk_upsert_anime(changed) + skipped
+
+        # Страницы записываются в БД по мере загрузки, не дожидаясь остальных
+        stats = await run_refresh_pipeline(
+            source,
+            iter_ongoing_pages(max_in_flight=REFRESH_PAGES_IN_FLIGHT),
+            write_page,
+            stats=stats
+        )
+        if enricher.requests or enricher.cache_hits:
+            logger.info(f"Подробности {source}: запросов {enricher.requests}, "
+                        f"из кэша на диске {enricher.cache_hits}")
+
+        if http_cache is not None:
+            http_cache.log_stats()
+
+        failure = stats.failure()
+        if failure:
+            raise RefreshError(failure)
+
+        result = UpsertResult(stats.inserted, stats.updated, stats.unchanged)
+        logger.info(f"Обновление из {source} завершено: добавлено {result.inserted}, "
+                    f"обновлено {result.updated}, без изменений {result.unchanged}")
+        return result
+
+    async def get_content_hashes(self, source: str) -> dict:
+        """Хэши записей источника: source_id -> content_hash"""
         try:
-            logger.info(f"Начинаем обновление онгоингов из {source}")
-
-            added_count = 0
-            updated_count = 0
-
-            if source == "shikimori":
-                # Для Shikimori используем асинхронный подход
-                from src.parsers.shikimori import get_ongoing_anime_count_async, get_ongoing_anime_async
-
-                total_anime_count = await get_ongoing_anime_count_async()
-                total_pages = min((total_anime_count // 50) + 1, 20)
-
-                logger.info(f"Будет загружено {total_pages} страниц из Shikimori")
-
-                # Создаем список задач для параллельной загрузки всех страниц
-                tasks = []
-                for page in range(1, total_pages + 1):
-                    tasks.append(get_ongoing_anime_async(limit=50, page=page))
-
-                # Выполняем все запросы параллельно
-                all_pages_data = await asyncio.gather(*tasks)
-
-                # Обрабатываем все полученные данные
-                for page_data in all_pages_data:
-                    if page_data:
-                        for anime_data in page_data:
-                            try:
-                                # Добавляем animego_url к полным данным
-                                anime_data['animego_url'] = self._get_animego_url(anime_data.get('title', ''))
-                                # Используем готовый метод для создания/обновления
-                                await self.get_or_create_anime(anime_data)
-                                added_count += 1 # Упрощенный подсчет, т.к. get_or_create_anime сам решает создать или обновить
-                            except Exception as e:
-                                logger.error(f"Ошибка обработки аниме {anime_data.get('title')}: {e}")
-
-            elif source == "mal":
-                # Для MAL используем асинхронный подход
-                from src.parsers.mal import fetch_all_ongoing_anime_mal # Убедитесь, что путь правильный
-
-                try:
-                    all_anime_data, last_visible_page, total_items = await fetch_all_ongoing_anime_mal()
-
-                    logger.info(f"Загружено {len(all_anime_data)} аниме из MyAnimeList")
-
-                    for anime_data_tuple in all_anime_data:
-                        # fetch_all_ongoing_anime_mal возвращает (data, last_page, total), где data - список
-                        # anime_data_tuple - это (anime_dict, _, _)
-                        anime_data = anime_data_tuple[0] if isinstance(anime_data_tuple, tuple) else anime_data_tuple
-
-                        try:
-                            # Добавляем информацию для полного сохранения
-                            full_anime_data = {
-                                'source': 'mal',
-                                'id': anime_data["id"],
-                                'title': anime_data["title"],
-                                'url': anime_data["url"],
-                                'animego_url': self._get_animego_url(anime_data["title"])
-                            }
-
-                            # Используем готовый метод для создания/обновления
-                            await self.get_or_create_anime(full_anime_data)
-                            added_count += 1 # Упрощенный подсчет
-
-                        except Exception as e:
-                            logger.error(f"Ошибка обработки аниме {anime_data.get('title')}: {e}")
-
-                except Exception as e:
-                    logger.error(f"Ошибка загрузки из MyAnimeList: {e}")
-
-            logger.info(f"Обновление из {source} завершено: добавлено/обновлено {added_count}")
-            return added_count
-
+            result = await self.db.execute(
+                select(Anime.source_id, Anime.content_hash).where(Anime.source == source)
+            )
+            return dict(result.all())
         except Exception as e:
-            logger.error(f"Ошибка при обновлении из {source}: {e}")
-            return 0
+            logger.error(f"Ошибка загрузки хэшей записей {source}: {e}")
+            return {}
 
     async def get_anime_by_title(self, title: str) -> Anime:
         """Получить аниме по названию"""
@@ -186,19 +226,47 @@ class AnimeService:
             logger.error(f"Ошибка получения аниме по названию: {e}")
             return None
 
-    async def get_anime_by_source_and_id(self, source: str, source_id: str) -> Anime:
-        """Получить аниме по источнику и ID"""
+    async def get_anime_by_source_and_id(self, source: str, source_id: str, with_details: bool = False) -> Anime:
+        """Получить аниме по источнику и ID (with_details - сразу загрузить отложенные текстовые поля)"""
+        try:
+            query = select(Anime).filter(
+                and_(Anime.source == source, Anime.source_id == str(source_id))
+            )
+            if with_details:
+                query = query.options(undefer_group('details'))
+            result = await self.db.execute(query)
+            return result.scalar()
+        except Exception as e:
+            logger.error(f"Ошибка получения аниме из БД: {e}")
+            return None
+
+    async def get_anime_version(self, source: str, source_id: str):
+        """Легкий запрос (id, updated_at) по уникальному ключу - версия для кэша карточек"""
         try:
             result = await self.db.execute(
-                select(Anime).filter(
+                select(Anime.id, Anime.updated_at).filter(
                     and_(Anime.source == source, Anime.source_id == str(source_id))
                 )
             )
-            return result.scalar()
+            return result.first()
         except Exception as e:
-            logger.error(f"Ошибка получения аниме из БД: {e}")
+            logger.error(f"Ошибка получения версии аниме из БД: {e}")
             return None
 
+    async def set_image_file_id(self, anime_id: int, image_url: str, file_id: str):
+        """Запомнить file_id постера; только если image_url за это время не сменился.
+        updated_at не меняется: содержимое карточки остается прежним"""
+        try:
+            await self.db.execute(
+                update(Anime)
+                .where(and_(Anime.id == anime_id, Anime.image_url == image_url))
+                .values(image_file_id=file_id)
+            )
+            await self.db.commit()
+        except Exception as e:
+            logger.error(f"Ошибка сохранения file_id постера для аниме {anime_id}: {e}")
+            await self.db.rollback()
+
     async def get_ongoing_anime(self, limit: int = 10, offset: int = 0):
         """Получить список онгоингов"""
         try:
@@ -211,42 +279,42 @@ class AnimeService:
             return []
 
     async def get_ongoing_count_from_database(self, source: str) -> int:
-        """Получить количество онгоингов из базы данных"""
+        """Получить количество онгоингов из базы данных (кэшируется до следующей записи изменений)"""
+        cached = ongoing_counts.get(source)
+        if cached is not None:
+            return cached
         try:
             result = await self.db.execute(
                 select(func.count(Anime.id)).filter(
                     and_(Anime.source == source, Anime.status == 'ongoing')
                 )
             )
-            return result.scalar()
+            count = result.scalar()
+            ongoing_counts.set(source, count)
+            return count
         except Exception as e:
             logger.error(f"Ошибка подсчета онгоингов в БД: {e}")
             return 0
 
-    async def get_ongoing_from_database(self, source: str, limit: int = 10, offset: int = 0):
-        """Получить онгоинги из базы данных"""
+    async def get_ongoing_from_database(self, source: str, limit: int = 10,
+                                        after_id: int = None, before_id: int = None):
+        """Получить страницу онгоингов из базы данных (keyset-пагинация по id).
+        after_id - страница после указанной записи, before_id - страница перед ней.
+        Загружаются только колонки для кнопок списка, без ORM-объектов"""
         try:
-            result = await self.db.execute(
-                select(Anime).filter(
-                    and_(Anime.source == source, Anime.status == 'ongoing')
-                ).offset(offset).limit(limit)
+            query = select(Anime.id, Anime.title, Anime.source, Anime.source_id).filter(
+                and_(Anime.source == source, Anime.status == 'ongoing')
             )
-            return result.scalars().all()
+            if before_id is not None:
+                query = query.filter(Anime.id < before_id).order_by(Anime.id.desc())
+            else:
+                if after_id is not None:
+                    query = query.filter(Anime.id > after_id)
+                query = query.order_by(Anime.id)
+
+            result = await self.db.execute(query.limit(limit))
+            animes = [AnimeListItem(*row) for row in result]
+            return list(reversed(animes)) if before_id is not None else animes
         except Exception as e:
             logger.error(f"Ошибка получения онгоингов из БД: {e}")
             return []
-
-    def _get_animego_url(self, title: str) -> str:
-        """Получить ссылку на AnimeGO (вынесено в отдельный метод)"""
-        try:
-            from src.utils.animego_link import get_anime_link_from_title
-            return get_anime_link_from_title(title)
-        except:
-            return None
-
-    async def close(self):
-        """Закрыть сессию БД"""
-        await self.db.close()
-
-# Глобальный экземпляр сервиса (если используется так)
-anime_service = AnimeService()
\ No newline at end of file
@@ -0,0 +1,195 @@
+# src/services/animego_resolver.py
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, and_, or_
+from sqlalchemy.dialects import postgresql, sqlite
+
+from src.config import (
+    ANIMEGO_LINK_TTL,
+    ANIMEGO_MISS_TTL,
+    ANIMEGO_ERROR_RETRY,
+    ANIMEGO_RESOLVE_CONCURRENCY,
+    ANIMEGO_RESOLVE_BATCH,
+)
+from src.database.db import session_scope
+from src.models.anime import Anime
+from src.models.animego_link import AnimeGoLink
+from src.utils.animego_link import search_anime_link
+
+logger = logging.getLogger(__name__)
+
+# Результат поиска, который не удалось получить (ошибка запроса)
+FAILED = object()
+
+
+class ResolveStats:
+    """Счетчики одного запуска поиска ссылок"""
+
+    def __init__(self):
+        self.from_cache = 0   # ссылка взята из кэша без запроса
+        self.searched = 0
+        self.found = 0
+        self.not_found = 0
+        self.failed = 0
+        self.seconds = 0.0
+
+    def log(self):
+        logger.info(
+            f"AnimeGO: из кэша {self.from_cache}, поисков {self.searched} "
+            f"(найдено {self.found}, не найдено {self.not_found}, ошибок {self.failed}), {self.seconds:.2f} с"
+        )
+
+
+class AnimeGoResolver:
+    """Ссылки на AnimeGO для аниме без ссылки. Работает в фоне после обновлений, не задерживая их.
+    Результаты поиска хранятся в таблице animego_links: найденные - ANIMEGO_LINK_TTL,
+    ненайденные - ANIMEGO_MISS_TTL, после ошибки запроса повтор через ANIMEGO_ERROR_RETRY"""
+
+    def __init__(self,
+                 session_factory=session_scope,
+                 search=search_anime_link,
+                 concurrency: int = ANIMEGO_RESOLVE_CONCURRENCY,
+                 batch_size: int = ANIMEGO_RESOLVE_BATCH):
+        self.session_factory = session_factory
+        self.search = search
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self._task = None
+        self._rerun = False
+
+    def schedule(self):
+        """Запустить поиск в фоне. Если он уже идет - повторить после завершения
+        (чтобы подхватить аниме, добавленные за это время)"""
+        if self._task is not None and not self._task.done():
+            self._rerun = True
+            return
+        self._task = asyncio.create_task(self._run_until_idle())
+
+    async def _run_until_idle(self):
+        while True:
+            self._rerun = False
+            try:
+                await self.run()
+            except Exception as e:
+                logger.error(f"Ошибка поиска ссылок AnimeGO: {e}")
+            if not self._rerun:
+                return
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def run(self) -> ResolveStats:
+        """Найти ссылки для всех аниме без ссылки, пачками по batch_size названий"""
+        started = time.monotonic()
+        stats = ResolveStats()
+        while await self._step(stats):
+            pass
+        stats.seconds = time.monotonic() - started
+        if stats.from_cache or stats.searched:
+            stats.log()
+        return stats
+
+    async def _pending(self, session, now: datetime):
+        """Аниме без ссылки, для которых кэш либо знает ссылку, либо устарел/пуст.
+        Возвращает (anime_id -> ссылка из кэша, название -> [anime_id] для поиска)"""
+        result = await session.execute(
+            select(Anime.id, Anime.title, AnimeGoLink.url, AnimeGoLink.expires_at)
+            .outerjoin(AnimeGoLink, AnimeGoLink.title == Anime.title)
+            .where(and_(
+                Anime.animego_url.is_(None),
+                Anime.title.isnot(None),
+                or_(AnimeGoLink.title.is_(None), AnimeGoLink.url.isnot(None), AnimeGoLink.expires_at <= now),
+            ))
+            .order_by(Anime.id.desc())
+        )
+        cached = {}
+        to_search = {}
+        for anime_id, title, url, expires_at in result:
+            if url is not None and expires_at > now:
+                cached[anime_id] = url
+            elif title in to_search or len(to_search) < self.batch_size:
+                to_search.setdefault(title, []).append(anime_id)
+        return cached, to_search
+
+    async def _search_all(self, titles) -> dict:
+        """Поиск с ограничением числа одновременных запросов: название -> URL, None или FAILED"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def search(title):
+            async with semaphore:
+                try:
+                    return title, await self.search(title)
+                except Exception as e:
+                    logger.warning(f"Поиск '{title}' на AnimeGO не удался: {e}")
+                    return title, FAILED
+
+        return dict(await asyncio.gather(*(search(title) for title in titles)))
+
+    async def _save_cache(self, session, rows: list, columns: tuple):
+        """Записать результаты поиска в animego_links; при конфликте обновить только columns"""
+        if not rows:
+            return
+        insert = postgresql.insert if session.bind.dialect.name == 'postgresql' else sqlite.insert
+        stmt = insert(AnimeGoLink.__table__).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['title'],
+            set_={column: stmt.excluded[column] for column in columns}
+        )
+        await session.execute(stmt)
+
+    async def _step(self, stats: ResolveStats) -> bool:
+        """Один шаг: ссылки из кэша и поиск одной пачки названий. False - делать больше нечего"""
+        now = datetime.utcnow()
+        # Транзакция чтения закрывается до похода в сеть
+        async with self.session_factory() as session:
+            cached, to_search = await self._pending(session, now)
+        if not cached and not to_search:
+            return False
+
+        found = await self._search_all(to_search) if to_search else {}
+        now = datetime.utcnow()
+
+        links = dict(cached)
+        results = []
+        failures = []
+        for title, url in found.items():
+            stats.searched += 1
+            if url is FAILED:
+                stats.failed += 1
+                failures.append({'title': title, 'url': None, 'checked_at': now,
+                                 'expires_at': now + timedelta(seconds=ANIMEGO_ERROR_RETRY)})
+                continue
+            if url:
+                stats.found += 1
+                links.update((anime_id, url) for anime_id in to_search[title])
+            else:
+                stats.not_found += 1
+            ttl = ANIMEGO_LINK_TTL if url else ANIMEGO_MISS_TTL
+            results.append({'title': title, 'url': url, 'checked_at': now,
+                            'expires_at': now + timedelta(seconds=ttl)})
+        stats.from_cache += len(cached)
+
+        async with self.session_factory() as session:
+            try:
+                await self._save_cache(session, results, ('url', 'checked_at', 'expires_at'))
+                # Ошибка запроса не затирает ранее найденную ссылку: сдвигается только срок повтора
+                await self._save_cache(session, failures, ('expires_at',))
+                if links:
+                    # updated_at меняется: в карточке аниме появляется кнопка со ссылкой
+                    await session.execute(update(Anime), [
+                        {'id': anime_id, 'animego_url': url, 'updated_at': now} for anime_id, url in links.items()
+                    ])
+                await session.commit()
+            except Exception as e:
+                logger.error(f"Ошибка записи ссылок AnimeGO: {e}")
+                await session.rollback()
+                raise
+        return True
+
+
+animego_resolver = AnimeGoResolver()
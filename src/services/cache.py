@@ -0,0 +1,128 @@
+# src/services/cache.py
+import logging
+import time
+from collections import OrderedDict
+
+from src.config import ONGOING_COUNT_TTL, LIST_PAGE_CACHE_SIZE, DETAILS_CARD_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class OngoingCountCache:
+    """Количество онгоингов по источникам. Сбрасывается при записи изменений,
+    TTL - страховка на случай записи в обход сервиса"""
+
+    def __init__(self, ttl: float = ONGOING_COUNT_TTL):
+        self.ttl = ttl
+        self._counts = {}  # source -> (количество, момент устаревания)
+
+    def get(self, source: str):
+        cached = self._counts.get(source)
+        if cached is None or cached[1] < time.monotonic():
+            return None
+        return cached[0]
+
+    def set(self, source: str, count: int):
+        self._counts[source] = (count, time.monotonic() + self.ttl)
+
+    def invalidate(self, source: str = None):
+        if source is None:
+            self._counts.clear()
+        else:
+            self._counts.pop(source, None)
+
+
+class ListPageCache:
+    """LRU-кэш готовых к отправке страниц /list: (источник, курсор) -> (текст, клавиатура).
+    Поколение источника растет при каждом сбросе, поэтому страница, собранная
+    до сброса (например, фоновой предзагрузкой), в кэш уже не попадет"""
+
+    def __init__(self, max_size: int = LIST_PAGE_CACHE_SIZE):
+        self.max_size = max_size
+        self._pages = OrderedDict()
+        self._generations = {}
+        self._global_generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def generation(self, source: str) -> tuple:
+        return self._global_generation, self._generations.get(source, 0)
+
+    def get(self, source: str, cursor: tuple):
+        page = self._pages.get((source, cursor))
+        if page is None:
+            self.misses += 1
+            return None
+        self._pages.move_to_end((source, cursor))
+        self.hits += 1
+        return page
+
+    def __contains__(self, key: tuple) -> bool:
+        return key in self._pages
+
+    def put(self, source: str, cursor: tuple, page: tuple, generation: tuple):
+        if generation != self.generation(source):
+            return
+        self._pages[(source, cursor)] = page
+        self._pages.move_to_end((source, cursor))
+        while len(self._pages) > self.max_size:
+            self._pages.popitem(last=False)
+
+    def invalidate(self, source: str = None):
+        if source is None:
+            self._global_generation += 1
+            self._pages.clear()
+            return
+        self._generations[source] = self._generations.get(source, 0) + 1
+        for key in [key for key in self._pages if key[0] == source]:
+            del self._pages[key]
+
+
+class DetailsCardCache:
+    """LRU-кэш отрисованных карточек аниме: id -> (версия, карточка).
+    Версия - updated_at записи, поэтому любое изменение аниме само делает карточку устаревшей"""
+
+    def __init__(self, max_size: int = DETAILS_CARD_CACHE_SIZE):
+        self.max_size = max_size
+        self._cards = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, anime_id: int, version):
+        cached = self._cards.get(anime_id)
+        if cached is None or cached[0] != version:
+            self.misses += 1
+            return None
+        self._cards.move_to_end(anime_id)
+        self.hits += 1
+        return cached[1]
+
+    def put(self, anime_id: int, version, card):
+        self._cards[anime_id] = (version, card)
+        self._cards.move_to_end(anime_id)
+        while len(self._cards) > self.max_size:
+            self._cards.popitem(last=False)
+
+    def invalidate(self, anime_id: int = None):
+        if anime_id is None:
+            self._cards.clear()
+        else:
+            self._cards.pop(anime_id, None)
+
+
+ongoing_counts = OngoingCountCache()
+list_pages = ListPageCache()
+details_cards = DetailsCardCache()
+
+
+# Подписчики на сброс (например, отправка сброса из процесса-воркера в процесс бота)
+invalidation_listeners = []
+
+
+def invalidate_source(source: str = None):
+    """Сбросить все кэши, зависящие от данных источника (None - все источники)"""
+    ongoing_counts.invalidate(source)
+    list_pages.invalidate(source)
+    for listener in invalidation_listeners:
+        listener(source)
+    logger.debug(f"Кэши сброшены для источника: {source or 'все'}")
@@ -0,0 +1,56 @@
+# src/services/cache_pruner.py
+import asyncio
+import logging
+
+from src.config import CACHE_PRUNE_INTERVAL
+from src.services.enrichment import details_cache
+from src.utils.fetch_scheduler import http_cache
+
+logger = logging.getLogger(__name__)
+
+
+class CachePruner:
+    """Очистка кэшей ответов на диске по расписанию: при запуске и затем раз в interval секунд.
+    Не зависит от полного прохода планировщика - кэши чистятся и там, где его нет
+    (бот с внешним воркером, обновления только по /update)"""
+
+    def __init__(self, interval: float = CACHE_PRUNE_INTERVAL):
+        self.interval = interval
+        self._task = None
+
+    @staticmethod
+    def caches() -> dict:
+        caches = {"подробностей": details_cache}
+        if http_cache is not None:
+            caches["HTTP"] = http_cache.store
+        return caches
+
+    async def prune(self) -> int:
+        """Удалить устаревшие ответы из всех кэшей. Возвращает количество удаленных"""
+        removed = 0
+        for name, cache in self.caches().items():
+            count = await cache.prune()
+            if count:
+                logger.info(f"Кэш {name}: удалено устаревших ответов {count}")
+            removed += count
+        return removed
+
+    async def _run(self):
+        while True:
+            try:
+                await self.prune()
+            except Exception as e:
+                logger.error(f"Ошибка очистки кэшей на диске: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+
+cache_pruner = CachePruner()
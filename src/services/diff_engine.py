@@ -0,0 +1,203 @@
+# src/services/diff_engine.py
+import logging
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, NamedTuple
+
+from sqlalchemy import select, update, and_, or_
+
+from src.config import SWEEP_MAX_LOOKUPS
+from src.models.anime import Anime
+from src.services.anime_service import AnimeService, content_hash, stamp_content_hash
+from src.services.cache import invalidate_source
+
+logger = logging.getLogger(__name__)
+
+# Типы событий изменения
+EPISODES_ADVANCED = "episodes_advanced"   # вышли новые серии
+STATUS_FINISHED = "status_finished"       # онгоинг завершился
+STATUS_CHANGED = "status_changed"         # прочие смены статуса
+TOTAL_CHANGED = "total_changed"           # изменилось общее число серий
+
+FINISHED_STATUSES = {"released"}
+
+# Поля, которые сравнивает проход планировщика
+TRACKED_COLUMNS = ('status', 'episodes', 'episodes_aired')
+
+
+class ChangeEvent(NamedTuple):
+    kind: str
+    anime_id: int
+    title: str
+    old: Any
+    new: Any
+
+
+class AnimeState(NamedTuple):
+    """Текущее состояние аниме в БД: только сравниваемые поля"""
+    id: int
+    source_id: str
+    title: str
+    status: str
+    episodes: int
+    episodes_aired: int
+    content_hash: str
+
+
+class SweepResult:
+    """Итог прохода по источнику: счетчики и события для уведомлений"""
+
+    def __init__(self, source: str):
+        self.source = source
+        self.fetched = 0
+        self.complete = True   # все страницы источника загружены
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.missing = 0       # онгоинги из БД, которых нет в выдаче источника
+        self.looked_up = 0     # из них проверены запросом по ID
+        self.enriched = 0      # новых аниме, дополненных подробностями
+        self.events = []
+        self.seconds = 0.0
+
+    def log(self):
+        logger.info(
+            f"Проход {self.source}: получено {self.fetched}, добавлено {self.inserted}, "
+            f"обновлено {self.updated}, без изменений {self.unchanged}, "
+            f"пропало из выдачи {self.missing} (проверено {self.looked_up}), "
+            f"дополнено подробностями {self.enriched}, "
+            f"событий {len(self.events)}, {self.seconds:.2f} с"
+        )
+
+
+def diff_record(state: AnimeState, record: dict):
+    """Сравнить состояние из БД с записью источника.
+    Возвращает (новые значения полей, события); пустые значения источника игнорируются"""
+    values = {}
+    events = []
+
+    new_episodes_aired = record.get('episodes_aired')
+    if new_episodes_aired is not None and new_episodes_aired != state.episodes_aired:
+        values['episodes_aired'] = new_episodes_aired
+        if new_episodes_aired > (state.episodes_aired or 0):
+            events.append(ChangeEvent(EPISODES_ADVANCED, state.id, state.title, state.episodes_aired, new_episodes_aired))
+
+    new_status = record.get('status')
+    if new_status and new_status != state.status:
+        values['status'] = new_status
+        kind = STATUS_FINISHED if state.status == "ongoing" and new_status in FINISHED_STATUSES else STATUS_CHANGED
+        events.append(ChangeEvent(kind, state.id, state.title, state.status, new_status))
+
+    new_episodes = record.get('episodes')
+    if new_episodes is not None and new_episodes != state.episodes:
+        values['episodes'] = new_episodes
+        events.append(ChangeEvent(TOTAL_CHANGED, state.id, state.title, state.episodes, new_episodes))
+
+    return values, events
+
+
+def updated_content_hash(state: AnimeState, record: dict):
+    """content_hash строки после записи TRACKED_COLUMNS из record. Проход пишет только эти поля,
+    поэтому хэш записи сохраняется, лишь если остальные поля в БД уже соответствуют record
+    (с прежними TRACKED_COLUMNS она дает сохраненный хэш). Иначе хэш прежний, и полное
+    обновление перепишет строку"""
+    before = {**record, **{column: getattr(state, column) for column in TRACKED_COLUMNS}}
+    if state.content_hash is None or content_hash(before) != state.content_hash:
+        return state.content_hash
+    return content_hash(record)
+
+
+class DiffEngine:
+    """Сравнение полного снимка онгоингов источника с БД: состояние читается одним запросом,
+    сравнение в памяти, все изменения пишутся одной транзакцией"""
+
+    def __init__(self, db_session, max_lookups: int = SWEEP_MAX_LOOKUPS):
+        self.db = db_session
+        self.max_lookups = max_lookups
+
+    async def load_state(self, source: str, source_ids, with_ongoing: bool = True) -> dict:
+        """Все аниме из снимка и (with_ongoing) онгоинги источника: source_id -> AnimeState"""
+        condition = Anime.source_id.in_(list(source_ids))
+        if with_ongoing:
+            condition = or_(Anime.status == 'ongoing', condition)
+        result = await self.db.execute(
+            select(Anime.id, Anime.source_id, Anime.title, Anime.status, Anime.episodes, Anime.episodes_aired,
+                   Anime.content_hash)
+            .where(and_(Anime.source == source, condition))
+        )
+        return {row.source_id: AnimeState(*row) for row in result}
+
+    async def apply(self,
+                    source: str,
+                    snapshot: list,
+                    complete: bool = True,
+                    lookup: Callable[[list], Awaitable[list]] = None,
+                    enrich: Callable[[list], Awaitable[int]] = None) -> SweepResult:
+        """Применить снимок источника. lookup(source_ids) догружает по ID онгоинги,
+        пропавшие из полного снимка, чтобы заметить их завершение.
+        enrich(records) дополняет подробностями записи аниме, которых еще нет в БД.
+        complete=False - снимок неполный (сбой страниц или выборочный опрос): пропавшие не ищутся"""
+        started = time.monotonic()
+        result = SweepResult(source)
+        result.fetched = len(snapshot)
+        result.complete = complete
+
+        records = {str(record.get('source_id') or record.get('id')): record for record in snapshot}
+        state = await self.load_state(source, records, with_ongoing=complete)
+
+        # Онгоинги, которых больше нет в выдаче: статус узнаем запросом по ID.
+        # Транзакция чтения закрывается до похода в сеть
+        missing = [source_id for source_id, row in state.items()
+                   if row.status == 'ongoing' and source_id not in records]
+        result.missing = len(missing)
+        await self.db.rollback()
+        if missing and lookup:
+            for record in await lookup(missing[:self.max_lookups]):
+                if not record:
+                    continue
+                records[str(record.get('source_id') or record.get('id'))] = record
+                result.looked_up += 1
+        if enrich:
+            new_records = [record for source_id, record in records.items() if source_id not in state]
+            if new_records:
+                stamp_content_hash(new_records)
+                result.enriched = await enrich(new_records)
+
+        now = datetime.utcnow()
+        updates = []
+        new_records = []
+        for source_id, record in records.items():
+            row = state.get(source_id)
+            if row is None:
+                new_records.append(record)
+                continue
+            values, events = diff_record(row, record)
+            if not values:
+                result.unchanged += 1
+                continue
+            # Полный набор полей в каждой строке - одна пакетная команда UPDATE. Хэш тоже обновляется:
+            # иначе следующее полное обновление перепишет эти строки еще раз
+            current = {column: getattr(row, column) for column in TRACKED_COLUMNS}
+            updates.append({'id': row.id, **current, **values,
+                            'content_hash': updated_content_hash(row, record), 'updated_at': now})
+            result.events.extend(events)
+
+        try:
+            if updates:
+                await self.db.execute(update(Anime), updates)
+                result.updated = len(updates)
+            if new_records:
+                upserted = await AnimeService(self.db).bulk_upsert_anime(new_records, commit=False)
+                result.inserted = upserted.inserted
+                result.updated += upserted.updated
+            await self.db.commit()
+        except Exception as e:
+            logger.error(f"Ошибка записи изменений {source}: {e}")
+            await self.db.rollback()
+            raise
+
+        if result.updated or result.inserted:
+            invalidate_source(source)
+        result.seconds = time.monotonic() - started
+        result.log()
+        return result
@@ -0,0 +1,79 @@
+# src/services/digest.py
+from src.services.diff_engine import EPISODES_ADVANCED, TOTAL_CHANGED
+
+# Лимит длины текста сообщения Telegram
+MESSAGE_LIMIT = 4096
+
+DIGEST_HEADER = "🔔 *Обновления ваших подписок*\n\n"
+DIGEST_CONTINUED_HEADER = "🔔 *Обновления ваших подписок (продолжение)*\n\n"
+DIGEST_FOOTER = "Проверьте, может уже можно смотреть! 🍿"
+
+STATUS_LABELS = {
+    "ongoing": "Онгоинг",
+    "released": "Завершено",
+    "completed": "Завершено",
+    "anons": "Анонс",
+    "announced": "Анонс",
+}
+
+
+def telegram_length(text: str) -> int:
+    """Длина текста так, как ее считает Telegram: в единицах UTF-16"""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def escape_markdown(text: str) -> str:
+    """Экранирование спецсимволов Markdown (parse_mode="Markdown"). Внутри сущностей
+    экранирование не работает, поэтому названия выводятся без выделения"""
+    for char in ("_", "*", "`", "["):
+        text = text.replace(char, f"\\{char}")
+    return text
+
+
+def format_changes(events: list) -> str:
+    """Блок дайджеста по одному аниме: все его события за проход"""
+    lines = [f"🎬 {escape_markdown(events[0].title)}"]
+    for event in events:
+        if event.kind == EPISODES_ADVANCED:
+            lines.append(f"📺 Вышло серий: {event.old or 0} → {event.new}")
+        elif event.kind == TOTAL_CHANGED:
+            lines.append(f"🔢 Всего серий: {event.old or '?'} → {event.new}")
+        else:
+            old_status = STATUS_LABELS.get(event.old, event.old or "?")
+            new_status = STATUS_LABELS.get(event.new, event.new)
+            lines.append(f"📊 Статус: {old_status} → {new_status}")
+    return "\n".join(lines) + "\n\n"
+
+
+def chunk_digest(blocks: list, limit: int = MESSAGE_LIMIT) -> list:
+    """Собрать блоки в сообщения не длиннее limit. Блок не разрывается между сообщениями"""
+    messages = []
+    current = DIGEST_HEADER
+    footer_length = telegram_length(DIGEST_FOOTER)
+    current_length = telegram_length(current)
+    for block in blocks:
+        block_length = telegram_length(block)
+        if current_length + block_length + footer_length > limit and current not in (DIGEST_HEADER, DIGEST_CONTINUED_HEADER):
+            messages.append(current + DIGEST_FOOTER)
+            current = DIGEST_CONTINUED_HEADER
+            current_length = telegram_length(current)
+        current += block
+        current_length += block_length
+    messages.append(current + DIGEST_FOOTER)
+    return messages
+
+
+def build_digests(events: list, subscribers: dict) -> dict:
+    """Сгруппировать события по пользователям: user_id -> список сообщений дайджеста.
+    subscribers - anime_id -> [user_id]"""
+    by_anime = {}
+    for event in events:
+        by_anime.setdefault(event.anime_id, []).append(event)
+    blocks = {anime_id: format_changes(anime_events) for anime_id, anime_events in by_anime.items()}
+    by_user = {}
+    for anime_id, user_ids in subscribers.items():
+        if anime_id not in blocks:
+            continue
+        for user_id in user_ids:
+            by_user.setdefault(user_id, []).append(blocks[anime_id])
+    return {user_id: chunk_digest(user_blocks) for user_id, user_blocks in by_user.items()}
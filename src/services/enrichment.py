@@ -0,0 +1,123 @@
+# src/services/enrichment.py
+import asyncio
+import logging
+
+from sqlalchemy import select, and_
+
+from src.config import ENRICH_CONCURRENCY, ENRICH_MAX_PER_REFRESH, DETAILS_CACHE_DIR, DETAILS_CACHE_TTL
+from src.models.anime import Anime
+from src.utils.disk_cache import DiskCache
+from src.utils.fetch_scheduler import FetchScheduler, fetch_scheduler
+
+logger = logging.getLogger(__name__)
+
+# Поля, которых нет в списке онгоингов Shikimori: приходят только из запроса по ID
+DETAIL_FIELDS = ('description', 'genres', 'duration', 'synonyms')
+
+details_cache = DiskCache(DETAILS_CACHE_DIR, DETAILS_CACHE_TTL)
+
+
+def _parser(source: str):
+    if source == "shikimori":
+        from src.parsers import shikimori as parser
+    elif source == "mal":
+        from src.parsers import mal as parser
+    else:
+        raise ValueError(f"Неизвестный источник: {source}")
+    return parser
+
+
+def _has_details(record: dict) -> bool:
+    return any(record.get(field) for field in DETAIL_FIELDS)
+
+
+class DetailEnricher:
+    """Дозагрузка подробностей для записей из списка онгоингов. Запрос по ID делается только
+    для новых аниме, аниме без подробностей в БД и аниме со сменившимся статусом. Ответы
+    хранятся в кэше на диске, за одно обновление - не больше max_requests запросов"""
+
+    def __init__(self,
+                 cache: DiskCache = details_cache,
+                 fetcher: FetchScheduler = None,
+                 concurrency: int = ENRICH_CONCURRENCY,
+                 max_requests: int = ENRICH_MAX_PER_REFRESH):
+        self.cache = cache
+        self.fetcher = fetcher or fetch_scheduler
+        self.concurrency = concurrency
+        self.remaining = max_requests
+        self.enriched = 0
+        self.requests = 0
+        self.cache_hits = 0
+
+    async def select(self, source: str, records: list, db_session=None) -> dict:
+        """Записи, которым нужны подробности: source_id -> (запись, нужен ли свежий ответ).
+        Без db_session все записи считаются новыми"""
+        candidates = {str(record.get('source_id') or record.get('id')): record
+                      for record in records if not _has_details(record)}
+        if not candidates or db_session is None:
+            return {source_id: (record, False) for source_id, record in candidates.items()}
+        result = await db_session.execute(
+            select(Anime.source_id, Anime.status, Anime.description.isnot(None))
+            .where(and_(Anime.source == source, Anime.source_id.in_(list(candidates))))
+        )
+        known = {source_id: (status, has_details) for source_id, status, has_details in result}
+
+        selected = {}
+        for source_id, record in candidates.items():
+            if source_id not in known:
+                selected[source_id] = (record, False)
+                continue
+            status, has_details = known[source_id]
+            status_changed = record.get('status') is not None and record.get('status') != status
+            if not has_details or status_changed:
+                # Сменился статус - описание и число серий могли обновиться: кэш не используется
+                selected[source_id] = (record, status_changed)
+        return selected
+
+    async def fetch_details(self, source: str, source_id: str, fresh: bool = False):
+        """Подробности одного аниме: из кэша на диске или запросом к API (None при ошибке)"""
+        parser = _parser(source)
+        url = parser.details_url(source_id)
+        data = None if fresh else await self.cache.get(url)
+        if data is not None:
+            self.cache_hits += 1
+        else:
+            if self.remaining <= 0:
+                return None
+            self.remaining -= 1
+            self.requests += 1
+            try:
+                # Подробности хранятся только в этом кэше: в HTTP-кэш планировщика они не попадают
+                data = await self.fetcher.get_json(url, headers=parser.HEADERS, use_cache=False)
+            except Exception as e:
+                logger.warning(f"Не удалось загрузить подробности {source} {source_id}: {e}")
+                return None
+            await self.cache.set(url, data)
+        return parser.parse_details(data)
+
+    async def enrich(self, source: str, records: list, db_session=None) -> int:
+        """Дополнить записи (на месте) полями DETAIL_FIELDS. Возвращает количество дополненных"""
+        selected = await self.select(source, records, db_session)
+        if not selected:
+            return 0
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def enrich_one(source_id, record, fresh):
+            async with semaphore:
+                details = await self.fetch_details(source, source_id, fresh)
+            if not details:
+                # Запись без подробностей не считается обработанной: хэш не сохраняется,
+                # и следующее обновление попробует снова
+                record['content_hash'] = None
+                return False
+            for field in DETAIL_FIELDS:
+                if details.get(field):
+                    record[field] = details[field]
+            return True
+
+        done = await asyncio.gather(*(
+            enrich_one(source_id, record, fresh) for source_id, (record, fresh) in selected.items()
+        ))
+        enriched = sum(done)
+        self.enriched += enriched
+        return enriched
@@ -0,0 +1,236 @@
+# src/services/notification_dispatcher.py
+import asyncio
+import logging
+import random
+import time
+from typing import Iterable, NamedTuple
+
+from aiogram.exceptions import (
+    TelegramRetryAfter,
+    TelegramForbiddenError,
+    TelegramBadRequest,
+    TelegramNetworkError,
+    TelegramServerError,
+)
+from sqlalchemy import select, delete
+
+from src.config import (
+    NOTIFY_GLOBAL_RPS,
+    NOTIFY_GLOBAL_BURST,
+    NOTIFY_CHAT_INTERVAL,
+    NOTIFY_GROUP_INTERVAL,
+    NOTIFY_WORKERS,
+    NOTIFY_QUEUE_SIZE,
+    NOTIFY_MAX_RETRIES,
+)
+from src.database.db import session_scope
+from src.models.blocked_chat import BlockedChat
+from src.utils.fetch_scheduler import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class Notification(NamedTuple):
+    chat_id: int
+    text: str
+    parse_mode: str
+
+
+class NotificationStats:
+    """Счетчики рассылки и пропускная способность с момента первой отправки"""
+
+    def __init__(self):
+        self.enqueued = 0
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.flood_waits = 0
+        self.blocked = 0           # новые блокировки, обнаруженные при отправке
+        self.skipped_blocked = 0   # не поставлены в очередь: бот уже заблокирован
+        self.first_sent_at = None
+        self.last_sent_at = None
+
+    def throughput(self) -> float:
+        """Отправлено сообщений в секунду"""
+        if not self.first_sent_at or self.last_sent_at <= self.first_sent_at:
+            return 0.0
+        return (self.sent - 1) / (self.last_sent_at - self.first_sent_at)
+
+
+class NotificationDispatcher:
+    """Рассылка уведомлений: очередь и пул воркеров. Соблюдает общий лимит бота (token bucket)
+    и интервал между сообщениями в один чат, повторяет отправку после flood wait,
+    не пишет пользователям, заблокировавшим бота"""
+
+    def __init__(self,
+                 session_factory=session_scope,
+                 workers: int = NOTIFY_WORKERS,
+                 queue_size: int = NOTIFY_QUEUE_SIZE,
+                 rate: float = NOTIFY_GLOBAL_RPS,
+                 burst: int = NOTIFY_GLOBAL_BURST,
+                 chat_interval: float = NOTIFY_CHAT_INTERVAL,
+                 group_interval: float = NOTIFY_GROUP_INTERVAL,
+                 max_retries: int = NOTIFY_MAX_RETRIES):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.queue_size = queue_size
+        self.rate = rate
+        self.burst = burst
+        self.chat_interval = chat_interval
+        self.group_interval = group_interval
+        self.max_retries = max_retries
+        self.bot = None
+        self.blocked_chats = set()
+        self.stats = NotificationStats()
+        self._queue = None
+        self._bucket = None
+        self._chat_next = {}   # chat_id -> ближайший момент, когда в чат можно писать
+        self._tasks = []
+        self._in_flight = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    async def load_blocked(self, db_session):
+        """Загрузить заблокированные чаты из БД"""
+        result = await db_session.execute(select(BlockedChat.chat_id))
+        self.blocked_chats = set(result.scalars())
+        logger.info(f"Заблокированных чатов: {len(self.blocked_chats)}")
+
+    def start(self, bot):
+        self.bot = bot
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._bucket = TokenBucket(self.rate, self.burst)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"Рассылка уведомлений запущена: {self.workers} воркеров, до {self.rate:g} сообщений/с")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.log_stats()
+
+    async def notify(self, chat_ids: Iterable[int], text: str, parse_mode: str = None) -> int:
+        """Поставить сообщение в очередь для каждого чата. Если очередь заполнена,
+        ждет освобождения места. Возвращает количество поставленных сообщений"""
+        queued = 0
+        for chat_id in chat_ids:
+            if chat_id in self.blocked_chats:
+                self.stats.skipped_blocked += 1
+                continue
+            await self._queue.put(Notification(chat_id, text, parse_mode))
+            queued += 1
+        self.stats.enqueued += queued
+        return queued
+
+    async def join(self):
+        """Дождаться, пока очередь опустеет"""
+        await self._queue.join()
+
+    async def unblock(self, chat_id: int):
+        """Пользователь снова пишет боту: уведомления ему можно отправлять"""
+        if chat_id not in self.blocked_chats:
+            return
+        self.blocked_chats.discard(chat_id)
+        try:
+            async with self.session_factory() as session:
+                await session.execute(delete(BlockedChat).where(BlockedChat.chat_id == chat_id))
+                await session.commit()
+            logger.info(f"Чат {chat_id} снова доступен для уведомлений")
+        except Exception as e:
+            logger.error(f"Не удалось снять блокировку чата {chat_id}: {e}")
+
+    async def _mark_blocked(self, chat_id: int):
+        if chat_id in self.blocked_chats:
+            return
+        self.blocked_chats.add(chat_id)
+        self.stats.blocked += 1
+        try:
+            async with self.session_factory() as session:
+                await session.merge(BlockedChat(chat_id=chat_id))
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Не удалось сохранить блокировку чата {chat_id}: {e}")
+
+    async def _wait_chat_slot(self, chat_id: int):
+        """Занять ближайшее свободное окно чата и дождаться его"""
+        interval = self.group_interval if chat_id < 0 else self.chat_interval
+        now = time.monotonic()
+        slot = max(now, self._chat_next.get(chat_id, 0.0))
+        self._chat_next[chat_id] = slot + interval
+        if len(self._chat_next) > self.queue_size:
+            self._chat_next = {key: value for key, value in self._chat_next.items() if value > now}
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def _send(self, notification: Notification):
+        for attempt in range(self.max_retries + 1):
+            if notification.chat_id in self.blocked_chats:
+                return
+            await self._wait_chat_slot(notification.chat_id)
+            await self._bucket.acquire()
+            try:
+                await self.bot.send_message(
+                    notification.chat_id,
+                    notification.text,
+                    parse_mode=notification.parse_mode
+                )
+                now = time.monotonic()
+                self.stats.sent += 1
+                self.stats.first_sent_at = self.stats.first_sent_at or now
+                self.stats.last_sent_at = now
+                return
+            except TelegramRetryAfter as e:
+                # Flood wait касается всего бота: останавливаем выдачу токенов всем воркерам
+                self.stats.flood_waits += 1
+                self._bucket.pause(e.retry_after)
+                delay = e.retry_after
+            except TelegramForbiddenError:
+                await self._mark_blocked(notification.chat_id)
+                return
+            except TelegramBadRequest as e:
+                self.stats.failed += 1
+                logger.error(f"Уведомление пользователю {notification.chat_id} отклонено: {e}")
+                return
+            except (TelegramNetworkError, TelegramServerError) as e:
+                delay = min(30.0, 2 ** attempt) * random.uniform(0.5, 1.0)
+                logger.warning(f"Ошибка отправки пользователю {notification.chat_id}, повтор через {delay:.1f} с: {e}")
+
+            if attempt < self.max_retries:
+                self.stats.retried += 1
+                await asyncio.sleep(delay)
+
+        self.stats.failed += 1
+        logger.error(f"Не удалось отправить уведомление пользователю {notification.chat_id} после всех повторов")
+
+    async def _worker(self):
+        while True:
+            notification = await self._queue.get()
+            self._in_flight += 1
+            try:
+                await self._send(notification)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats.failed += 1
+                logger.error(f"Не удалось отправить уведомление пользователю {notification.chat_id}: {e}")
+            finally:
+                self._in_flight -= 1
+                self._queue.task_done()
+            if self._queue.empty() and not self._in_flight:
+                # Рассылка закончилась
+                self.log_stats()
+
+    def log_stats(self):
+        stats = self.stats
+        logger.info(
+            f"Уведомления: в очереди {self.queue_depth}, поставлено {stats.enqueued}, отправлено {stats.sent} "
+            f"({stats.throughput():.1f}/с), ошибок {stats.failed}, повторов {stats.retried}, "
+            f"flood wait {stats.flood_waits}, заблокировали бота {stats.blocked}, "
+            f"пропущено заблокированных {stats.skipped_blocked}"
+        )
+
+
+notification_dispatcher = NotificationDispatcher()
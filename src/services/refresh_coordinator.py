@@ -0,0 +1,126 @@
+# src/services/refresh_coordinator.py
+import asyncio
+import itertools
+import logging
+import time
+from typing import NamedTuple
+
+from src.config import REFRESH_MIN_INTERVAL
+from src.database.db import session_scope
+from src.services.anime_service import AnimeService, UpsertResult
+from src.services.animego_resolver import animego_resolver
+from src.services.refresh_pipeline import RefreshError, RefreshStats
+from src.utils.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Счетчики RefreshStats, которые воркер передает в сообщениях о прогрессе
+PROGRESS_FIELDS = ('pages', 'records', 'inserted', 'updated', 'unchanged', 'failed_pages', 'done')
+
+
+class RefreshOutcome(NamedTuple):
+    result: UpsertResult
+    shared: bool = False   # присоединились к уже идущему обновлению
+    age: float = 0.0       # обновление не запускалось: секунд с окончания предыдущего
+
+
+class RefreshCoordinator:
+    """Полные обновления источников: одновременные запросы ждут уже идущее обновление,
+    а повторное не запускается чаще, чем раз в min_interval секунд"""
+
+    def __init__(self, session_factory=session_scope, min_interval: float = REFRESH_MIN_INTERVAL):
+        self.session_factory = session_factory
+        self.min_interval = min_interval
+        self._flights = SingleFlight()
+        self._last = {}  # источник -> (момент окончания, результат)
+        self.live = {}   # источник -> RefreshStats последнего (или идущего) обновления
+
+    async def _run(self, source: str) -> UpsertResult:
+        stats = self.live[source] = RefreshStats(source)
+        try:
+            async with self.session_factory() as session:
+                result = await AnimeService(session).update_all_ongoing_from_source(source, stats=stats)
+        finally:
+            stats.done = True
+        # Неудачное обновление (RefreshError) сюда не доходит: интервал не отсчитываем, можно повторить сразу
+        if any(result):
+            self._last[source] = (time.monotonic(), result)
+        if result.inserted:
+            # Ссылки AnimeGO для новых аниме ищутся в фоне, обновление их не ждет
+            animego_resolver.schedule()
+        return result
+
+    async def refresh(self, source: str, force: bool = False) -> RefreshOutcome:
+        if self._flights.in_flight(source):
+            logger.info(f"Обновление {source} уже идет, ждем его результата")
+            return RefreshOutcome(await self._flights.do(source, lambda: self._run(source)), shared=True)
+
+        last = self._last.get(source)
+        if last and not force:
+            age = time.monotonic() - last[0]
+            if age < self.min_interval:
+                logger.info(f"Обновление {source} пропущено: предыдущее закончилось {age:.0f} с назад")
+                return RefreshOutcome(last[1], age=age)
+
+        return RefreshOutcome(await self._flights.do(source, lambda: self._run(source)))
+
+
+refresh_coordinator = RefreshCoordinator()
+
+
+class RemoteRefreshCoordinator:
+    """Тот же интерфейс, что у RefreshCoordinator, но обновление выполняет процесс-воркер:
+    запрос уходит по IPC, прогресс и результат приходят обратно. Без воркера - локальное обновление"""
+
+    def __init__(self, ipc, fallback: RefreshCoordinator = refresh_coordinator):
+        self.ipc = ipc
+        self.fallback = fallback
+        self.live = {}
+        self._pending = {}  # request_id -> (источник, future)
+        self._request_ids = itertools.count(1)
+        ipc.on("refresh_progress", self.on_progress)
+        ipc.on("refresh_done", self.on_done)
+        ipc.disconnect_handlers.append(self.on_disconnect)
+
+    async def refresh(self, source: str, force: bool = False) -> RefreshOutcome:
+        if not self.ipc.connected:
+            logger.warning(f"Воркер не подключен, обновление {source} выполняется в процессе бота")
+            outcome = await self.fallback.refresh(source, force)
+            self.live[source] = self.fallback.live.get(source)
+            return outcome
+
+        request_id = next(self._request_ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = (source, future)
+        self.live[source] = RefreshStats(source)
+        try:
+            await self.ipc.send({"type": "refresh", "request_id": request_id, "source": source, "force": force})
+            return await future
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def on_progress(self, message: dict):
+        pending = self._pending.get(message.get("request_id"))
+        if pending is None:
+            return
+        stats = self.live.setdefault(pending[0], RefreshStats(pending[0]))
+        for field in PROGRESS_FIELDS:
+            if field in message:
+                setattr(stats, field, message[field])
+
+    async def on_done(self, message: dict):
+        await self.on_progress(message)
+        pending = self._pending.get(message.get("request_id"))
+        if pending is None or pending[1].done():
+            return
+        if "error" in message:
+            pending[1].set_exception(RefreshError(message["error"]))
+        else:
+            pending[1].set_result(RefreshOutcome(
+                UpsertResult(*message["result"]), message.get("shared", False), message.get("age", 0.0)
+            ))
+
+    def on_disconnect(self):
+        for source, future in self._pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError(f"воркер отключился во время обновления {source}"))
@@ -0,0 +1,113 @@
+# src/services/refresh_jobs.py
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable
+
+from aiogram.types import Message
+
+from src.config import REFRESH_PROGRESS_INTERVAL
+from src.services.refresh_coordinator import RefreshCoordinator, refresh_coordinator
+
+logger = logging.getLogger(__name__)
+
+SOURCE_NAMES = {"shikimori": "Shikimori", "mal": "MyAnimeList"}
+
+
+class RefreshJobs:
+    """Фоновые задания обновления: источники обновляются параллельно, хендлер не ждет.
+    Ход работы показывается в одном сообщении, которое редактируется по мере загрузки"""
+
+    def __init__(self, coordinator: RefreshCoordinator = refresh_coordinator,
+                 interval: float = REFRESH_PROGRESS_INTERVAL):
+        self.coordinator = coordinator
+        self.interval = interval
+        self._tasks = set()
+
+    def submit(self, message: Message, sources, on_done: Callable[[dict], Awaitable] = None) -> asyncio.Task:
+        """Запустить обновление и сразу вернуться. on_done(outcomes) вызывается по окончании
+        с результатами источников, которые обновились без ошибок (если такие есть)"""
+        task = asyncio.create_task(self._run(message, list(sources), on_done))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def _source_line(self, source: str, task: asyncio.Task) -> str:
+        name = SOURCE_NAMES.get(source, source)
+        stats = self.coordinator.live.get(source)
+        if task.done():
+            error = _task_error(task)
+            if error is not None:
+                return f"❌ {name}: ошибка обновления ({error})"
+            outcome = task.result()
+            result = outcome.result
+            if outcome.age:
+                return f"ℹ️ {name}: обновлялся {int(outcome.age)} с назад, повтор пропущен"
+            line = (f"✅ {name}: страниц {stats.pages if stats else 0}, добавлено {result.inserted}, "
+                    f"обновлено {result.updated}, без изменений {result.unchanged}")
+            if stats and stats.failed_pages:
+                line += f", не загружено страниц {len(stats.failed_pages)}"
+            return line
+        if stats is None or stats.done:
+            return f"⏳ {name}: запуск..."
+        written = stats.inserted + stats.updated + stats.unchanged
+        return f"🔄 {name}: страниц {stats.pages}, записано {written} из {stats.records}"
+
+    def _render(self, tasks: dict, elapsed: float, finished: bool) -> str:
+        if not finished:
+            header = f"🔄 Обновляю базу аниме... {elapsed:.0f} с"
+        elif any(_task_error(task) is not None for task in tasks.values()):
+            header = f"⚠️ Обновление завершено с ошибками за {elapsed:.0f} с"
+        else:
+            header = f"✅ Обновление завершено за {elapsed:.0f} с"
+        return "\n".join([header, ""] + [self._source_line(source, task) for source, task in tasks.items()])
+
+    async def _run(self, message: Message, sources: list, on_done):
+        started = time.monotonic()
+        tasks = {source: asyncio.create_task(self.coordinator.refresh(source)) for source in sources}
+        try:
+            text = self._render(tasks, 0, False)
+            progress = await message.answer(text)
+
+            while True:
+                finished = all(task.done() for task in tasks.values())
+                new_text = self._render(tasks, time.monotonic() - started, finished)
+                # Telegram отклоняет редактирование без изменений
+                if new_text != text:
+                    text = new_text
+                    try:
+                        await message.bot.edit_message_text(
+                            text, chat_id=progress.chat.id, message_id=progress.message_id
+                        )
+                    except Exception as e:
+                        logger.warning(f"Не удалось обновить сообщение о прогрессе: {e}")
+                if finished:
+                    break
+                await asyncio.wait(tasks.values(), timeout=self.interval)
+
+            # Ошибка одного источника не отменяет результат другого
+            outcomes = {}
+            for source, task in tasks.items():
+                error = _task_error(task)
+                if error is None:
+                    outcomes[source] = task.result()
+                else:
+                    logger.error(f"Ошибка фонового обновления {source}: {error}")
+            if on_done and outcomes:
+                await on_done(outcomes)
+        except Exception as e:
+            logger.error(f"Ошибка фонового обновления {sources}: {e}")
+            try:
+                await message.answer("❌ Ошибка при обновлении базы данных.")
+            except Exception:
+                pass
+
+
+def _task_error(task: asyncio.Task):
+    """Исключение завершившейся задачи обновления (отмена тоже считается ошибкой) или None"""
+    if task.cancelled():
+        return asyncio.CancelledError("обновление отменено")
+    return task.exception()
+
+
+refresh_jobs = RefreshJobs()
@@ -0,0 +1,129 @@
+# src/services/refresh_pipeline.py
+import asyncio
+import logging
+import time
+from contextlib import aclosing
+from typing import AsyncIterator, Awaitable, Callable
+
+from src.config import REFRESH_QUEUE_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshError(Exception):
+    """Обновление источника не удалось: загрузка прервана или страницы не записались в БД"""
+
+
+class RefreshStats:
+    """Счетчики и время по стадиям одного обновления источника"""
+
+    def __init__(self, source: str):
+        self.source = source
+        self.pages = 0
+        self.failed_pages = []
+        self.records = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.enriched = 0             # записей, дополненных подробностями
+        self.failed_writes = 0        # страниц, которые не удалось записать в БД
+        self.write_error = None       # последняя ошибка записи
+        self.fetch_seconds = 0.0      # от старта до последней загруженной страницы
+        self.write_seconds = 0.0      # суммарное время записи в БД
+        self.producer_blocked = 0.0   # загрузчик ждал места в очереди (БД не успевает)
+        self.writer_idle = 0.0        # писатель ждал страниц (сеть не успевает)
+        self.total_seconds = 0.0
+        self.error = None
+        self.done = False
+
+    def log(self):
+        logger.info(
+            f"Обновление {self.source}: страниц {self.pages}, записей {self.records}, "
+            f"добавлено {self.inserted}, обновлено {self.updated}, без изменений {self.unchanged}, "
+            f"дополнено подробностями {self.enriched}. "
+            f"Сеть {self.fetch_seconds:.2f} с, БД {self.write_seconds:.2f} с, всего {self.total_seconds:.2f} с "
+            f"(загрузчик ждал очередь {self.producer_blocked:.2f} с, писатель ждал страниц {self.writer_idle:.2f} с)"
+        )
+        if self.failed_pages:
+            logger.warning(f"Не удалось загрузить страницы {self.source} после всех повторов: {sorted(self.failed_pages)}")
+        if self.failed_writes:
+            logger.error(f"Не записано в БД страниц {self.source}: {self.failed_writes} ({self.write_error})")
+        if self.error:
+            logger.error(f"Загрузка {self.source} прервана: {self.error}")
+
+    def failure(self):
+        """Почему обновление нельзя считать успешным (None - успешно). Отдельные незагруженные
+        страницы - не ошибка: они видны в failed_pages"""
+        if self.error:
+            return f"загрузка прервана: {self.error}"
+        if self.failed_writes:
+            return f"не записано страниц {self.failed_writes}: {self.write_error}"
+        if self.failed_pages and not self.pages:
+            return "не загружено ни одной страницы"
+        return None
+
+
+async def run_refresh_pipeline(source: str,
+                               pages: AsyncIterator[tuple],
+                               write_page: Callable[[list], Awaitable[tuple]],
+                               queue_size: int = REFRESH_QUEUE_SIZE,
+                               stats: RefreshStats = None) -> RefreshStats:
+    """Конвейер обновления: страницы по мере загрузки идут через ограниченную очередь в стадию записи.
+    Сеть и БД работают параллельно, в памяти не больше queue_size необработанных страниц.
+    Переданный stats обновляется по ходу работы - по нему можно показывать прогресс"""
+    queue = asyncio.Queue(maxsize=queue_size)
+    stats = stats or RefreshStats(source)
+    started = time.monotonic()
+
+    async def produce():
+        try:
+            # aclosing: при ошибке или отмене генератор закрывается сразу, вместе с его запросами
+            async with aclosing(pages):
+                async for page, page_data in pages:
+                    if page_data is None:
+                        stats.failed_pages.append(page)
+                        continue
+                    stats.pages += 1
+                    stats.records += len(page_data)
+                    wait_started = time.monotonic()
+                    await queue.put(page_data)
+                    stats.producer_blocked += time.monotonic() - wait_started
+        except Exception as e:
+            stats.error = e
+        stats.fetch_seconds = time.monotonic() - started
+        await queue.put(None)
+
+    async def consume():
+        while True:
+            wait_started = time.monotonic()
+            page_data = await queue.get()
+            stats.writer_idle += time.monotonic() - wait_started
+            if page_data is None:
+                break
+            write_started = time.monotonic()
+            try:
+                # write_page возвращает счетчики (добавлено, обновлено, без изменений)
+                inserted, updated, unchanged = await write_page(page_data)
+                stats.inserted += inserted
+                stats.updated += updated
+                stats.unchanged += unchanged
+            except Exception as e:
+                # Остальные страницы записываются, но обновление в целом считается неудачным
+                logger.error(f"Ошибка записи страницы {source} в БД: {e}")
+                stats.failed_writes += 1
+                stats.write_error = e
+            stats.write_seconds += time.monotonic() - write_started
+
+    producer = asyncio.create_task(produce())
+    try:
+        await consume()
+    finally:
+        if not producer.done():
+            producer.cancel()
+            # Дождаться отмены: генератор страниц успевает закрыть свои ответы
+            await asyncio.gather(producer, return_exceptions=True)
+
+    stats.total_seconds = time.monotonic() - started
+    stats.done = True
+    stats.log()
+    return stats
@@ -0,0 +1,114 @@
+# src/services/subscription_index.py
+import logging
+import sys
+from array import array
+from bisect import bisect_left
+
+from sqlalchemy import select
+
+from src.models.subscription import Subscription
+
+logger = logging.getLogger(__name__)
+
+# 'q' - 8 байт на id: влезают и user_id Telegram (BigInteger), и anime_id
+_TYPECODE = 'q'
+_EMPTY = array(_TYPECODE)
+
+
+def _contains(values: array, value: int) -> bool:
+    i = bisect_left(values, value)
+    return i < len(values) and values[i] == value
+
+
+def _insert(index: dict, key: int, value: int) -> bool:
+    values = index.get(key)
+    if values is None:
+        index[key] = array(_TYPECODE, (value,))
+        return True
+    i = bisect_left(values, value)
+    if i < len(values) and values[i] == value:
+        return False
+    values.insert(i, value)
+    return True
+
+
+def _remove(index: dict, key: int, value: int) -> bool:
+    values = index.get(key)
+    if values is None:
+        return False
+    i = bisect_left(values, value)
+    if i == len(values) or values[i] != value:
+        return False
+    del values[i]
+    if not values:
+        del index[key]
+    return True
+
+
+class SubscriptionIndex:
+    """Двунаправленный индекс подписок в памяти: user_id -> anime_id и anime_id -> user_id.
+    Значения - отсортированные array('q') (8 байт на id против ~60 у элемента set),
+    проверка членства - бинарный поиск. Загружается из subscriptions при старте,
+    дальше обновляется сквозной записью из SubscriptionsService после commit"""
+
+    def __init__(self):
+        self._by_user = {}
+        self._by_anime = {}
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return sum(len(values) for values in self._by_user.values())
+
+    def build(self, pairs):
+        """Построить индекс из пар (user_id, anime_id)"""
+        by_user, by_anime = {}, {}
+        for user_id, anime_id in pairs:
+            by_user.setdefault(user_id, []).append(anime_id)
+            by_anime.setdefault(anime_id, []).append(user_id)
+        self._by_user = {key: array(_TYPECODE, sorted(set(values))) for key, values in by_user.items()}
+        self._by_anime = {key: array(_TYPECODE, sorted(set(values))) for key, values in by_anime.items()}
+        self.loaded = True
+
+    async def load(self, db_session):
+        """Загрузить все подписки из БД"""
+        result = await db_session.execute(select(Subscription.user_id, Subscription.anime_id))
+        self.build(result.tuples())
+        logger.info(
+            f"Индекс подписок загружен: {len(self)} подписок, "
+            f"{len(self._by_user)} пользователей, {len(self._by_anime)} аниме"
+        )
+
+    def add(self, user_id: int, anime_id: int):
+        if _insert(self._by_user, user_id, anime_id):
+            _insert(self._by_anime, anime_id, user_id)
+
+    def remove(self, user_id: int, anime_id: int):
+        if _remove(self._by_user, user_id, anime_id):
+            _remove(self._by_anime, anime_id, user_id)
+
+    def is_subscribed(self, user_id: int, anime_id: int) -> bool:
+        return _contains(self._by_user.get(user_id, _EMPTY), anime_id)
+
+    def user_anime_ids(self, user_id: int) -> list:
+        return self._by_user.get(user_id, _EMPTY).tolist()
+
+    def subscribers(self, anime_id: int) -> list:
+        return self._by_anime.get(anime_id, _EMPTY).tolist()
+
+    def subscribers_for(self, anime_ids) -> dict:
+        """Подписчики для пачки изменившихся аниме; аниме без подписчиков пропускаются"""
+        return {
+            anime_id: self._by_anime[anime_id].tolist()
+            for anime_id in anime_ids if anime_id in self._by_anime
+        }
+
+    def memory_usage(self) -> int:
+        """Примерный объем памяти индекса в байтах (словари, массивы и ключи)"""
+        total = 0
+        for index in (self._by_user, self._by_anime):
+            total += sys.getsizeof(index)
+            total += sum(sys.getsizeof(key) + sys.getsizeof(values) for key, values in index.items())
+        return total
+
+
+subscription_index = SubscriptionIndex()
@@ -1,12 +1,24 @@
 # src/services/subscription_service.py
-from sqlalchemy import select, and_
+from sqlalchemy import select, delete, and_
 from src.models.subscription import Subscription
 from src.models.anime import Anime
+from src.services.subscription_index import subscription_index
 from datetime import datetime
+from typing import NamedTuple
 import logging
 
 logger = logging.getLogger(__name__)
 
+class SubscriptionItem(NamedTuple):
+    """Строка списка подписок: только поля для /subscriptions"""
+    id: int
+    title: str
+    source: str
+    source_id: str
+    episodes: int
+    episodes_aired: int
+
+
 class SubscriptionsService:
     def __init__(self, db_session):
         self.db = db_session # Сессия передается извне
@@ -14,27 +26,29 @@ class SubscriptionsService:
     async def subscribe_user_to_anime(self, user_id: int, anime_id: int) -> bool:
         """Подписка пользователя на аниме"""
         try:
+            # Уже подписан: по индексу в памяти, без запроса
+            if subscription_index.loaded and subscription_index.is_subscribed(user_id, anime_id):
+                return False
+
             # Проверяем, существует ли аниме
-            result = await self.db.execute(select(Anime).filter(Anime.id == anime_id))
-            anime = result.scalar()
-            if not anime:
+            result = await self.db.execute(select(Anime.id).filter(Anime.id == anime_id))
+            if result.scalar() is None:
                 return False
 
-            # Проверяем, есть ли уже подписка
-            result = await self.db.execute(
-                select(Subscription).filter(
-                    and_(Subscription.user_id == user_id, Subscription.anime_id == anime_id)
+            if not subscription_index.loaded:
+                result = await self.db.execute(
+                    select(Subscription.id).filter(
+                        and_(Subscription.user_id == user_id, Subscription.anime_id == anime_id)
+                    )
                 )
-            )
-            existing_subscription = result.scalar()
-
-            if existing_subscription:
-                return False  # Уже подписан
+                if result.scalar() is not None:
+                    return False  # Уже подписан
 
-            # Создаем новую подписку
+            # Создаем новую подписку; гонку двух нажатий разрешает уникальный ключ
             subscription = Subscription(user_id=user_id, anime_id=anime_id)
             self.db.add(subscription)
             await self.db.commit()
+            subscription_index.add(user_id, anime_id)
             logger.info(f"Пользователь {user_id} подписался на аниме {anime_id}")
             return True
         except Exception as e:
@@ -45,18 +59,19 @@ class SubscriptionsService:
     async def unsubscribe_user_from_anime(self, user_id: int, anime_id: int) -> bool:
         """Отписка пользователя от аниме"""
         try:
+            if subscription_index.loaded and not subscription_index.is_subscribed(user_id, anime_id):
+                return False  # Не был подписан
+
             result = await self.db.execute(
-                select(Subscription).filter(
+                delete(Subscription).where(
                     and_(Subscription.user_id == user_id, Subscription.anime_id == anime_id)
                 )
             )
-            subscription = result.scalar()
+            await self.db.commit()
+            subscription_index.remove(user_id, anime_id)
 
-            if not subscription:
+            if not result.rowcount:
                 return False  # Не был подписан
-
-            await self.db.delete(subscription)
-            await self.db.commit()
             logger.info(f"Пользователь {user_id} отписался от аниме {anime_id}")
             return True
         except Exception as e:
@@ -67,19 +82,28 @@ class SubscriptionsService:
     async def get_user_subscriptions(self, user_id: int) -> list:
         """Получение списка подписок пользователя"""
         try:
-            result = await self.db.execute(
-                select(Anime).join(Subscription).filter(Subscription.user_id == user_id)
-            )
-            return result.scalars().all()
+            query = select(Anime.id, Anime.title, Anime.source, Anime.source_id, Anime.episodes, Anime.episodes_aired)
+            if subscription_index.loaded:
+                # id подписок известны из индекса: выборка по первичному ключу без JOIN
+                anime_ids = subscription_index.user_anime_ids(user_id)
+                if not anime_ids:
+                    return []
+                query = query.filter(Anime.id.in_(anime_ids)).order_by(Anime.id)
+            else:
+                query = query.join(Subscription).filter(Subscription.user_id == user_id)
+            result = await self.db.execute(query)
+            return [SubscriptionItem(*row) for row in result]
         except Exception as e:
             logger.error(f"Ошибка получения подписок пользователя {user_id}: {e}")
             return []
 
     async def is_user_subscribed(self, user_id: int, anime_id: int) -> bool:
         """Проверка, подписан ли пользователь на аниме"""
+        if subscription_index.loaded:
+            return subscription_index.is_subscribed(user_id, anime_id)
         try:
             result = await self.db.execute(
-                select(Subscription).filter(
+                select(Subscription.id).filter(
                     and_(Subscription.user_id == user_id, Subscription.anime_id == anime_id)
                 )
             )
@@ -90,6 +114,8 @@ class SubscriptionsService:
 
     async def get_anime_subscribers(self, anime_id: int) -> list:
         """Получение списка подписчиков на аниме (для уведомлений)"""
+        if subscription_index.loaded:
+            return subscription_index.subscribers(anime_id)
         try:
             result = await self.db.execute(
                 select(Subscription.user_id).filter(Subscription.anime_id == anime_id)
@@ -97,4 +123,23 @@ class SubscriptionsService:
             return [row[0] for row in result.fetchall()]
         except Exception as e:
             logger.error(f"Ошибка получения подписчиков аниме {anime_id}: {e}")
-            return []
\ No newline at end of file
+            return []
+
+    async def get_subscribers_for(self, anime_ids) -> dict:
+        """Подписчики для пачки аниме одним обращением: anime_id -> [user_id]"""
+        anime_ids = list(anime_ids)
+        if subscription_index.loaded:
+            return subscription_index.subscribers_for(anime_ids)
+        if not anime_ids:
+            return {}
+        try:
+            result = await self.db.execute(
+                select(Subscription.anime_id, Subscription.user_id).filter(Subscription.anime_id.in_(anime_ids))
+            )
+            subscribers = {}
+            for anime_id, user_id in result:
+                subscribers.setdefault(anime_id, []).append(user_id)
+            return subscribers
+        except Exception as e:
+            logger.error(f"Ошибка получения подписчиков для {len(anime_ids)} аниме: {e}")
+            return {}
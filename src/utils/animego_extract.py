@@ -0,0 +1,74 @@
+# src/utils/animego_extract.py
+import asyncio
+import html as html_lib
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+from src.config import ANIMEGO_EXTRACTOR, ANIMEGO_PARSE_WORKERS
+
+# Разбор страниц поиска AnimeGO: из всей страницы нужны только ссылки /anime/... и их текст.
+# Экстрактор - функция html -> [(href, текст ссылки)], выбирается настройкой ANIMEGO_EXTRACTOR
+
+ANIME_HREF = re.compile(r"^/anime/")
+# Атрибуты тега: значения в кавычках могут содержать ">"
+_ATTRS = r"""(?:[^>"']|"[^"]*"|'[^']*')*"""
+# Содержимое, в котором html.parser не видит тегов: комментарии, <script> и <style>
+_SKIPPED = re.compile(r"<!--.*?(?:-->|$)|<(script|style)\b" + _ATTRS + r">.*?(?:</\1\s*>|$)", re.I | re.S)
+_ANCHOR = re.compile(r"<a(\s" + _ATTRS + r")?>(.*?)</a\s*>", re.I | re.S)
+_HREF = re.compile(r"""\shref\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>"']+))""", re.I)
+_TAG = re.compile(r"<[a-zA-Z/!?]" + _ATTRS + r">")
+
+
+def extract_full(html: str) -> list:
+    """Прежний способ: полное дерево страницы и фильтр по всем ссылкам (для сравнения)"""
+    soup = BeautifulSoup(html, "html.parser")
+    links = soup.find_all("a", href=lambda x: x and x.startswith("/anime/"))
+    return [(link["href"], link.get_text(strip=True)) for link in links]
+
+
+def extract_strainer(html: str) -> list:
+    """BeautifulSoup строит дерево только из ссылок /anime/ (SoupStrainer)"""
+    soup = BeautifulSoup(html, "html.parser", parse_only=SoupStrainer("a", href=ANIME_HREF))
+    return [(link["href"], link.get_text(strip=True)) for link in soup.find_all("a")]
+
+
+def extract_regex(html: str) -> list:
+    """Регулярные выражения по тегам <a href="/anime/...">: без построения дерева.
+    Комментарии, <script> и <style> вырезаются заранее - как и html.parser, ссылки в них не ищем.
+    Текст - как get_text(strip=True): каждый текстовый фрагмент обрезается отдельно.
+    Вложенные ссылки не поддерживаются (в HTML они и так недопустимы)"""
+    links = []
+    for attrs, text in _ANCHOR.findall(_SKIPPED.sub("", html)):
+        href = _HREF.search(attrs or "")
+        if href is None:
+            continue
+        href = html_lib.unescape(next(value for value in href.groups() if value is not None))
+        if href.startswith("/anime/"):
+            links.append((href, "".join(html_lib.unescape(part).strip() for part in _TAG.split(text))))
+    return links
+
+
+EXTRACTORS = {
+    "full": extract_full,
+    "strainer": extract_strainer,
+    "regex": extract_regex,
+}
+
+_executor = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=ANIMEGO_PARSE_WORKERS, thread_name_prefix="animego-parse")
+    return _executor
+
+
+async def extract_anime_links(html: str, extractor: str = ANIMEGO_EXTRACTOR) -> list:
+    """Разобрать страницу в пуле потоков. html.parser написан на Python и держит GIL, так что
+    разбор не становится параллельным: поток лишь дает циклу событий вклиниваться между
+    переключениями GIL. Основное ускорение - от экстрактора strainer (меньше работы на страницу)"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), EXTRACTORS[extractor], html)
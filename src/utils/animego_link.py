@@ -1,53 +1,53 @@
 import logging
 import urllib.parse
-import aiohttp
-from bs4 import BeautifulSoup
+
+from src.utils.animego_extract import extract_anime_links
+from src.utils.fetch_scheduler import FetchScheduler, FetchError, fetch_scheduler
 
 logger = logging.getLogger(__name__)
 
-async def get_anime_link_from_title(title: str) -> str:
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (compatible; MyAnimeBot/1.0)",
+    "Accept": "text/html,application/xhtml+xml",
+    "Accept-Language": "ru-RU,ru;q=0.9",
+}
+
+async def search_anime_link(title: str, fetcher: FetchScheduler = None) -> str:
+    """
+    Ищет аниме на AnimeGO по названию.
+    Возвращает URL или None, если не найдено; ошибки загрузки (FetchError) не перехватываются,
+    чтобы вызывающий код мог отличить «не найдено» от «не удалось проверить».
+    """
+    search_url = f"https://animego.me/search/anime?q={urllib.parse.quote(title)}"
+    fetcher = fetcher or fetch_scheduler
+    response = await fetcher.fetch(search_url, headers=HEADERS, as_text=True)
+    # Разбор страницы - в пуле потоков; извлекаются только ссылки /anime/ и их текст
+    links = await extract_anime_links(response.data)
+
+    title_lower = title.lower()
+    for href, link_text in links:
+        # Проверяем текст ссылки
+        if title_lower in link_text.lower():
+            full_url = f"https://animego.me{href}"
+            logger.info(f"Найдена ссылка для '{title}': {full_url}")
+            return full_url
+
+    logger.info(f"Ссылка для аниме '{title}' не найдена на AnimeGO.")
+    return None
+
+
+async def get_anime_link_from_title(title: str, fetcher: FetchScheduler = None) -> str:
     """
     Получает ссылку на аниме на AnimeGO по названию.
-    Возвращает URL или None, если не найдено.
+    Возвращает URL или None, если не найдено или запрос не удался.
     """
     if not title:
         return None
-
-    # Формируем URL для поиска
-    search_query = urllib.parse.quote(title)
-    search_url = f"https://animego.me/search/anime?q={search_query}"
-
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(search_url) as response:
-                if response.status == 200:
-                    html = await response.text()
-                    soup = BeautifulSoup(html, 'html.parser')
-
-                    links = soup.find_all('a', href=lambda x: x and x.startswith('/anime/'))
-
-                    for link in links:
-                        # Проверяем текст ссылки или атрибуты title
-                        link_text = link.get_text(strip=True).lower()
-                        title_lower = title.lower()
-                        if title_lower in link_text:
-                            # Нашли подходящую ссылку
-                            full_url = f"https://animego.me{link['href']}"
-                            logger.info(f"Найдена ссылка для '{title}': {full_url}")
-                            return full_url
-
-                    # Если не нашли по точному совпадению текста, можно вернуть первую ссылку
-                    # Это менее точно, но лучше, чем ничего, если структура сложная
-                    # for link in links:
-                    #     full_url = f"https://animego.me{link['href']}"
-                    #     logger.info(f"Найдена первая ссылка для '{title}': {full_url}")
-                    #     return full_url
-
-                    logger.warning(f"Ссылка для аниме '{title}' не найдена на AnimeGO.")
-                    return None
-                else:
-                    logger.error(f"Ошибка при поиске '{title}' на AnimeGO: статус {response.status}")
-                    return None
+        return await search_anime_link(title, fetcher)
+    except FetchError as e:
+        logger.error(f"Ошибка при поиске '{title}' на AnimeGO: статус {e.status}")
+        return None
     except Exception as e:
         logger.error(f"Исключение при поиске '{title}' на AnimeGO: {e}")
         return None
@@ -0,0 +1,89 @@
+# src/utils/disk_cache.py
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class DiskCache:
+    """Кэш ответов API на диске: по JSON-файлу на ключ, срок жизни ttl секунд.
+    Переживает перезапуск бота; файловые операции выполняются вне цикла событий"""
+
+    def __init__(self, directory: str, ttl: float):
+        self.directory = directory
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        return os.path.join(self.directory, digest[:2], f"{digest}.json")
+
+    def _read(self, key: str):
+        try:
+            with open(self._path(key), encoding="utf-8") as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if entry.get("key") != key or entry.get("stored_at", 0) + self.ttl < time.time():
+            return None
+        return entry.get("value")
+
+    def _write(self, key: str, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Запись через временный файл со своим именем на каждую запись: читатель не увидит
+        # недописанный JSON, а одновременные записи одного ключа не пишут в один файл
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=os.path.dirname(path),
+                                         prefix=os.path.basename(path) + ".", suffix=".tmp",
+                                         delete=False) as file:
+            temp_path = file.name
+            try:
+                json.dump({"key": key, "stored_at": time.time(), "value": value}, file, ensure_ascii=False)
+            except BaseException:
+                file.close()
+                os.remove(temp_path)
+                raise
+        try:
+            os.replace(temp_path, path)
+        except OSError:
+            os.remove(temp_path)
+            raise
+
+    async def get(self, key: str):
+        """Значение по ключу или None, если его нет или срок истек"""
+        value = await asyncio.get_running_loop().run_in_executor(None, self._read, key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value):
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._write, key, value)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить ответ в кэш на диске: {e}")
+
+    def _prune(self) -> int:
+        removed = 0
+        deadline = time.time() - self.ttl
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    if os.path.getmtime(path) < deadline:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    pass
+        return removed
+
+    async def prune(self) -> int:
+        """Удалить файлы с истекшим сроком. Возвращает количество удаленных"""
+        return await asyncio.get_running_loop().run_in_executor(None, self._prune)
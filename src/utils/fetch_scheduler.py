@@ -0,0 +1,269 @@
+# src/utils/fetch_scheduler.py
+import asyncio
+import json
+import logging
+import random
+import time
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, NamedTuple
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from src.config import (
+    FETCH_HOST_LIMITS,
+    FETCH_DEFAULT_HOST_LIMITS,
+    FETCH_MAX_RETRIES,
+    FETCH_BACKOFF_BASE,
+    FETCH_BACKOFF_MAX,
+    HTTP_CACHE_ENABLED,
+)
+from src.utils.http_cache import HttpCache
+from src.utils.http_client import HttpClient, http_client
+
+logger = logging.getLogger(__name__)
+
+# Статусы, при которых запрос имеет смысл повторить
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class FetchError(Exception):
+    """Запрос не удался после всех повторов (или ошибка не подлежит повтору)"""
+
+    def __init__(self, url: str, status: int = None, message: str = ""):
+        self.url = url
+        self.status = status
+        super().__init__(f"{url}: {message or status}")
+
+
+class FetchResponse(NamedTuple):
+    status: int
+    headers: dict
+    data: Any
+
+
+class PageBatch(NamedTuple):
+    results: dict   # номер страницы -> результат
+    failed: list    # страницы, которые так и не удалось загрузить
+
+
+class TokenBucket:
+    """Token bucket: не больше rate запросов в секунду со всплеском до capacity"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """Дождаться свободного токена"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Приостановить выдачу токенов (например, после 429) и сбросить накопленный всплеск"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+        # Пауза не копит токены: после нее запросы идут с темпом rate, без всплеска
+        self._updated = self._paused_until
+
+
+def parse_retry_after(value: str):
+    """Retry-After в секундах: поддерживаются форматы delta-seconds и HTTP-date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class FetchScheduler:
+    """Планировщик запросов: token bucket и лимит одновременных запросов на каждый хост,
+    повторы с учетом Retry-After и экспоненциальным backoff с джиттером"""
+
+    def __init__(self,
+                 client: HttpClient = None,
+                 cache: HttpCache = None,
+                 host_limits: dict = None,
+                 default_limits: tuple = FETCH_DEFAULT_HOST_LIMITS,
+                 max_retries: int = FETCH_MAX_RETRIES,
+                 backoff_base: float = FETCH_BACKOFF_BASE,
+                 backoff_max: float = FETCH_BACKOFF_MAX):
+        self.client = client or http_client
+        self.cache = cache
+        self.host_limits = host_limits if host_limits is not None else FETCH_HOST_LIMITS
+        self.default_limits = default_limits
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._buckets = {}
+        self._semaphores = {}
+
+    def _host_state(self, host: str):
+        if host not in self._buckets:
+            rate, burst, concurrency = self.host_limits.get(host, self.default_limits)
+            self._buckets[host] = TokenBucket(rate, burst)
+            self._semaphores[host] = asyncio.Semaphore(concurrency)
+        return self._buckets[host], self._semaphores[host]
+
+    def _backoff(self, attempt: int, retry_after: float = None) -> float:
+        """Задержка перед повтором: Retry-After от сервера или экспонента с джиттером"""
+        if retry_after is not None:
+            return min(self.backoff_max, retry_after) + random.uniform(0, self.backoff_base)
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return random.uniform(delay / 2, delay)
+
+    async def fetch(self, url: str, *, params: dict = None, headers: dict = None,
+                    as_text: bool = False, cache_ttl: float = None, use_cache: bool = True) -> FetchResponse:
+        """GET-запрос с учетом лимитов хоста и повторами; после исчерпания повторов - FetchError.
+        Если задан кэш, свежий ответ отдается без запроса, остальные проверяются условным запросом.
+        cache_ttl - срок свежести для ответов без ETag/Last-Modified (0 - всегда спрашивать сервер).
+        use_cache=False - ответ не ищется и не сохраняется в кэше (его кэширует вызывающий код)"""
+        host = urlsplit(url).hostname or ""
+        bucket, semaphore = self._host_state(host)
+        last_error = None
+
+        cache = self.cache if use_cache else None
+        cache_key = entry = None
+        if cache is not None:
+            cache_key = cache.key(url, params, as_text)
+            entry = await cache.lookup(cache_key)
+            if entry is not None:
+                if cache.is_fresh(entry, cache_ttl):
+                    return FetchResponse(entry["status"], entry["headers"], cache.hit(cache_key, entry, as_text))
+                headers = {**(headers or {}), **cache.conditional_headers(entry)}
+
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            unconditional = False
+            async with semaphore:
+                await bucket.acquire()
+                try:
+                    started = time.monotonic()
+                    async with self.client.get(url, params=params, headers=headers) as resp:
+                        if resp.status == 304 and entry is not None:
+                            data = await cache.revalidated(cache_key, entry, resp.headers, as_text)
+                            return FetchResponse(entry["status"], entry["headers"], data)
+                        elif resp.status == 304:
+                            # Подтверждать нечего (сохраненного ответа нет): тело 304 пустое,
+                            # это промах - повторяем сразу, без условных заголовков
+                            headers = {name: value for name, value in (headers or {}).items()
+                                       if name.lower() not in ("if-none-match", "if-modified-since")}
+                            last_error = FetchError(url, 304, "304 Not Modified без сохраненного ответа")
+                            unconditional = True
+                        elif resp.status in RETRY_STATUSES:
+                            retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+                            last_error = FetchError(url, resp.status)
+                            if resp.status == 429:
+                                # Притормаживаем весь хост, а не только этот запрос
+                                bucket.pause(self._backoff(attempt, retry_after))
+                        elif resp.status >= 400:
+                            raise FetchError(url, resp.status)
+                        elif cache is not None:
+                            body = await resp.text()
+                            data = body if as_text else (json.loads(body) if body.strip() else None)
+                            await cache.save(cache_key, resp.status, resp.headers, body,
+                                                  time.monotonic() - started, None if as_text else data)
+                            return FetchResponse(resp.status, dict(resp.headers), data)
+                        else:
+                            data = await resp.text() if as_text else await resp.json(content_type=None)
+                            return FetchResponse(resp.status, dict(resp.headers), data)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    last_error = FetchError(url, message=str(e) or type(e).__name__)
+
+            if unconditional:
+                continue
+            if attempt < self.max_retries:
+                delay = self._backoff(attempt, retry_after)
+                logger.warning(f"Повтор запроса {url} {params or ''} через {delay:.1f} с "
+                               f"(попытка {attempt + 1}/{self.max_retries}): {last_error}")
+                await asyncio.sleep(delay)
+
+        raise last_error
+
+    async def get_json(self, url: str, *, params: dict = None, headers: dict = None, cache_ttl: float = None,
+                       use_cache: bool = True):
+        """GET-запрос, возвращающий разобранный JSON (из кэша - общий объект, изменять нельзя)"""
+        return (await self.fetch(url, params=params, headers=headers, cache_ttl=cache_ttl, use_cache=use_cache)).data
+
+    async def iter_pages(self, fetch_page: Callable[[int], Awaitable[Any]], pages: Iterable[int],
+                         max_in_flight: int = None) -> AsyncIterator[tuple]:
+        """Загружать страницы и отдавать (страница, результат, ошибка) по мере готовности.
+        Любая ошибка fetch_page (загрузки или разбора) делает страницу незагруженной: результат None.
+        Не больше max_in_flight страниц загружается или ждет потребителя одновременно"""
+        pages = iter(pages)
+        pending = set()
+
+        async def run(page: int):
+            try:
+                return page, await fetch_page(page), None
+            except FetchError as e:
+                logger.error(f"Страница {page} не загружена: {e}")
+                return page, None, e
+            except Exception as e:
+                # Неразборчивый ответ (пустое тело, null, не JSON) - тоже незагруженная страница,
+                # а не ошибка, прерывающая все обновление
+                logger.error(f"Страница {page} не разобрана: {type(e).__name__}: {e}")
+                return page, None, e
+
+        def launch():
+            for page in pages:
+                pending.add(asyncio.create_task(run(page)))
+                if max_in_flight and len(pending) >= max_in_flight:
+                    break
+
+        launch()
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    pending.discard(task)
+                    yield task.result()
+                launch()
+        finally:
+            for task in pending:
+                task.cancel()
+            # Отмененные загрузки успевают освободить соединения до выхода из генератора
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def fetch_pages(self, fetch_page: Callable[[int], Awaitable[Any]],
+                          pages: Iterable[int]) -> PageBatch:
+        """Загрузить набор страниц целиком; темп задают лимиты хоста, а не количество задач"""
+        results = {}
+        failed = []
+        async for page, result, error in self.iter_pages(fetch_page, pages):
+            if error is None:
+                results[page] = result
+            else:
+                failed.append(page)
+        return PageBatch(dict(sorted(results.items())), sorted(failed))
+
+
+# Общий кэш ответов API на диске
+http_cache = HttpCache() if HTTP_CACHE_ENABLED else None
+
+# Глобальный планировщик поверх общего HTTP-клиента
+fetch_scheduler = FetchScheduler(cache=http_cache)
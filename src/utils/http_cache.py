@@ -0,0 +1,155 @@
+# src/utils/http_cache.py
+import json
+import logging
+import re
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+from src.config import HTTP_CACHE_DIR, HTTP_CACHE_TTL, HTTP_CACHE_RETENTION, HTTP_CACHE_MEMORY_ITEMS
+from src.utils.disk_cache import DiskCache
+
+logger = logging.getLogger(__name__)
+
+_MAX_AGE = re.compile(r"(?:^|,)\s*(?:s-)?max-age\s*=\s*(\d+)", re.I)
+# Заголовки ответа, которые сохраняются вместе с телом (остальные не нужны парсерам)
+STORED_HEADERS = ("ETag", "Last-Modified", "Cache-Control", "Content-Type", "X-Total-Count")
+
+
+class HttpCacheStats:
+    """Счетчики кэша: сколько запросов обошлись без загрузки и сколько это сэкономило"""
+
+    def __init__(self):
+        self.hits = 0              # ответ свежий, запрос не отправлялся
+        self.revalidated = 0       # 304 Not Modified: тело не загружалось
+        self.misses = 0            # ответ загружен целиком
+        self.bytes_downloaded = 0
+        self.bytes_saved = 0       # размер тел, которые не пришлось загружать
+        self.seconds_saved = 0.0   # оценка: время первоначальной загрузки этих ответов
+
+    def log(self):
+        total = self.hits + self.revalidated + self.misses
+        if not total:
+            return
+        logger.info(
+            f"HTTP-кэш с запуска: запросов {total}, из кэша {self.hits}, подтверждено 304 {self.revalidated}, "
+            f"загружено {self.misses}. Загружено {self.bytes_downloaded / 1024:.0f} КБ, "
+            f"сэкономлено {self.bytes_saved / 1024:.0f} КБ и ~{self.seconds_saved:.1f} с"
+        )
+
+
+class HttpCache:
+    """Кэш ответов API на диске по URL и параметрам. Ответ с ETag/Last-Modified проверяется
+    условным запросом (If-None-Match/If-Modified-Since), без них считается свежим ttl секунд
+    (или сколько разрешает Cache-Control: max-age). Разобранный JSON последних ответов
+    хранится в памяти, чтобы не разбирать неизменившуюся страницу заново"""
+
+    def __init__(self,
+                 directory: str = HTTP_CACHE_DIR,
+                 ttl: float = HTTP_CACHE_TTL,
+                 retention: float = HTTP_CACHE_RETENTION,
+                 memory_items: int = HTTP_CACHE_MEMORY_ITEMS):
+        self.ttl = ttl
+        self.store = DiskCache(directory, retention)
+        self.memory_items = memory_items
+        self._decoded = OrderedDict()  # ключ -> (момент сохранения, разобранные данные)
+        self.stats = HttpCacheStats()
+
+    @staticmethod
+    def key(url: str, params: dict = None, as_text: bool = False) -> str:
+        query = urlencode(sorted((params or {}).items()))
+        return f"{'text' if as_text else 'json'} {url}?{query}"
+
+    async def lookup(self, key: str):
+        return await self.store.get(key)
+
+    def is_fresh(self, entry: dict, ttl: float = None) -> bool:
+        """Можно ли отдать ответ без запроса. ttl переопределяет срок для ответов без валидаторов
+        (ttl=0 - всегда спрашивать сервер)"""
+        max_age = entry.get("max_age")
+        if max_age is None:
+            has_validators = entry["headers"].get("ETag") or entry["headers"].get("Last-Modified")
+            max_age = 0 if has_validators else (self.ttl if ttl is None else ttl)
+        elif ttl is not None:
+            max_age = min(max_age, ttl)
+        return entry["stored_at"] + max_age > time.time()
+
+    @staticmethod
+    def conditional_headers(entry: dict) -> dict:
+        headers = {}
+        if entry["headers"].get("ETag"):
+            headers["If-None-Match"] = entry["headers"]["ETag"]
+        if entry["headers"].get("Last-Modified"):
+            headers["If-Modified-Since"] = entry["headers"]["Last-Modified"]
+        return headers
+
+    def decode(self, key: str, entry: dict, as_text: bool):
+        """Данные ответа: разобранный JSON из памяти, если эта версия ответа уже разбиралась.
+        Отдаваемый объект общий для всех вызывающих - его нельзя изменять"""
+        if as_text:
+            return entry["body"]
+        cached = self._decoded.get(key)
+        if cached is not None and cached[0] == entry["body_version"]:
+            self._decoded.move_to_end(key)
+            return cached[1]
+        data = json.loads(entry["body"]) if entry["body"].strip() else None
+        self._remember(key, entry["body_version"], data)
+        return data
+
+    def _remember(self, key: str, version: float, data):
+        self._decoded[key] = (version, data)
+        self._decoded.move_to_end(key)
+        while len(self._decoded) > self.memory_items:
+            self._decoded.popitem(last=False)
+
+    def hit(self, key: str, entry: dict, as_text: bool):
+        self.stats.hits += 1
+        self.stats.bytes_saved += entry["size"]
+        self.stats.seconds_saved += entry.get("elapsed", 0.0)
+        return self.decode(key, entry, as_text)
+
+    async def revalidated(self, key: str, entry: dict, headers, as_text: bool):
+        """304 Not Modified: продлить сохраненный ответ и отдать его"""
+        self.stats.revalidated += 1
+        self.stats.bytes_saved += entry["size"]
+        self.stats.seconds_saved += entry.get("elapsed", 0.0)
+        entry["headers"].update({name: headers[name] for name in STORED_HEADERS if name in headers})
+        entry["max_age"] = _max_age(entry["headers"])
+        entry["stored_at"] = time.time()
+        await self.store.set(key, entry)
+        return self.decode(key, entry, as_text)
+
+    async def save(self, key: str, status: int, headers, body: str, elapsed: float, data=None):
+        """Сохранить загруженный ответ (кроме Cache-Control: no-store)"""
+        size = len(body.encode())
+        self.stats.misses += 1
+        self.stats.bytes_downloaded += size
+        if "no-store" in headers.get("Cache-Control", "").lower():
+            return
+        stored_headers = {name: headers[name] for name in STORED_HEADERS if name in headers}
+        now = time.time()
+        entry = {
+            "status": status,
+            "headers": stored_headers,
+            "body": body,
+            "size": size,
+            "body_version": now,
+            "stored_at": now,
+            "max_age": _max_age(stored_headers),
+            "elapsed": elapsed,
+        }
+        await self.store.set(key, entry)
+        if data is not None:
+            self._remember(key, now, data)
+
+    def log_stats(self):
+        self.stats.log()
+
+
+def _max_age(headers: dict):
+    """Срок свежести из Cache-Control (None, если не указан; no-cache - 0)"""
+    cache_control = headers.get("Cache-Control", "")
+    if "no-cache" in cache_control.lower():
+        return 0
+    match = _MAX_AGE.search(cache_control)
+    return int(match.group(1)) if match else None
@@ -0,0 +1,67 @@
+# src/utils/http_client.py
+import logging
+import aiohttp
+
+from src.config import (
+    HTTP_POOL_LIMIT,
+    HTTP_POOL_LIMIT_PER_HOST,
+    HTTP_DNS_CACHE_TTL,
+    HTTP_KEEPALIVE_TIMEOUT,
+    HTTP_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class HttpClient:
+    """Общий долгоживущий HTTP-клиент с пулом соединений, keep-alive и кэшем DNS"""
+
+    def __init__(self,
+                 limit: int = HTTP_POOL_LIMIT,
+                 limit_per_host: int = HTTP_POOL_LIMIT_PER_HOST,
+                 dns_cache_ttl: int = HTTP_DNS_CACHE_TTL,
+                 keepalive_timeout: float = HTTP_KEEPALIVE_TIMEOUT,
+                 timeout: float = HTTP_TIMEOUT):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout
+        self._session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """Сессия создается лениво, при первом обращении внутри event loop"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                use_dns_cache=True,
+                ttl_dns_cache=self.dns_cache_ttl,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def start(self):
+        """Открыть пул соединений"""
+        _ = self.session
+        logger.info(f"HTTP-клиент запущен: лимит {self.limit}, на хост {self.limit_per_host}")
+
+    def get(self, url: str, *, params: dict = None, headers: dict = None):
+        """GET-запрос через общий пул; заголовки источника дополняют заголовки сессии"""
+        return self.session.get(url, params=params, headers=headers)
+
+    async def close(self):
+        """Закрыть пул соединений"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("HTTP-клиент остановлен")
+        self._session = None
+
+
+# Глобальный экземпляр клиента, создается в bot.main и передается в парсеры
+http_client = HttpClient()
@@ -0,0 +1,225 @@
+# src/utils/ipc.py
+import asyncio
+import hmac
+import json
+import logging
+from typing import Awaitable, Callable
+
+from src.config import IPC_HOST, IPC_PORT, IPC_TOKEN, IPC_OUTBOX_SIZE, IPC_RECONNECT_DELAY, IPC_LINE_LIMIT
+
+logger = logging.getLogger(__name__)
+
+# Канал между процессом бота и воркером: JSON по строке на сообщение поверх локального TCP.
+# Каждое сообщение - словарь с полем "type"; первое сообщение клиента - hello с токеном
+
+
+class IpcPeer:
+    """Общая часть обеих сторон канала: обработчики по типу сообщения и очередь на отправку.
+    Сообщения, отправленные без соединения, ждут его в очереди (не больше IPC_OUTBOX_SIZE).
+    Сообщение длиннее line_limit байт не отправляется, а принятое - пропускается, не обрывая канал"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.line_limit = IPC_LINE_LIMIT
+        self.handlers = {}
+        self.disconnect_handlers = []
+        self._writer = None
+        self._connection = None  # writer обслуживаемого соединения, об обрыве которого еще не сообщено
+        self._connected = asyncio.Event()
+        self._outbox = asyncio.Queue(maxsize=IPC_OUTBOX_SIZE)
+        self._tasks = set()
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None
+
+    def on(self, message_type: str, handler: Callable[[dict], Awaitable]):
+        self.handlers[message_type] = handler
+
+    def send_nowait(self, message: dict):
+        try:
+            self._outbox.put_nowait(message)
+        except asyncio.QueueFull:
+            logger.warning(f"IPC {self.name}: очередь отправки переполнена, сообщение {message.get('type')} отброшено")
+
+    async def send(self, message: dict):
+        await self._outbox.put(message)
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _pump(self):
+        """Отправка сообщений из очереди; при обрыве сообщение ждет нового соединения"""
+        while True:
+            message = await self._outbox.get()
+            line = (json.dumps(message, ensure_ascii=False, default=str) + "\n").encode()
+            if len(line) > self.line_limit:
+                logger.error(f"IPC {self.name}: сообщение {message.get('type')} длиннее {self.line_limit} байт "
+                             f"({len(line)}), не отправлено")
+                continue
+            while True:
+                await self._connected.wait()
+                writer = self._writer
+                try:
+                    writer.write(line)
+                    await writer.drain()
+                    break
+                except (ConnectionError, RuntimeError) as e:
+                    logger.warning(f"IPC {self.name}: ошибка отправки: {e}")
+                    self._set_writer(None)
+                    # Чтение этого соединения завершится, и о нем сообщат обработчики отключения
+                    writer.close()
+
+    def _set_writer(self, writer):
+        self._writer = writer
+        if writer is None:
+            self._connected.clear()
+        else:
+            self._connected.set()
+
+    async def _read_line(self, reader: asyncio.StreamReader) -> bytes:
+        """Следующее сообщение (b"" - соединение закрыто). Строка длиннее лимита читателя
+        пропускается целиком: следующее сообщение начинается после ее перевода строки"""
+        skipping = False
+        while True:
+            try:
+                line = await reader.readuntil(b"\n")
+            except asyncio.IncompleteReadError as e:
+                return b"" if skipping else e.partial
+            except asyncio.LimitOverrunError as e:
+                if not skipping:
+                    logger.warning(f"IPC {self.name}: сообщение длиннее {self.line_limit} байт отброшено")
+                skipping = True
+                await reader.readexactly(e.consumed)
+                continue
+            if not skipping:
+                return line
+            skipping = False
+
+    async def _read_loop(self, reader: asyncio.StreamReader):
+        while True:
+            line = await self._read_line(reader)
+            if not line:
+                return
+            try:
+                message = json.loads(line)
+            except ValueError:
+                logger.warning(f"IPC {self.name}: некорректное сообщение отброшено")
+                continue
+            handler = self.handlers.get(message.get("type"))
+            if handler is None:
+                logger.warning(f"IPC {self.name}: неизвестный тип сообщения {message.get('type')}")
+                continue
+            # Обработчик не задерживает чтение следующих сообщений
+            self._spawn(self._handle(handler, message))
+
+    async def _handle(self, handler, message: dict):
+        try:
+            await handler(message)
+        except Exception as e:
+            logger.error(f"IPC {self.name}: ошибка обработки {message.get('type')}: {e}")
+
+    def _connection_lost(self, writer):
+        """Соединение writer больше не используется: обработчики отключения вызываются
+        по одному разу на соединение - и при обрыве, и когда его заменило новое"""
+        if self._connection is not writer:
+            return
+        self._connection = None
+        if self._writer is writer:
+            self._set_writer(None)
+        for handler in self.disconnect_handlers:
+            handler()
+
+    async def _serve_connection(self, reader, writer):
+        if self._connection is not None:
+            # Запросы, ушедшие по прежнему соединению, ответа уже не получат
+            self._connection_lost(self._connection)
+        self._connection = writer
+        self._set_writer(writer)
+        try:
+            await self._read_loop(reader)
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            logger.warning(f"IPC {self.name}: соединение прервано: {e}")
+        finally:
+            self._connection_lost(writer)
+            writer.close()
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._writer is not None:
+            self._writer.close()
+            self._set_writer(None)
+        self._connection = None
+
+
+class IpcServer(IpcPeer):
+    """Сторона бота: принимает одно соединение воркера на локальном порту"""
+
+    def __init__(self, host: str = IPC_HOST, port: int = IPC_PORT, token: str = IPC_TOKEN):
+        super().__init__("бот")
+        self.host = host
+        self.port = port
+        self.token = token
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._accept, self.host, self.port, limit=self.line_limit)
+        self._spawn(self._pump())
+        logger.info(f"IPC: ожидаем воркер на {self.host}:{self.port}")
+
+    async def _accept(self, reader, writer):
+        try:
+            hello = json.loads(await asyncio.wait_for(reader.readline(), timeout=5))
+        except (ValueError, asyncio.TimeoutError, ConnectionError):
+            hello = {}
+        if hello.get("type") != "hello" or not hmac.compare_digest(str(hello.get("token", "")), self.token):
+            logger.warning("IPC: отклонено соединение без верного токена")
+            writer.close()
+            return
+        if self._writer is not None:
+            logger.warning("IPC: новое соединение воркера заменяет прежнее")
+            self._writer.close()
+        logger.info("IPC: воркер подключен")
+        await self._serve_connection(reader, writer)
+        logger.info("IPC: воркер отключен")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        await super().stop()
+
+
+class IpcClient(IpcPeer):
+    """Сторона воркера: подключается к боту и переподключается при обрыве"""
+
+    def __init__(self, host: str = IPC_HOST, port: int = IPC_PORT, token: str = IPC_TOKEN):
+        super().__init__("воркер")
+        self.host = host
+        self.port = port
+        self.token = token
+
+    def start(self):
+        self._spawn(self._pump())
+        self._spawn(self._connect_loop())
+
+    async def _connect_loop(self):
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port, limit=self.line_limit)
+            except OSError as e:
+                logger.warning(f"IPC: бот недоступен на {self.host}:{self.port} ({e}), "
+                               f"повтор через {IPC_RECONNECT_DELAY:g} с")
+                await asyncio.sleep(IPC_RECONNECT_DELAY)
+                continue
+            writer.write((json.dumps({"type": "hello", "token": self.token}) + "\n").encode())
+            await writer.drain()
+            logger.info("IPC: подключено к боту")
+            await self._serve_connection(reader, writer)
+            logger.warning("IPC: соединение с ботом потеряно")
+            await asyncio.sleep(IPC_RECONNECT_DELAY)
@@ -0,0 +1,26 @@
+# src/utils/single_flight.py
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """Не больше одного выполняющегося вызова на ключ: остальные вызывающие ждут его результат.
+    Вызов выполняется отдельной задачей, поэтому отмена одного из ожидающих его не прерывает"""
+
+    def __init__(self):
+        self._flights = {}
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._flights
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]):
+        task = self._flights.get(key)
+        if task is None:
+            task = asyncio.create_task(fn())
+            self._flights[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._flights.get(key) is task:
+            del self._flights[key]
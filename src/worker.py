@@ -0,0 +1,111 @@
+# src/worker.py
+import asyncio
+import logging
+import signal
+
+from src.config import EXTERNAL_WORKER, IPC_NOTIFY_CHUNK, REFRESH_PROGRESS_INTERVAL
+from src.database.db import engine
+from src.scheduler import AnimeUpdateScheduler
+from src.services.animego_resolver import animego_resolver
+from src.services.cache_pruner import cache_pruner
+from src.services.cache import invalidation_listeners
+from src.services.refresh_coordinator import PROGRESS_FIELDS, refresh_coordinator
+from src.utils.http_client import http_client
+from src.utils.ipc import IpcClient
+
+# Логирование
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] [worker] %(message)s")
+logger = logging.getLogger(__name__)
+
+
+class IpcNotifier:
+    """Рассылка из воркера: получатели и текст передаются боту, отправляет его диспетчер уведомлений"""
+
+    def __init__(self, ipc: IpcClient):
+        self.ipc = ipc
+
+    async def notify(self, chat_ids, text: str, parse_mode: str = None) -> int:
+        chat_ids = list(chat_ids)
+        for start in range(0, len(chat_ids), IPC_NOTIFY_CHUNK):
+            await self.ipc.send({
+                "type": "notify",
+                "chat_ids": chat_ids[start:start + IPC_NOTIFY_CHUNK],
+                "text": text,
+                "parse_mode": parse_mode,
+            })
+        return len(chat_ids)
+
+
+def _progress_message(message_type: str, request_id: int, stats) -> dict:
+    message = {"type": message_type, "request_id": request_id}
+    if stats is not None:
+        message.update({field: getattr(stats, field) for field in PROGRESS_FIELDS})
+    return message
+
+
+def make_refresh_handler(ipc: IpcClient):
+    async def handle_refresh(message: dict):
+        """Полное обновление по запросу бота: прогресс отправляется, пока обновление идет"""
+        source = message["source"]
+        request_id = message["request_id"]
+        task = asyncio.create_task(refresh_coordinator.refresh(source, message.get("force", False)))
+        while not task.done():
+            await asyncio.wait([task], timeout=REFRESH_PROGRESS_INTERVAL)
+            if not task.done():
+                ipc.send_nowait(_progress_message("refresh_progress", request_id, refresh_coordinator.live.get(source)))
+
+        done = _progress_message("refresh_done", request_id, refresh_coordinator.live.get(source))
+        try:
+            outcome = task.result()
+        except Exception as e:
+            # Бот покажет ошибку источника, а не пустой результат
+            logger.error(f"Ошибка обновления {source}: {e}")
+            done["error"] = str(e) or type(e).__name__
+        else:
+            done.update({"result": list(outcome.result), "shared": outcome.shared, "age": outcome.age})
+        await ipc.send(done)
+
+    return handle_refresh
+
+
+async def main():
+    if not EXTERNAL_WORKER:
+        logger.warning("EXTERNAL_WORKER не включен: бот тоже запускает планировщик. "
+                       "Задайте EXTERNAL_WORKER=1 для обоих процессов")
+
+    from src.database import init_db
+    await init_db()
+    await http_client.start()
+
+    ipc = IpcClient()
+    ipc.on("refresh", make_refresh_handler(ipc))
+    # Сбросы кэшей после записи в БД уходят в процесс бота
+    invalidation_listeners.append(lambda source: ipc.send_nowait({"type": "invalidate", "source": source}))
+    ipc.start()
+
+    # Индекс подписок в воркере не загружается: подписчики читаются из БД, которую меняет бот
+    scheduler = AnimeUpdateScheduler(notifier=IpcNotifier(ipc))
+    scheduler.start()
+    cache_pruner.start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+
+    logger.info("Воркер запущен: планировщик и обновления источников")
+    try:
+        await stop.wait()
+    finally:
+        await scheduler.stop()
+        await ipc.stop()
+        await animego_resolver.stop()
+        await cache_pruner.stop()
+        await http_client.close()
+        await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,45 @@
+# tests/test_animego_extract.py
+"""Экстракторы ссылок со страниц поиска AnimeGO должны давать одинаковый результат.
+Страницы в fixtures/animego повторяют разметку поиска AnimeGO вместе с трудными местами:
+ссылки /anime/ в <script>, <style> и комментариях, атрибуты в одинарных кавычках и без них,
+вложенные теги и сущности в тексте ссылки. Сохраненные страницы поиска (*.html) можно
+положить туда же - они проверяются автоматически"""
+import glob
+import os
+
+import pytest
+
+from src.utils.animego_extract import EXTRACTORS, extract_full, extract_regex, extract_strainer
+
+FIXTURES = sorted(glob.glob(os.path.join(os.path.dirname(__file__), "fixtures", "animego", "*.html")))
+
+
+def read(path: str) -> str:
+    with open(path, encoding="utf-8") as file:
+        return file.read()
+
+
+@pytest.mark.parametrize("path", FIXTURES, ids=os.path.basename)
+def test_extractors_agree(path):
+    html = read(path)
+    reference = extract_full(html)
+    for name, extractor in EXTRACTORS.items():
+        assert extractor(html) == reference, name
+
+
+def test_fixtures_present():
+    assert FIXTURES
+
+
+@pytest.mark.parametrize("extractor", [extract_full, extract_strainer, extract_regex])
+def test_links_in_scripts_and_comments_ignored(extractor):
+    html = read(os.path.join(os.path.dirname(__file__), "fixtures", "animego", "search_nothing_found.html"))
+    hrefs = [href for href, _ in extractor(html)]
+    assert not [href for href in hrefs if "suggest" in href or "commented-out" in href or "script" in href]
+
+
+def test_search_result_text():
+    html = read(os.path.join(os.path.dirname(__file__), "fixtures", "animego", "search_frieren.html"))
+    links = dict((href, text) for href, text in extract_regex(html) if text)
+    assert links["/anime/provozhayuschaya-v-posledniy-put-friren-2462"] == "Провожающая в последний путь Фрирен"
+    assert links["/anime/friren-film-3001"] == "Фрирен\xa0— фильм"
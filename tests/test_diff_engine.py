@@ -0,0 +1,60 @@
+# tests/test_diff_engine.py
+"""Проход планировщика обновляет content_hash вместе с сериями и статусом: следующее полное
+обновление не переписывает эти строки заново"""
+import asyncio
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.database.base import Base
+from src.models.anime import Anime  # noqa: F401 - таблицы для create_all
+from src.models.animego_link import AnimeGoLink  # noqa: F401
+from src.models.blocked_chat import BlockedChat  # noqa: F401
+from src.models.subscription import Subscription  # noqa: F401
+from src.services.anime_service import AnimeService, content_hash
+from src.services.diff_engine import DiffEngine
+
+
+def record(**changes) -> dict:
+    return {"source": "shikimori", "id": 52991, "title": "Sousou no Frieren", "status": "ongoing",
+            "episodes": 28, "episodes_aired": 10, "score": 9.1, **changes}
+
+
+async def open_session():
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return engine, sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+
+def sweep(snapshot: dict):
+    """Записать record(), применить снимок проходом; вернуть сохраненный хэш"""
+    async def scenario():
+        engine, session_factory = await open_session()
+        async with session_factory() as session:
+            await AnimeService(session).bulk_upsert_anime([record()])
+        async with session_factory() as session:
+            result = await DiffEngine(session).apply("shikimori", [snapshot], complete=False)
+        async with session_factory() as session:
+            hashes = await AnimeService(session).get_content_hashes("shikimori")
+        await engine.dispose()
+        return result, hashes["52991"]
+
+    return asyncio.run(scenario())
+
+
+def test_sweep_update_stores_record_hash():
+    snapshot = record(episodes_aired=11)
+    result, stored = sweep(snapshot)
+    assert result.updated == 1
+    # Полное обновление сравнит хэш той же записи с сохраненным и пропустит строку
+    assert stored == content_hash(snapshot)
+
+
+def test_untracked_change_keeps_old_hash():
+    # Оценку проход не пишет: хэш остается прежним, и полное обновление перепишет строку
+    snapshot = record(episodes_aired=11, score=9.2)
+    result, stored = sweep(snapshot)
+    assert result.updated == 1
+    assert stored == content_hash(record())
@@ -0,0 +1,135 @@
+# tests/test_fetch_scheduler.py
+"""Планировщик запросов: после 429 хост притормаживается, и после паузы запросы идут
+с темпом лимита, без всплеска накопленных токенов"""
+import asyncio
+import time
+
+from src.utils.fetch_scheduler import FetchScheduler, TokenBucket
+from src.utils.http_cache import HttpCache
+
+HOST = "api.test"
+RATE = 20.0
+BURST = 5
+
+
+class FakeResponse:
+    def __init__(self, status: int, headers: dict = None):
+        self.status = status
+        self.headers = headers or {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def text(self):
+        return "{}"
+
+    async def json(self, content_type=None):
+        return {}
+
+
+class FakeClient:
+    """Первый запрос получает 429 с Retry-After, остальные - 200. Запоминает моменты запросов"""
+
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        self.requested_at = []
+
+    def get(self, url, params=None, headers=None):
+        self.requested_at.append(time.monotonic())
+        if len(self.requested_at) == 1:
+            return FakeResponse(429, {"Retry-After": str(self.retry_after)})
+        return FakeResponse(200)
+
+
+def test_bucket_pause_does_not_accumulate_tokens():
+    async def scenario():
+        bucket = TokenBucket(RATE, BURST)
+        bucket.pause(0.2)
+        started = time.monotonic()
+        for _ in range(3):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    # Пауза и по 1/RATE на каждый токен: накопленных за паузу токенов нет
+    assert asyncio.run(scenario()) >= 0.2 + 0.9 * 3 / RATE
+
+
+def test_no_burst_after_429():
+    async def scenario():
+        client = FakeClient(retry_after=0.2)
+        scheduler = FetchScheduler(client=client, host_limits={HOST: (RATE, BURST, BURST)},
+                                   backoff_base=0.01)
+        first = asyncio.create_task(scheduler.fetch(f"https://{HOST}/first"))
+        while not client.requested_at:
+            await asyncio.sleep(0)
+        await asyncio.gather(first, *(scheduler.fetch(f"https://{HOST}/{i}") for i in range(BURST)))
+        return client.requested_at
+
+    requested_at = asyncio.run(scenario())
+    after_pause = requested_at[1:]
+    assert after_pause[0] - requested_at[0] >= 0.2
+    # Без всплеска: запросы растянуты на 1/RATE каждый (с запасом на неточность таймеров)
+    gaps = [b - a for a, b in zip(after_pause, after_pause[1:])]
+    assert len(gaps) == BURST
+    assert after_pause[-1] - after_pause[0] >= 0.9 * BURST / RATE
+    assert min(gaps) >= 0.5 / RATE
+
+
+def test_unparsable_page_is_failed():
+    async def fetch_page(page):
+        if page == 2:
+            return len(None)  # как разбор пустого тела или null в парсере
+        if page == 3:
+            raise ValueError("Expecting value: line 1 column 1 (char 0)")
+        return [page]
+
+    batch = asyncio.run(FetchScheduler(client=FakeClient(0)).fetch_pages(fetch_page, range(1, 5)))
+    assert batch.results == {1: [1], 4: [4]}
+    assert batch.failed == [2, 3]
+
+
+class ConditionalClient:
+    """На условный запрос отвечает 304 с пустым телом, на обычный - 200 с JSON"""
+
+    def __init__(self):
+        self.requests = []
+
+    def get(self, url, params=None, headers=None):
+        self.requests.append(dict(headers or {}))
+        if headers and "If-None-Match" in headers:
+            return FakeResponse(304)
+        return FakeResponse(200, {"ETag": '"v1"'})
+
+
+def test_304_without_stored_response_is_a_miss(tmp_path):
+    async def scenario():
+        client = ConditionalClient()
+        cache = HttpCache(str(tmp_path))
+        scheduler = FetchScheduler(client=client, cache=cache, backoff_base=0.01)
+        # Условный заголовок есть, а сохраненного ответа нет (например, вытеснен из кэша)
+        response = await scheduler.fetch(f"https://{HOST}/anime", headers={"If-None-Match": '"v0"'})
+        entry = await cache.lookup(cache.key(f"https://{HOST}/anime"))
+        return client.requests, response, entry
+
+    requests, response, entry = asyncio.run(scenario())
+    assert len(requests) == 2
+    assert "If-None-Match" not in requests[1]
+    assert response.status == 200 and response.data == {}
+    assert entry["status"] == 200 and entry["body"] == "{}"
+
+
+def test_uncached_request_bypasses_http_cache(tmp_path):
+    async def scenario():
+        client = ConditionalClient()
+        cache = HttpCache(str(tmp_path))
+        scheduler = FetchScheduler(client=client, cache=cache)
+        url = f"https://{HOST}/animes/1"
+        # Подробности кэширует DetailEnricher: второй копии в HTTP-кэше быть не должно
+        await scheduler.get_json(url, use_cache=False)
+        await scheduler.get_json(url, use_cache=False)
+        return len(client.requests), await cache.lookup(cache.key(url))
+
+    assert asyncio.run(scenario()) == (2, None)
@@ -0,0 +1,56 @@
+# tests/test_ipc.py
+"""Канал бот-воркер: сообщения длиннее буфера StreamReader по умолчанию доходят,
+а сообщение длиннее лимита пропускается без обрыва соединения"""
+import asyncio
+
+from src.utils.ipc import IpcClient, IpcServer
+
+TOKEN = "test-token"
+
+
+async def _pair(server_limit: int = None):
+    server = IpcServer("127.0.0.1", 0, TOKEN)
+    if server_limit is not None:
+        server.line_limit = server_limit
+    received = asyncio.Queue()
+
+    async def on_data(message):
+        await received.put(message)
+
+    server.on("data", on_data)
+    await server.start()
+    port = server._server.sockets[0].getsockname()[1]
+    client = IpcClient("127.0.0.1", port, TOKEN)
+    client.start()
+    return server, client, received
+
+
+def test_long_message_is_delivered():
+    async def scenario():
+        server, client, received = await _pair()
+        try:
+            payload = "x" * (1024 * 1024)
+            await client.send({"type": "data", "payload": payload})
+            message = await asyncio.wait_for(received.get(), timeout=5)
+            assert message["payload"] == payload
+        finally:
+            await client.stop()
+            await server.stop()
+
+    asyncio.run(scenario())
+
+
+def test_oversized_message_is_skipped():
+    async def scenario():
+        server, client, received = await _pair(server_limit=1024)
+        try:
+            await client.send({"type": "data", "payload": "x" * 100_000})
+            await client.send({"type": "data", "payload": "after"})
+            message = await asyncio.wait_for(received.get(), timeout=5)
+            assert message["payload"] == "after"
+            assert server.connected
+        finally:
+            await client.stop()
+            await server.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,136 @@
+# tests/test_poster_file_id.py
+"""Постер аниме загружается в Telegram по URL один раз: дальше карточка отправляется по file_id,
+пока источник не сменит image_url"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.database.base import Base
+from src.handlers.anime_list import show_anime_details
+from src.models.anime import Anime
+from src.models.animego_link import AnimeGoLink  # noqa: F401 - таблицы для create_all
+from src.models.blocked_chat import BlockedChat  # noqa: F401
+from src.models.subscription import Subscription  # noqa: F401
+from src.services.anime_service import AnimeService
+from src.services.cache import details_cards
+
+POSTER = "https://shikimori.one/system/animes/original/52991.jpg"
+NEW_POSTER = "https://shikimori.one/system/animes/original/52991-v2.jpg"
+
+
+class FakeMessage:
+    """Сообщение, в которое хендлер отвечает: запоминает отправленные фото.
+    Telegram на отправку по URL отвечает новым file_id, по file_id - тем же"""
+
+    def __init__(self):
+        self.photos = []
+        self.texts = []
+        self.uploads = 0
+
+    async def answer_photo(self, photo, **kwargs):
+        self.photos.append(photo)
+        if photo.startswith("http"):
+            self.uploads += 1
+            file_id = f"file-{self.uploads}"
+        else:
+            file_id = photo
+        return SimpleNamespace(photo=[SimpleNamespace(file_id=f"{file_id}-thumb"), SimpleNamespace(file_id=file_id)])
+
+    async def answer(self, text, **kwargs):
+        self.texts.append(text)
+
+
+class FakeCallback:
+    def __init__(self, data: str, message: FakeMessage, user_id: int = 1):
+        self.data = data
+        self.message = message
+        self.from_user = SimpleNamespace(id=user_id)
+
+    async def answer(self, *args, **kwargs):
+        pass
+
+
+def record(image_url: str) -> dict:
+    return {"source": "shikimori", "id": 52991, "title": "Sousou no Frieren",
+            "status": "ongoing", "image_url": image_url}
+
+
+async def open_session():
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return engine, sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+
+async def stored_file_id(session_factory):
+    async with session_factory() as session:
+        return (await session.execute(select(Anime.image_file_id))).scalar()
+
+
+async def view(session_factory, message: FakeMessage, user_id: int = 1):
+    async with session_factory() as session:
+        await show_anime_details(FakeCallback("details_shikimori_52991", message, user_id), session)
+
+
+@pytest.fixture(autouse=True)
+def clean_details_cache():
+    details_cards.invalidate()
+    yield
+    details_cards.invalidate()
+
+
+def test_poster_uploaded_by_url_once():
+    async def scenario():
+        engine, session_factory = await open_session()
+        async with session_factory() as session:
+            await AnimeService(session).bulk_upsert_anime([record(POSTER)])
+        message = FakeMessage()
+
+        await view(session_factory, message)
+        assert message.photos == [POSTER]
+        assert await stored_file_id(session_factory) == "file-1"
+
+        # Другие пользователи и повторные просмотры - только по file_id
+        for user_id in (1, 2, 3):
+            await view(session_factory, message, user_id)
+        # file_id берется и из БД, когда карточки нет в кэше (например, после перезапуска)
+        details_cards.invalidate()
+        await view(session_factory, message)
+        assert message.photos == [POSTER] + ["file-1"] * 4
+        assert message.uploads == 1
+        assert not message.texts
+        await engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_new_image_url_resets_file_id():
+    async def scenario():
+        engine, session_factory = await open_session()
+        async with session_factory() as session:
+            await AnimeService(session).bulk_upsert_anime([record(POSTER)])
+        message = FakeMessage()
+        await view(session_factory, message)
+        assert await stored_file_id(session_factory) == "file-1"
+
+        # Тот же постер при обновлении не сбрасывает file_id
+        async with session_factory() as session:
+            await AnimeService(session).bulk_upsert_anime([{**record(POSTER), "episodes": 28}])
+        assert await stored_file_id(session_factory) == "file-1"
+
+        async with session_factory() as session:
+            await AnimeService(session).bulk_upsert_anime([record(NEW_POSTER)])
+        assert await stored_file_id(session_factory) is None
+
+        await view(session_factory, message)
+        await view(session_factory, message)
+        assert message.photos == [POSTER, NEW_POSTER, "file-2"]
+        assert await stored_file_id(session_factory) == "file-2"
+        await engine.dispose()
+
+    asyncio.run(scenario())
@@ -0,0 +1,101 @@
+# tests/test_refresh_errors.py
+"""Ошибка записи в БД при обновлении источника видна пользователю как ❌, а не как «добавлено 0»,
+и не мешает показать результат другого источника"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import src.parsers.mal as mal
+import src.parsers.shikimori as shikimori
+import src.services.refresh_coordinator as coordinator_module
+from src.database.base import Base
+from src.models.anime import Anime  # noqa: F401 - таблицы для create_all
+from src.models.animego_link import AnimeGoLink  # noqa: F401
+from src.models.blocked_chat import BlockedChat  # noqa: F401
+from src.models.subscription import Subscription  # noqa: F401
+from src.services.anime_service import AnimeService
+from src.services.refresh_coordinator import RefreshCoordinator
+from src.services.refresh_jobs import RefreshJobs
+from src.services.refresh_pipeline import RefreshError
+
+
+def pages_of(source: str):
+    async def iter_ongoing_pages(fetcher=None, max_in_flight=None):
+        # С описанием: подробности не догружаются, в сеть тест не ходит
+        yield 1, [{"source": source, "id": i, "title": f"{source} {i}", "status": "ongoing",
+                   "description": "..."} for i in range(1, 4)]
+    return iter_ongoing_pages
+
+
+class FakeMessage:
+    def __init__(self):
+        self.texts = []
+        self.bot = SimpleNamespace(edit_message_text=self.edit)
+
+    async def answer(self, text, **kwargs):
+        self.texts.append(text)
+        return SimpleNamespace(chat=SimpleNamespace(id=1), message_id=1)
+
+    async def edit(self, text, **kwargs):
+        self.texts.append(text)
+
+
+@pytest.fixture
+def sources(monkeypatch):
+    monkeypatch.setattr(shikimori, "iter_ongoing_pages", pages_of("shikimori"))
+    monkeypatch.setattr(mal, "iter_ongoing_pages", pages_of("mal"))
+    monkeypatch.setattr(coordinator_module.animego_resolver, "schedule", lambda: None)
+
+    upsert = AnimeService.bulk_upsert_anime
+
+    async def failing_upsert(self, records, commit=True):
+        if records[0]["source"] == "shikimori":
+            raise RuntimeError("database is locked")
+        return await upsert(self, records, commit)
+
+    monkeypatch.setattr(AnimeService, "bulk_upsert_anime", failing_upsert)
+
+
+async def open_session():
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return engine, sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+
+def test_failed_write_raises(sources):
+    async def scenario():
+        engine, session_factory = await open_session()
+        async with session_factory() as session:
+            with pytest.raises(RefreshError, match="database is locked"):
+                await AnimeService(session).update_all_ongoing_from_source("shikimori")
+            result = await AnimeService(session).update_all_ongoing_from_source("mal")
+        await engine.dispose()
+        return result
+
+    assert asyncio.run(scenario()).inserted == 3
+
+
+def test_failed_source_reported(sources):
+    async def scenario():
+        engine, session_factory = await open_session()
+        jobs = RefreshJobs(RefreshCoordinator(session_factory), interval=0.01)
+        message = FakeMessage()
+        done = []
+
+        async def on_done(outcomes):
+            done.append(outcomes)
+
+        await jobs.submit(message, ("shikimori", "mal"), on_done)
+        await engine.dispose()
+        return message.texts[-1], done
+
+    text, done = asyncio.run(scenario())
+    assert text.startswith("⚠️ Обновление завершено с ошибками")
+    assert "❌ Shikimori: ошибка обновления (не записано страниц 1: database is locked)" in text
+    assert "✅ MyAnimeList: страниц 1, добавлено 3" in text
+    assert len(done) == 1 and list(done[0]) == ["mal"]